@@ -0,0 +1,103 @@
+"""
+Memory benchmark for in-flight articles
+Compares plain dicts (copied per enrichment stage) with slotted ArticleRecords
+
+Usage: python -m benchmarks.article_memory [--count 100000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from src.records import ArticleRecord
+
+SOURCES = ["ArXiv", "HackerNews", "Reddit r/MachineLearning", "OpenAI Blog", "Google AI Blog"]
+
+ANALYSIS = {
+    "summary": "A short model-written summary of the article. " * 3,
+    "tags": ["AI", "LLM", "Research"],
+    "importance_level": "high",
+    "importance_score": 0.8,
+    "key_insights": ["Significant advancement in AI capabilities", "Potential impact on industry applications"],
+}
+
+
+def build_dicts(count: int) -> List[Dict[str, Any]]:
+    fetched = [
+        {
+            "id": f"arxiv_{i}",
+            "title": f"Paper number {i} on scaling laws",
+            "url": f"https://arxiv.org/abs/{i}",
+            "source": SOURCES[i % len(SOURCES)],
+            "published_at": "2024-01-15T12:00:00",
+        }
+        for i in range(count)
+    ]
+    # The old analysis stage spread every article into a new dict
+    return [
+        {
+            **article,
+            "summary": ANALYSIS["summary"],
+            "tags": list(ANALYSIS["tags"]),
+            "importance": ANALYSIS["importance_level"],
+            "ai_score": ANALYSIS["importance_score"],
+            "key_insights": list(ANALYSIS["key_insights"]),
+        }
+        for article in fetched
+    ]
+
+
+def build_records(count: int) -> List[ArticleRecord]:
+    records = [
+        ArticleRecord(
+            id=f"arxiv_{i}",
+            title=f"Paper number {i} on scaling laws",
+            url=f"https://arxiv.org/abs/{i}",
+            source=SOURCES[i % len(SOURCES)],
+            published_at="2024-01-15T12:00:00",
+        )
+        for i in range(count)
+    ]
+    for record in records:
+        record.summary = ANALYSIS["summary"]
+        record.tags = tuple(ANALYSIS["tags"])
+        record.importance = ANALYSIS["importance_level"]
+        record.ai_score = ANALYSIS["importance_score"]
+        record.key_insights = tuple(ANALYSIS["key_insights"])
+    return records
+
+
+def measure(name: str, build: Callable[[int], List[Any]], count: int) -> Dict[str, Any]:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    articles = build(count)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del articles
+    return {
+        "name": name,
+        "count": count,
+        "retained_mb": current / 1e6,
+        "peak_mb": peak / 1e6,
+        "bytes_per_article": current / count,
+        "build_ms": elapsed * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for result in (measure("dict", build_dicts, args.count), measure("ArticleRecord", build_records, args.count)):
+        print(
+            f"{result['name']:>14}: {result['retained_mb']:7.1f} MB retained, {result['peak_mb']:7.1f} MB peak, "
+            f"{result['bytes_per_article']:6.0f} B/article, {result['build_ms']:7.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
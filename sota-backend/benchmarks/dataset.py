@@ -0,0 +1,111 @@
+"""
+Fixture article dataset for load tests
+Bulk-loads 10k or 1M synthetic articles into the configured database (SQLite or a local Postgres)
+
+Usage: DATABASE_URL=sqlite+aiosqlite:///data/bench.db python -m benchmarks.dataset --size 10k
+       DATABASE_URL=postgresql+asyncpg://localhost/sota_bench python -m benchmarks.dataset --size 1m
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import func, select
+
+from src.database import Article, close_db, engine, init_db
+
+SIZES = {"10k": 10_000, "1m": 1_000_000}
+ID_PREFIX = "fixture_"
+SOURCES = ["ArXiv", "HackerNews", "Reddit r/MachineLearning", "OpenAI Blog", "Google AI Blog", "MIT Technology Review"]
+TOPICS = ["GPT-5", "Llama 3", "AlphaFold 3", "diffusion models", "RLHF", "mixture of experts", "robotics", "AI policy"]
+IMPORTANCE = ["low", "medium", "high"]
+
+
+def _insert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def fixture_id(i: int) -> str:
+    return f"{ID_PREFIX}{i}"
+
+
+def build_rows(start: int, count: int, now: datetime) -> List[Dict[str, Any]]:
+    rng = random.Random(start)  # the same rows on every run
+    rows = []
+    for i in range(start, start + count):
+        topic = TOPICS[i % len(TOPICS)]
+        rows.append({
+            "id": fixture_id(i),
+            "title": f"{topic}: result {i} from {SOURCES[i % len(SOURCES)]}",
+            "summary": f"Synthetic summary of article {i} about {topic}.",
+            "content": f"Synthetic body of article {i}. " * 20,
+            "url": f"https://example.com/articles/{i}",
+            "source": SOURCES[i % len(SOURCES)],
+            # Spread over the six days before now, so everything is still in the hot table
+            "published_at": now - timedelta(seconds=rng.uniform(0, 6 * 86400)),
+            "created_at": now,
+            "updated_at": now,
+            "tags": [topic, "AI"],
+            "importance": IMPORTANCE[i % len(IMPORTANCE)],
+            "ai_score": round(rng.uniform(0.3, 1.0), 2),
+            "word_count": 100,
+            "read_time": 1,
+            "is_featured": False,
+            "is_active": True,
+        })
+    return rows
+
+
+async def load(size: int, batch_size: int) -> Dict[str, Any]:
+    """Insert fixture rows 0..size-1, skipping the ones already present"""
+    await init_db()
+    async with engine.connect() as conn:
+        existing = await conn.scalar(
+            select(func.count()).select_from(Article).where(Article.id.like(f"{ID_PREFIX}%"))
+        )
+    insert = _insert(engine.dialect.name)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    inserted = 0
+    for start in range(existing or 0, size, batch_size):
+        rows = build_rows(start, min(batch_size, size - start), now)
+        async with engine.begin() as conn:
+            result = await conn.execute(insert(Article).on_conflict_do_nothing(index_elements=["id"]), rows)
+            inserted += max(result.rowcount or 0, 0)
+        if start // batch_size % 20 == 0:
+            print(f"📦 {start + len(rows):,}/{size:,} rows", flush=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "database": engine.dialect.name,
+        "rows": size,
+        "already_present": existing or 0,
+        "inserted": inserted,
+        "load_s": round(elapsed, 2),
+        "rows_per_s": round(inserted / elapsed, 1) if inserted and elapsed else None,
+    }
+
+
+async def main_async(args):
+    try:
+        result = await load(SIZES[args.size], args.batch_size)
+    finally:
+        await close_db()
+    print(json.dumps(result, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", choices=sorted(SIZES), default="10k")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Content extraction throughput benchmark
+Parses synthetic article pages inline on the event loop and on process pools of growing size
+
+Usage: python -m benchmarks.extraction [--pages 200] [--paragraphs 120]
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict
+
+from src.extraction import ContentExtractor, extract_text
+
+BOILERPLATE = (
+    "<nav>" + "".join(f"<a href='/section/{i}'>Section {i}</a>" for i in range(40)) + "</nav>"
+    "<aside>" + "<p>Related: another story you might like to read next.</p>" * 10 + "</aside>"
+    "<footer>" + "<p>Copyright SOTA.ai. All rights reserved. Terms. Privacy.</p>" * 5 + "</footer>"
+)
+
+
+def build_page(i: int, paragraphs: int) -> str:
+    body = "".join(
+        f"<p>Paragraph {n} of article {i} explains how the new model was trained and evaluated "
+        f"on <a href='/x'>benchmarks</a>, with <em>ablations</em> over data and compute.</p>"
+        for n in range(paragraphs)
+    )
+    return (
+        f"<html><head><title>Article {i}</title><script>var x = {i};</script></head>"
+        f"<body>{BOILERPLATE}<div class='content'><h2>Results</h2>{body}</div></body></html>"
+    )
+
+
+async def measure_loop_lag(work) -> Dict[str, Any]:
+    """Run work while a 10ms ticker records how late the event loop wakes it"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)  # let the ticker start waiting
+    started = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker_task
+    return {"elapsed": elapsed, "max_lag_ms": max(lags, default=0.0) * 1000}
+
+
+async def run(pages, label: str, workers: int = 0) -> Dict[str, Any]:
+    if workers == 0:
+        async def work():
+            for html in pages:
+                extract_text(html)
+                await asyncio.sleep(0)  # yield between pages, like one parse per request
+    else:
+        extractor = ContentExtractor(workers=workers, parse_timeout=60.0)
+        # Start the worker processes before timing
+        await asyncio.gather(*(extractor.run(extract_text, "<p>warm up</p>") for _ in range(workers)))
+
+        async def work():
+            await asyncio.gather(*(extractor.run(extract_text, html) for html in pages))
+
+    result = await measure_loop_lag(work)
+    if workers:
+        await extractor.close()
+    result["label"] = label
+    result["pages_per_s"] = len(pages) / result["elapsed"]
+    return result
+
+
+async def main_async(args):
+    pages = [build_page(i, args.paragraphs) for i in range(args.pages)]
+    size_kb = sum(len(page) for page in pages) / len(pages) / 1024
+    print(f"{args.pages} pages, {size_kb:.0f} KB each, {os.cpu_count()} CPUs")
+
+    results = [await run(pages, "inline")]
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        results.append(await run(pages, f"pool x{workers}", workers))
+        workers *= 2
+
+    for result in results:
+        print(
+            f"{result['label']:>10}: {result['pages_per_s']:7.1f} pages/s, "
+            f"{result['elapsed'] * 1000:7.0f} ms total, event loop max lag {result['max_lag_ms']:7.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=120)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+In-process API load generator
+Drives the ASGI app at fixed concurrency and reports p50/p95/p99 latency and RPS per endpoint
+
+Usage: python -m benchmarks.load [--concurrency 32] [--requests 2000] [--ws-clients 200] [--output load.json]
+       python -m benchmarks.load --fixture-rows 10000   # also hit /api/articles/{id} (see benchmarks.dataset)
+       python -m benchmarks.load --rate-limit --clients 50   # limiter on, load spread over 50 client IPs
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.dataset import fixture_id
+from benchmarks.report import add_output_arguments, emit, latency_summary
+
+MCP_CONTENT = (
+    "Article {n}: OpenAI announces a significant breakthrough in multimodal machine learning, "
+    "with neural networks that rival GPT-4 on natural language processing benchmarks."
+)
+
+
+async def drive(
+    clients: List[httpx.AsyncClient],
+    make_request: Callable[[int], Tuple[str, str, Dict[str, Any]]],
+    total: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """Send total requests from concurrency closed-loop workers, round-robin over clients"""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    counter = iter(range(total))
+
+    async def worker():
+        for n in counter:
+            method, url, options = make_request(n)
+            started = time.perf_counter()
+            try:
+                response = await clients[n % len(clients)].request(method, url, **options)
+                statuses[response.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "rps": round(total / elapsed, 1),
+        **latency_summary(latencies),
+    }
+
+
+class ASGIWebSocket:
+    """Minimal WebSocket client speaking ASGI to the app directly"""
+
+    def __init__(self, app, path: str, client_id: int):
+        self.app = app
+        self.path = path
+        self.client_id = client_id
+        self.inbound: asyncio.Queue = asyncio.Queue()
+        self.outbound: asyncio.Queue = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+            "path": self.path, "raw_path": self.path.encode(), "query_string": b"", "root_path": "",
+            "headers": [(b"host", b"bench")], "client": ("127.0.0.1", self.client_id), "server": ("bench", 80),
+            "subprotocols": [],
+        }
+        self.task = asyncio.create_task(self.app(scope, self.inbound.get, self.outbound.put))
+        await self.inbound.put({"type": "websocket.connect"})
+        message = await self.outbound.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket rejected: {message}")
+
+    async def receive_text(self) -> str:
+        message = await self.outbound.get()
+        if message["type"] != "websocket.send":
+            raise ConnectionError(f"WebSocket closed: {message}")
+        return message["text"] if message.get("text") is not None else message["bytes"].decode()
+
+    async def receive_json(self) -> Dict[str, Any]:
+        return json.loads(await self.receive_text())
+
+    async def close(self):
+        await self.inbound.put({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+
+async def websocket_load(app, hub, aggregator, clients: int, broadcasts: int, change_every: int) -> Dict[str, Any]:
+    """Connect clients concurrently, then time updates until every client has them
+
+    Every change_every-th update adds an article, so it goes out as a delta; the
+    others are heartbeats, like an hour of quiet news. Bytes are per client,
+    before permessage-deflate.
+    """
+    sockets = [ASGIWebSocket(app, "/ws/updates", i) for i in range(clients)]
+    connect_latencies: List[float] = []
+    snapshot_bytes: List[int] = []
+
+    async def connect(socket: ASGIWebSocket):
+        started = time.perf_counter()
+        await socket.connect()
+        snapshot_bytes.append(len(await socket.receive_text()))
+        connect_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connect(socket) for socket in sockets))
+    connect_elapsed = time.perf_counter() - started
+
+    fanout_latencies: List[float] = []
+    update_bytes = 0
+    state = hub.log.state()
+    for n in range(broadcasts):
+        if change_every and n % change_every == change_every - 1:
+            article = {**state["articles"][0], "id": f"ws_bench_{n}", "title": f"Benchmark article {n}"}
+            state = {**state, "articles": [article, *state["articles"][:-1]]}
+        started = time.perf_counter()
+        await hub.broadcast(hub.log.advance(state))
+        received = await asyncio.gather(*(socket.receive_text() for socket in sockets))
+        fanout_latencies.append(time.perf_counter() - started)
+        update_bytes += len(received[0])
+
+    await asyncio.gather(*(socket.close() for socket in sockets))
+    # What the previous protocol sent every interval: the full update, changed or not
+    full_update_bytes = len(json.dumps(await aggregator.get_latest_update()))
+    return {
+        "clients": clients,
+        "connect": {
+            "rps": round(clients / connect_elapsed, 1),
+            "snapshot_bytes": snapshot_bytes[0] if snapshot_bytes else None,
+            **latency_summary(connect_latencies),
+        },
+        "broadcast": {
+            "broadcasts": broadcasts,
+            "messages_per_s": round(clients * broadcasts / sum(fanout_latencies), 1) if broadcasts else None,
+            "bytes_per_update": round(update_bytes / broadcasts, 1) if broadcasts else None,
+            "full_update_bytes": full_update_bytes,
+            **latency_summary(fanout_latencies),
+        },
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    from src.config import settings
+
+    # One benchmark client would just measure its own 429s
+    settings.rate_limit_enabled = args.rate_limit
+    import main  # deferred: importing the app reads settings and builds the engine
+
+    rng = random.Random(args.seed)
+    endpoints: Dict[str, Callable[[int], Tuple[str, str, Dict[str, Any]]]] = {
+        "GET /api/articles/latest": lambda n: ("GET", "/api/articles/latest", {"params": {"limit": 20}}),
+        "GET /api/newsletter/today": lambda n: ("GET", "/api/newsletter/today", {}),
+        # A fixed pool of documents: mostly cache hits after the first round, like repeated tool calls
+        "POST /api/mcp/process": lambda n: (
+            "POST", "/api/mcp/process", {"params": {"content": MCP_CONTENT.format(n=n % args.mcp_distinct)}}
+        ),
+    }
+    if args.fixture_rows:
+        endpoints["GET /api/articles/{id}"] = lambda n: (
+            "GET", f"/api/articles/{fixture_id(rng.randrange(args.fixture_rows))}", {}
+        )
+
+    results: Dict[str, Any] = {}
+    async with main.app.router.lifespan_context(main.app):
+        # Each client is a distinct IP to the rate limiter
+        clients = [
+            httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=main.app, client=(f"10.0.{i // 250}.{i % 250 + 1}", 50000)),
+                base_url="http://bench",
+            )
+            for i in range(args.clients)
+        ]
+        try:
+            for name, make_request in endpoints.items():
+                # Warm-up: first-use service construction is startup cost, not steady state
+                await drive(clients, make_request, args.concurrency, args.concurrency)
+                results[name] = await drive(clients, make_request, args.requests, args.concurrency)
+                print(f"{name}: {results[name]['rps']} rps, p99 {results[name]['p99_ms']} ms", file=sys.stderr)
+        finally:
+            await asyncio.gather(*(client.aclose() for client in clients))
+        if args.ws_clients:
+            results["WS /ws/updates"] = await websocket_load(
+                main.app, main.ws_hub, main.services.news_aggregator, args.ws_clients, args.ws_broadcasts, args.ws_change_every
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint")
+    parser.add_argument("--mcp-distinct", type=int, default=50, help="distinct documents sent to /api/mcp/process")
+    parser.add_argument("--fixture-rows", type=int, default=0, help="rows loaded by benchmarks.dataset, 0 to skip")
+    parser.add_argument("--ws-clients", type=int, default=200)
+    parser.add_argument("--ws-broadcasts", type=int, default=20)
+    parser.add_argument("--ws-change-every", type=int, default=10, help="updates per new article; 0 for heartbeats only")
+    parser.add_argument("--clients", type=int, default=1, help="distinct client IPs the requests come from")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the rate limiter on (429s count as errors)")
+    parser.add_argument("--seed", type=int, default=7)
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    results["config"] = {
+        "concurrency": args.concurrency, "requests": args.requests, "clients": args.clients, "rate_limit": args.rate_limit
+    }
+    sys.exit(emit("load", results, args.output, args.baseline, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
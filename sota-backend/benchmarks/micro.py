@@ -0,0 +1,118 @@
+"""
+Micro-benchmarks for hot functions
+AI-keyword matching, cached article analysis, MCP tools and newsletter rendering
+
+Usage: python -m benchmarks.micro [--number 2000] [--repeat 5] [--output micro.json] [--baseline old.json]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from benchmarks.report import add_output_arguments, emit
+from src.ai_processor import AIProcessor
+from src.mcp_server import MCPServer
+from src.news_aggregator import NewsAggregator
+from src.personalization import render_article_markdown
+from src.records import ArticleRecord
+from src.response_cache import ResponseCache
+
+AI_TITLE = "DeepMind releases a new deep learning model for protein design"
+PLAIN_TITLE = "Show HN: a tiny static site generator written in Zig, with no dependencies at all"
+CONTENT = (
+    "OpenAI announces a significant breakthrough in multimodal machine learning. "
+    "The new neural networks rival GPT-4 on natural language processing and computer vision benchmarks. "
+) * 20
+
+
+def make_article(i: int) -> ArticleRecord:
+    return ArticleRecord(
+        id=f"bench_{i}",
+        title=f"Lab {i} announces a breakthrough in deep learning",
+        content=CONTENT,
+        summary="A short model-written summary of the article and why it matters. " * 3,
+        url=f"https://example.com/{i}",
+        source="ArXiv",
+        published_at="2025-01-15T12:00:00Z",
+        tags=("AI", "LLM", "Research"),
+        importance="high",
+        ai_score=0.9,
+        key_insights=("Significant advancement in AI capabilities", "Potential impact on industry applications"),
+    )
+
+
+def timing(seconds: float, number: int) -> Dict[str, float]:
+    return {"per_op_us": round(seconds / number * 1e6, 3), "ops_per_s": round(number / seconds, 1)}
+
+
+def bench(func: Callable[[], Any], number: int, repeat: int) -> Dict[str, float]:
+    """Best of repeat runs of number calls"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - started)
+    return timing(best, number)
+
+
+async def abench(func: Callable[[], Awaitable[Any]], number: int, repeat: int) -> Dict[str, float]:
+    """bench() for coroutine functions, awaited one after another"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            await func()
+        best = min(best, time.perf_counter() - started)
+    return timing(best, number)
+
+
+async def run(number: int, repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+
+    aggregator = NewsAggregator()
+    results["is_ai_related.match"] = bench(lambda: aggregator._is_ai_related(AI_TITLE), number * 10, repeat)
+    results["is_ai_related.no_match"] = bench(lambda: aggregator._is_ai_related(PLAIN_TITLE), number * 10, repeat)
+
+    # Model calls are simulated sleeps; what runs hot in production is the cached path
+    processor = AIProcessor(response_cache=ResponseCache(memory_entries=1024))
+    article = make_article(0)
+    await processor._analyze_single_article(article)
+    results["analyze_single_article.cached"] = await abench(
+        lambda: processor._analyze_single_article(article), number, repeat
+    )
+    results["build_analysis_prompt"] = bench(lambda: processor._build_analysis_prompt(article), number, repeat)
+
+    mcp = MCPServer(response_cache=ResponseCache(memory_entries=1024))
+    await mcp.start()
+    for tool in mcp.tools:
+        await mcp.process_content(CONTENT, tool=tool)
+        results[f"mcp.{tool}.cached"] = await abench(
+            lambda tool=tool: mcp.process_content(CONTENT, tool=tool), number, repeat
+        )
+    await mcp.stop()
+
+    articles = [make_article(i) for i in range(10)]
+    results["render_article_markdown"] = bench(lambda: render_article_markdown(articles[0]), number, repeat)
+    await processor._generate_newsletter_content(articles)
+    results["generate_newsletter_content.cached"] = await abench(
+        lambda: processor._generate_newsletter_content(articles), max(1, number // 10), repeat
+    )
+    await processor.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="calls per timed run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs; the best one counts")
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.number, args.repeat))
+    sys.exit(emit("micro", results, args.output, args.baseline, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Offline crawl pipeline benchmark
+Replays recorded HTTP fixtures through crawl, dedup, analysis and newsletter generation and compares with a baseline
+
+Usage: python -m benchmarks.pipeline [--fixtures DIR] [--latency-ms 50] [--jitter-ms 20] [--update-baseline]
+       python -m benchmarks.pipeline --record DIR   # capture fixtures from the live sources
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from src.ai_processor import AIProcessor
+from src.config import settings
+from src.extraction import ContentExtractor
+from src.http_replay import RecordingTransport
+from src.news_aggregator import NewsAggregator, dedupe_articles
+
+STAGES = ("crawl", "dedup", "analyze", "newsletter")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "pipeline.json")
+
+# Synthetic fixtures describe this day
+FIXTURE_DATE = "2025-01-15"
+TOPICS = [
+    "GPT-5", "Llama 3", "AlphaFold 3", "diffusion transformers", "RLHF", "mixture of experts",
+    "humanoid robotics", "AI regulation", "open-source LLMs", "multimodal agents",
+]
+ORGS = ["OpenAI", "DeepMind", "Meta", "Anthropic", "Mistral", "Nvidia", "Stanford", "MIT"]
+
+
+def _headline(i: int) -> str:
+    return f"{ORGS[i % len(ORGS)]} releases {TOPICS[i % len(TOPICS)]} breakthrough, part {i}"
+
+
+def _article_page(url: str) -> str:
+    body = "".join(
+        f"<p>Paragraph {n} on {url}: the new AI model was trained and evaluated on public benchmarks, "
+        f"with ablations over data, compute and architecture choices.</p>"
+        for n in range(40)
+    )
+    return f"<html><head><title>{url}</title></head><body><nav>Home</nav><article>{body}</article></body></html>"
+
+
+def synthetic_site(request: httpx.Request) -> httpx.Response:
+    """Stand-in for every crawled host, deterministic per URL"""
+    host, path = request.url.host, request.url.path
+    day = FIXTURE_DATE
+    if host == "hacker-news.firebaseio.com":
+        if path.endswith("/topstories.json"):
+            return httpx.Response(200, json=list(range(1, 101)))
+        story_id = int(path.rsplit("/", 1)[-1].split(".")[0])
+        # Every fourth story links a Reddit-shared URL, so dedup has work to do
+        url = f"https://news.example.com/{story_id // 4 if story_id % 4 == 0 else 1000 + story_id}"
+        title = _headline(story_id) if story_id % 3 else f"Show HN: a database written in Rust, take {story_id}"
+        return httpx.Response(200, json={"id": story_id, "title": title, "url": url, "time": 1736942400 - story_id * 600, "score": 10 * story_id})
+    if host == "www.reddit.com":
+        children = [
+            {"data": {
+                "id": f"r{i}", "title": _headline(200 + i), "url": f"https://news.example.com/{i}",
+                "created_utc": 1736942400 - i * 900, "score": 50 + i, "selftext": f"Discussion thread {i}",
+            }}
+            for i in range(25)
+        ]
+        return httpx.Response(200, json={"data": {"children": children}})
+    if host == "export.arxiv.org":
+        entries = "".join(
+            f"<entry><id>http://arxiv.org/abs/2501.{i:05d}v1</id><title>{_headline(300 + i)}</title>"
+            f"<published>{day}T{i % 24:02d}:00:00Z</published><summary>We study {TOPICS[i % len(TOPICS)]}.</summary>"
+            f"<author><name>Author {i}</name></author></entry>"
+            for i in range(20)
+        )
+        return httpx.Response(200, text=f"<feed xmlns='http://www.w3.org/2005/Atom'>{entries}</feed>")
+    if host == "openai.com" and path.endswith("rss.xml"):
+        items = "".join(
+            f"<item><title>{_headline(400 + i)}</title><link>https://openai.com/index/post-{i}</link>"
+            f"<pubDate>Wed, 15 Jan 2025 {i:02d}:00:00 GMT</pubDate><description>Post {i}</description></item>"
+            for i in range(12)
+        )
+        return httpx.Response(200, text=f"<rss version='2.0'><channel><title>OpenAI</title>{items}</channel></rss>")
+    if host == "ai.googleblog.com" and "feeds" in path:
+        entries = "".join(
+            f"<entry><title>{_headline(500 + i)}</title><link href='https://ai.googleblog.com/2025/01/post-{i}.html'/>"
+            f"<id>post-{i}</id><published>{day}T{i:02d}:30:00Z</published><summary>Post {i}</summary></entry>"
+            for i in range(12)
+        )
+        return httpx.Response(200, text=f"<feed xmlns='http://www.w3.org/2005/Atom'>{entries}</feed>")
+    if host == "www.technologyreview.com" and path.startswith("/topic/"):
+        links = "".join(
+            f"<a href='/2025/01/15/{1000 + i}/story-{i}/'>{_headline(600 + i)}</a>" for i in range(15)
+        )
+        return httpx.Response(200, text=f"<html><body><nav>Topics</nav><main>{links}</main></body></html>")
+    if request.method == "GET":
+        return httpx.Response(200, text=_article_page(str(request.url)), headers={"Content-Type": "text/html"})
+    return httpx.Response(404)
+
+
+async def record(directory: str, transport: Optional[httpx.AsyncBaseTransport] = None) -> int:
+    """Crawl every source once through transport (the live network by default), recording each response"""
+    recorder = RecordingTransport(directory, transport)
+    aggregator = NewsAggregator(transport=recorder)
+    extractor = ContentExtractor(transport=recorder) if settings.content_extraction_enabled else None
+    aggregator.extractor = extractor
+    try:
+        await aggregator.crawl()
+    finally:
+        await aggregator.close()
+        if extractor is not None:
+            await extractor.close()
+    return recorder.recorded
+
+
+async def run_pipeline(date: str) -> Dict[str, Any]:
+    """Crawl, dedup, analyze and render one edition, timing each stage"""
+    aggregator = NewsAggregator()
+    extractor = ContentExtractor() if settings.content_extraction_enabled else None
+    aggregator.extractor = extractor
+    processor = AIProcessor()
+    timings: Dict[str, float] = {}
+    try:
+        started = time.perf_counter()
+        crawled = await aggregator.crawl()
+        timings["crawl"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        unique = dedupe_articles(crawled)
+        timings["dedup"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        featured = await processor._analyze_articles(unique, date)
+        timings["analyze"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        content = await processor._generate_newsletter_content(featured)
+        timings["newsletter"] = time.perf_counter() - started
+    finally:
+        await aggregator.close()
+        if extractor is not None:
+            await extractor.close()
+        await processor.close()
+
+    return {
+        "timings": timings,
+        "crawled": len(crawled),
+        "unique": len(unique),
+        "featured": [article.id for article in featured],
+        "content_chars": len(content),
+        "failed_sources": sorted(
+            name for name, health in aggregator.health.table().items() if health["failures"]
+        ),
+    }
+
+
+def summarize(runs: List[Dict[str, Any]], peak_kb: float) -> Dict[str, Any]:
+    stage_ms = {stage: statistics.median(run["timings"][stage] for run in runs) * 1000 for stage in STAGES}
+    total_ms = statistics.median(sum(run["timings"].values()) for run in runs) * 1000
+    last = runs[-1]
+    return {
+        "wall_ms": {**{stage: round(ms, 1) for stage, ms in stage_ms.items()}, "total": round(total_ms, 1)},
+        "articles_per_s": round(last["crawled"] / (total_ms / 1000), 1),
+        "peak_traced_kb": round(peak_kb),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "crawled": last["crawled"],
+        "unique": last["unique"],
+        "featured": last["featured"],
+        "failed_sources": last["failed_sources"],
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions against the baseline: slower stages, more memory or a different edition"""
+    problems = []
+    for stage, ms in result["wall_ms"].items():
+        before = baseline["wall_ms"].get(stage)
+        # Sub-millisecond stages are all noise
+        if before and ms > max(before * (1 + tolerance), before + 1.0):
+            problems.append(f"{stage}: {ms:.1f} ms vs {before:.1f} ms baseline (+{ms / before - 1:.0%})")
+    before_kb = baseline.get("peak_traced_kb")
+    if before_kb and result["peak_traced_kb"] > before_kb * (1 + tolerance):
+        problems.append(f"peak memory: {result['peak_traced_kb']} KB vs {before_kb} KB baseline")
+    for key in ("crawled", "unique", "featured", "failed_sources"):
+        if key in baseline and result[key] != baseline[key]:
+            problems.append(f"{key} changed: {result[key]} vs {baseline[key]} baseline")
+    return problems
+
+
+async def main_async(args) -> int:
+    if args.record:
+        count = await record(args.record)
+        print(f"Recorded {count} responses to {args.record}")
+        return 0
+
+    fixtures = args.fixtures
+    if fixtures is None:
+        fixtures = tempfile.mkdtemp(prefix="sota-fixtures-")
+        count = await record(fixtures, httpx.MockTransport(synthetic_site))
+        print(f"Generated {count} synthetic fixtures in {fixtures}")
+
+    # Every client built from here on replays; model calls skip the response cache
+    settings.http_replay_mode = "replay"
+    settings.http_fixtures_dir = fixtures
+    settings.http_replay_latency_ms = args.latency_ms
+    settings.http_replay_jitter_ms = args.jitter_ms
+    settings.http_replay_seed = args.seed
+    settings.response_cache_enabled = False
+
+    try:
+        runs = [await run_pipeline(args.date) for _ in range(args.runs)]
+
+        # Separate pass: tracemalloc slows everything it traces
+        tracemalloc.start()
+        await run_pipeline(args.date)
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    finally:
+        if args.fixtures is None:
+            shutil.rmtree(fixtures, ignore_errors=True)
+
+    result = summarize(runs, peak_kb)
+    result["config"] = {
+        "fixtures": "synthetic" if args.fixtures is None else args.fixtures,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "runs": args.runs,
+        "content_extraction": settings.content_extraction_enabled,
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['crawled']} crawled, {result['unique']} unique, {len(result['featured'])} featured")
+        for stage, ms in result["wall_ms"].items():
+            print(f"{stage:>12}: {ms:9.1f} ms")
+        print(f"{'throughput':>12}: {result['articles_per_s']:9.1f} articles/s")
+        print(f"{'peak traced':>12}: {result['peak_traced_kb']:9d} KB (max RSS {result['max_rss_kb']} KB)")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != result["config"]:
+        print("⚠️ Baseline was recorded with different settings; comparing anyway")
+    problems = compare(result, baseline, args.tolerance)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print(f"✅ Within {args.tolerance:.0%} of baseline")
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", help="recorded fixture directory; synthetic fixtures when omitted")
+    parser.add_argument("--record", metavar="DIR", help="crawl the live sources once and record fixtures to DIR")
+    parser.add_argument("--date", default=FIXTURE_DATE, help="edition date the fixtures describe")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="simulated latency per response")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
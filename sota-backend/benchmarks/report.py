@@ -0,0 +1,112 @@
+"""
+Shared result handling for the benchmark scripts
+Latency percentiles, run metadata, JSON output and baseline comparison
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Metric name suffixes, by the direction that counts as a regression
+LOWER_IS_BETTER = ("_ms", "_us", "_kb")
+HIGHER_IS_BETTER = ("rps", "ops_per_s")
+NOT_COMPARED = ("max_ms",)  # a single slow sample; too noisy to gate on
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max and mean, in milliseconds"""
+    ordered = sorted(seconds)
+    summary = {f"p{int(q * 100)}_ms": percentile(ordered, q) * 1000 for q in (0.5, 0.95, 0.99)}
+    summary["max_ms"] = ordered[-1] * 1000 if ordered else 0.0
+    summary["mean_ms"] = sum(ordered) / len(ordered) * 1000 if ordered else 0.0
+    return {name: round(value, 3) for name, value in summary.items()}
+
+
+def environment() -> Dict[str, Any]:
+    """Where and on what the numbers were taken"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _metrics(result: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Flattened (path, value) pairs for every numeric leaf"""
+    for key, value in result.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _metrics(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, float(value)
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics that moved the wrong way by more than tolerance"""
+    before = dict(_metrics(baseline.get("results", {})))
+    regressions = []
+    for path, value in _metrics(result.get("results", {})):
+        old = before.get(path)
+        if not old:
+            continue
+        name = path.rsplit(".", 1)[-1]
+        if name in NOT_COMPARED:
+            continue
+        if name.endswith(LOWER_IS_BETTER) and value > old * (1 + tolerance):
+            regressions.append(f"{path}: {value:g} vs {old:g} baseline (+{value / old - 1:.0%})")
+        elif name.endswith(HIGHER_IS_BETTER) and value < old * (1 - tolerance):
+            regressions.append(f"{path}: {value:g} vs {old:g} baseline ({value / old - 1:.0%})")
+    return regressions
+
+
+def emit(
+    name: str,
+    results: Dict[str, Any],
+    output: Optional[str] = None,
+    baseline: Optional[str] = None,
+    tolerance: float = 0.25,
+) -> int:
+    """Print (or write) the JSON document and compare it with a baseline; returns the exit code"""
+    document = {"benchmark": name, "environment": environment(), "results": results}
+    text = json.dumps(document, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+        print(f"Results written to {output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if not baseline:
+        return 0
+    with open(baseline) as f:
+        regressions = compare(document, json.load(f), tolerance)
+    for regression in regressions:
+        print(f"❌ {regression}", file=sys.stderr)
+    if not regressions:
+        print(f"✅ Within {tolerance:.0%} of {baseline}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def add_output_arguments(parser):
+    """--output, --baseline and --tolerance, shared by the JSON-emitting benchmarks"""
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression before failing")
@@ -0,0 +1,96 @@
+"""
+Serialization benchmark for article responses
+Compares the response-model path with direct record encoding at 20, 200 and 2,000 articles
+
+Usage: python -m benchmarks.serialization [--repeat 200]
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from main import ArticleResponse
+from src.records import ArticleRecord
+from src.serialization import FastJSONResponse
+
+SIZES = (20, 200, 2000)
+
+
+def make_records(count: int) -> List[ArticleRecord]:
+    return [
+        ArticleRecord(
+            id=f"arxiv_{i}",
+            title=f"Paper number {i} on scaling laws for multimodal models",
+            url=f"https://arxiv.org/abs/2401.{i:05d}",
+            source="ArXiv",
+            published_at="2024-01-15T12:00:00",
+            summary="A short model-written summary of the paper and why it matters. " * 3,
+            tags=("AI", "LLM", "Research", "Scaling"),
+            importance="high",
+            ai_score=0.87,
+        )
+        for i in range(count)
+    ]
+
+
+def response_models(records: List[ArticleRecord]) -> bytes:
+    """What a response_model endpoint does: build models, encode, render"""
+    models = [ArticleResponse(**record.to_response()) for record in records]
+    return JSONResponse(jsonable_encoder(models)).body
+
+
+def plain_dicts(records: List[ArticleRecord]) -> bytes:
+    return JSONResponse([record.to_response() for record in records]).body
+
+
+def direct(records: List[ArticleRecord]) -> bytes:
+    return FastJSONResponse(records).body
+
+
+def measure(encode: Callable[[List[ArticleRecord]], bytes], records: List[ArticleRecord], repeat: int) -> Dict[str, Any]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(records)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    encode(records)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": sorted(timings)[int(len(timings) * 0.95) - 1] * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    paths = {"response_model": response_models, "dict + json": plain_dicts, "direct (orjson)": direct}
+    for size in SIZES:
+        records = make_records(size)
+        bodies = {name: encode(records) for name, encode in paths.items()}
+        # Every path must produce the same document
+        assert len({json.dumps(json.loads(body), sort_keys=True) for body in bodies.values()}) == 1
+        baseline = None
+        for name, encode in paths.items():
+            result = measure(encode, records, max(10, args.repeat * 20 // size))
+            baseline = baseline or result["p50_ms"]
+            print(
+                f"{size:>5} articles  {name:<16} p50 {result['p50_ms']:8.3f} ms  p95 {result['p95_ms']:8.3f} ms  "
+                f"peak {result['peak_kb']:8.1f} KiB  {baseline / result['p50_ms']:5.1f}x  {len(bodies[name])} B"
+            )
+
+
+if __name__ == "__main__":
+    main()
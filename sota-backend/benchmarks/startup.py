@@ -0,0 +1,83 @@
+"""
+Startup-time benchmark
+Measures import time, lifespan startup and time-to-first-request in fresh interpreters
+
+Usage: python -m benchmarks.startup [--runs 5] [--path /health]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules a worker should not load unless it crawls, delivers or calls a model
+HEAVY_MODULES = ["httpx", "feedparser", "bs4", "smtplib", "openai", "anthropic", "newspaper"]
+
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def first_request(path):
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        await main.app(scope, receive, send)
+        served = time.perf_counter()
+        built = main.services.built
+    return ready, served, messages[0]["status"], built
+
+ready, served, status, built = asyncio.run(first_request(sys.argv[1]))
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (served - started) * 1000,
+    "status": status,
+    "services_built": built,
+    "heavy_modules": [name for name in json.loads(sys.argv[2]) if name in sys.modules],
+}))
+"""
+
+
+def run_once(path: str) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, path, json.dumps(HEAVY_MODULES)],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/health")
+    args = parser.parse_args()
+
+    runs = [run_once(args.path) for _ in range(args.runs)]
+    summary = {
+        metric: round(statistics.median(run[metric] for run in runs), 1)
+        for metric in ("import_ms", "startup_ms", "first_request_ms")
+    }
+    summary["status"] = runs[-1]["status"]
+    summary["services_built"] = runs[-1]["services_built"]
+    summary["heavy_modules"] = runs[-1]["heavy_modules"]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
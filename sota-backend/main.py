@@ -2,22 +2,31 @@
 SOTA.ai Backend - FastAPI server with MCP integration
 """
 import asyncio
+import json
 import logging
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from datetime import datetime, timezone
+from typing import List, Optional, Union
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Header, Query, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import uvicorn
 
 from src.config import settings
-from src.news_aggregator import NewsAggregator
-from src.ai_processor import AIProcessor
-from src.database import get_db, init_db
-from src.models import Article, Newsletter
-from src.mcp_server import MCPServer
+from src.database import Article as StoredArticle, get_read_db, init_db, close_db, background_session, get_pool_stats, ping, replica_router
+from src.models import Article, Newsletter, AnalyticsEventCreate, SubscriberCreate
+from src.event_ingestion import BufferFullError
+from src.subscribers import upsert_subscriber
+from src.http_cache import HTTPResponseCache, CachePolicy, ResponseCacheMiddleware, is_revalidation
+from src.records import ArticleRecord
+from src.serialization import FastJSONResponse
+from src.services import Services
+from src.cluster import LeaderElection, WebSocketHub, create_bus, startup_lock
+from src.health import HealthChecker, UNHEALTHY
+from src import metrics
+from src.profiling import ProfilingMiddleware, is_admin_token, profiler
+from src.rate_limit import RateLimiter, RateLimitMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -26,25 +35,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize services
-news_aggregator = NewsAggregator()
-ai_processor = AIProcessor()
-mcp_server = MCPServer()
+# Services are built on first use; the lifespan closes them
+services = Services()
+
+# Cross-worker coordination: one leader runs singleton duties, the bus carries
+# invalidations and WebSocket broadcasts to the other workers
+leader = LeaderElection()
+bus = create_bus()
+ws_hub = WebSocketHub()
+leader_tasks: List[asyncio.Task] = []
+
+async def _publish_updates():
+    """Diff the live state once per interval; every worker's clients get the delta, or a heartbeat"""
+    while True:
+        try:
+            state = await services.news_aggregator.get_live_state()
+            message = ws_hub.advance(state)
+            await ws_hub.broadcast(message)
+            # The state lets workers that missed a message catch up without a gap
+            await bus.publish("ws.update", {"epoch": ws_hub.log.epoch, "message": message, "state": ws_hub.log.state()})
+        except Exception as e:
+            logger.error(f"WebSocket update failed: {e}")
+        await asyncio.sleep(settings.ws_update_interval)
+
+async def _start_leader_duties():
+    services.event_ingestor.replay_enabled = True
+    await services.partition_manager.start()
+    if settings.article_archive_enabled:
+        await services.article_archive.start()
+    if settings.backfill_catch_up_interval:
+        await services.backfill_manager.start()
+    leader_tasks.append(asyncio.create_task(_publish_updates()))
+
+async def _stop_leader_duties():
+    services.event_ingestor.replay_enabled = False
+    for task in leader_tasks:
+        task.cancel()
+    await asyncio.gather(*leader_tasks, return_exceptions=True)
+    leader_tasks.clear()
+    await services.partition_manager.stop()
+    if services.is_built("article_archive"):
+        await services.article_archive.stop()
+    if services.is_built("backfill_manager"):
+        await services.backfill_manager.stop()
+
+leader.on_elected.append(_start_leader_duties)
+leader.on_demoted.append(_stop_leader_duties)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("🚀 Starting SOTA.ai backend...")
-    await init_db()
-    await mcp_server.start()
+    metrics.setup_tracing()
+    async with startup_lock():  # workers start together; create the schema once
+        await init_db()
+    await replica_router.start()
+    await bus.start()
+    await services.mcp_server.start()
+    services.event_ingestor.replay_enabled = False  # until this worker is elected
+    await services.event_ingestor.start()
+    await services.stats_rollup.start()
+    await services.engagement.start()
+    await leader.start()
     logger.info("✅ SOTA.ai backend started successfully!")
     
     yield
     
     # Shutdown
     logger.info("🔄 Shutting down SOTA.ai backend...")
-    await mcp_server.stop()
+    # Send WebSocket clients elsewhere and hand leadership over before closing
+    await ws_hub.drain()
+    await profiler.stop()  # keep what a running session collected
+    await leader.stop()
+    await bus.stop()
+    await services.close()
+    await rate_limiter.close()
+    await close_db()
+    metrics.shutdown_tracing()
     logger.info("✅ SOTA.ai backend shutdown complete!")
 
 # FastAPI app
@@ -55,6 +123,81 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Response cache for read-mostly endpoints; added before CORS so it sits
+# inside it and cached bodies never carry per-origin headers
+http_cache = HTTPResponseCache({
+    "/api/sources": CachePolicy(ttl=15, stale_while_revalidate=30, tags=("sources",)),
+    "/api/stats": CachePolicy(ttl=5, stale_while_revalidate=30, tags=("stats",)),
+    "/api/articles/latest": CachePolicy(
+        ttl=60,
+        stale_while_revalidate=120,
+        tags=("articles",),
+        query_params=("limit", "importance")
+    ),
+    "/api/newsletter/today": CachePolicy(
+        ttl=300,
+        stale_while_revalidate=600,
+        tags=("newsletter",),
+        # Keyed by date, so yesterday's issue is never served (or counted) after midnight
+        vary=lambda: datetime.now().strftime('%Y-%m-%d'),
+        on_hit=lambda scope, day: services.engagement.record_view(f"newsletter_{day}")
+    ),
+})
+if settings.http_cache_enabled:
+    app.add_middleware(ResponseCacheMiddleware, cache=http_cache)
+
+# Rate limiting sits outside the cache, so floods of cached reads are turned
+# away too, and inside CORS, so browsers can read the 429
+rate_limiter = RateLimiter()
+if settings.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+def _on_newsletter_generated(newsletter):
+    article_ids = [article.id for article in newsletter["articles"]]
+    if services.is_built("edition_engine"):  # nothing to invalidate otherwise
+        services.edition_engine.invalidate(article_ids)
+    http_cache.invalidate("newsletter", "stats")
+    bus.publish_nowait("newsletter.generated", {"date": newsletter["date"], "article_ids": article_ids})
+
+def _on_articles_ingested(articles):
+    http_cache.invalidate("articles", "stats")
+    bus.publish_nowait("http_cache.invalidate", {"tags": ["articles", "stats"]})
+
+def _on_remote_newsletter(data):
+    # Another worker generated it; drop our copies so the next read picks it up
+    if services.is_built("ai_processor"):
+        services.ai_processor.newsletter_cache.pop(data["date"], None)
+    if services.is_built("edition_engine"):
+        services.edition_engine.invalidate(data["article_ids"])
+    http_cache.invalidate("newsletter", "stats")
+
+services.on_newsletter_generated.append(_on_newsletter_generated)
+services.on_articles_ingested.append(_on_articles_ingested)
+services.on_source_state_change.append(lambda breaker, previous, state: http_cache.invalidate("sources"))
+bus.subscribe("newsletter.generated", _on_remote_newsletter)
+bus.subscribe("http_cache.invalidate", lambda data: http_cache.invalidate(*data["tags"]))
+def _on_remote_update(data):
+    ws_hub.follow(data)
+    return ws_hub.broadcast(data["message"])
+
+def _on_snapshot_request(data):
+    # A follower with nothing to serve yet; the heartbeat carries our state without touching the log
+    if leader.is_leader and ws_hub.synced.is_set():
+        return bus.publish("ws.update", {"epoch": ws_hub.log.epoch, "message": ws_hub.log.heartbeat(), "state": ws_hub.log.state()})
+
+bus.subscribe("ws.update", _on_remote_update)
+bus.subscribe("ws.snapshot_request", _on_snapshot_request)
+
+def _on_remote_profile_start(data):
+    # Every worker profiles its own share of the traffic
+    try:
+        profiler.start(**data)
+    except (ValueError, RuntimeError) as e:
+        logger.warning(f"⚠️ Profiling not started on this worker: {e}")
+
+bus.subscribe("profiling.start", _on_remote_profile_start)
+bus.subscribe("profiling.stop", lambda data: profiler.stop())
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -64,6 +207,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Stage breakdowns (Server-Timing) for profiled requests; a pass-through otherwise
+app.add_middleware(ProfilingMiddleware, on_auth_failure=rate_limiter.penalize if settings.rate_limit_enabled else None)
+
+# Outermost, so cached and CORS-preflight responses are timed too
+if settings.metrics_enabled:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def _collect_metrics():
+    """Copy current gauges and service counters into the metrics registry"""
+    metrics.WEBSOCKET_CONNECTIONS.set(len(ws_hub.clients))
+    metrics.LEADER.set(1 if leader.is_leader else 0)
+    
+    pools = get_pool_stats()
+    engines = [("primary", pools["primary"]), ("analytics", pools["analytics"])]
+    engines += [(f"replica_{i}", replica) for i, replica in enumerate(pools["replicas"])]
+    for name, stats in engines:
+        for state in ("size", "checked_out", "overflow"):
+            metrics.DB_POOL_CONNECTIONS.labels(name, state).set(stats[state])
+        metrics.DB_POOL_CHECKOUT_TIMEOUTS.labels(name).set(stats["timeouts"])
+        metrics.DB_POOL_CHECKOUT_WAIT_MAX.labels(name).set(stats["max_wait_ms"] / 1000)
+    
+    for result in ("hits", "stale_hits", "misses", "not_modified"):
+        metrics.HTTP_CACHE_REQUESTS.labels(result).set(http_cache.stats[result])
+    
+    # Only services that exist; scraping must not build anything
+    if services.is_built("response_cache") and services.response_cache is not None:
+        stats = services.response_cache.stats()
+        for result in ("hits", "prefix_hits", "misses"):
+            metrics.RESPONSE_CACHE_LOOKUPS.labels(result).set(stats[result])
+        metrics.RESPONSE_CACHE_HIT_RATIO.set(stats["hit_rate"])
+    if services.is_built("news_aggregator"):
+        for name, breaker in services.news_aggregator.health.breakers.items():
+            metrics.SOURCE_CIRCUIT_STATE.labels(name).set(CIRCUIT_STATES[breaker.state])
+            metrics.SOURCE_HEALTH_SCORE.labels(name).set(breaker.health()["health_score"])
+    if services.is_built("content_extractor") and services.content_extractor is not None:
+        metrics.QUEUE_DEPTH.labels("content_extraction").set(services.content_extractor.pending)
+        for event, count in services.content_extractor.stats.items():
+            metrics.CONTENT_EXTRACTION_EVENTS.labels(event).set(count)
+    if services.is_built("event_ingestor"):
+        metrics.QUEUE_DEPTH.labels("analytics_events").set(services.event_ingestor.get_stats()["buffered"])
+    if services.is_built("backfill_manager"):
+        running = sum(1 for job in services.backfill_manager.jobs.values() if job.status == "running")
+        metrics.QUEUE_DEPTH.labels("backfill_jobs").set(running)
+
+metrics.registry.on_collect.append(_collect_metrics)
+
+# Health probes, cached for HEALTH_CACHE_SECONDS
+health = HealthChecker()
+
+async def _probe_mcp_server():
+    if not services.mcp_server.is_running:
+        raise RuntimeError("not running")
+
+async def _probe_event_ingestor():
+    stats = services.event_ingestor.get_stats()
+    if not stats["running"]:
+        raise RuntimeError("flush loop is not running")
+    return f"{stats['buffered']}/{stats['capacity']} buffered"
+
+async def _probe_news_sources():
+    if not services.is_built("news_aggregator") or not services.news_aggregator.health.breakers:
+        return "no crawl yet"
+    breakers = services.news_aggregator.health.breakers.values()
+    open_circuits = [breaker.name for breaker in breakers if breaker.state == "open"]
+    if len(open_circuits) == len(breakers):
+        raise RuntimeError("every source circuit is open")
+    return f"{len(open_circuits)} of {len(breakers)} source circuits open"
+
+async def _probe_leader():
+    return "leader" if leader.is_leader else "follower"
+
+health.add("database", ping)
+health.add("mcp_server", _probe_mcp_server)
+health.add("event_ingestor", _probe_event_ingestor)
+health.add("news_sources", _probe_news_sources, critical=False)
+health.add("leader", _probe_leader, critical=False)
+
 # Pydantic models
 class ArticleResponse(BaseModel):
     id: str
@@ -88,6 +310,31 @@ class NewsletterRequest(BaseModel):
     date: Optional[str] = None
     force_regenerate: bool = False
 
+class DeliveryRequest(BaseModel):
+    date: Optional[str] = None
+    frequency: Optional[str] = "daily"
+    topics: Optional[List[str]] = None
+
+class BackfillRequest(BaseModel):
+    source: str = "arxiv"
+    start: Optional[datetime] = None  # UTC; omitted means catch up from the last backfill
+    end: Optional[datetime] = None
+
+class ProfileRequest(BaseModel):
+    mode: str = "stages"  # stages, sample, cprofile, tracemalloc
+    seconds: float = 30.0
+    route: Optional[str] = None  # glob on the request path, e.g. /api/newsletter/*
+    interval_ms: Optional[float] = None  # sampler period
+
+async def require_admin(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints are hidden unless ADMIN_TOKEN is set, and need it in X-Admin-Token"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin_token(x_admin_token):
+        if settings.rate_limit_enabled:
+            await rate_limiter.penalize(request.scope)  # guesses cost more than the route
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 # API Routes
 @app.get("/")
 async def root():
@@ -101,64 +348,126 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "timestamp": "2024-01-15T12:00:00Z",
-        "services": {
-            "database": "connected",
-            "mcp_server": "running",
-            "ai_processor": "ready",
-            "news_aggregator": "active"
-        }
-    }
+    """Health check endpoint (probe results are cached for a few seconds)"""
+    report = await health.check()
+    body = {**report, "database_pool": get_pool_stats()}
+    return JSONResponse(body, status_code=503 if report["status"] == UNHEALTHY else 200)
+
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        """Prometheus metrics for this worker"""
+        return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/api/articles/latest", response_model=List[ArticleResponse])
 async def get_latest_articles(
     limit: int = 20,
     importance: Optional[str] = None,
-    db=Depends(get_db)
+    db=Depends(get_read_db)
 ):
     """Get latest AI articles"""
     try:
-        articles = await news_aggregator.get_latest_articles(
+        articles = await services.news_aggregator.get_latest_articles(
             limit=limit,
             importance_filter=importance,
             db=db
         )
-        return [ArticleResponse(**article.dict()) for article in articles]
+        if len(articles) < limit and settings.article_archive_enabled:
+            # The hot table only holds recent articles; older ones come from the archive
+            archived = await asyncio.to_thread(services.article_archive.latest, limit - len(articles), importance)
+            articles.extend(ArticleRecord.from_row(row) for row in archived)
+        if settings.fast_json_enabled:
+            # Records are encoded directly; no ArticleResponse per article
+            return FastJSONResponse(articles)
+        return [ArticleResponse(**article.to_response()) for article in articles]
     except Exception as e:
         logger.error(f"Error fetching latest articles: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch articles")
 
+@app.get("/api/articles/{article_id}", response_model=ArticleResponse)
+async def get_article(article_id: str, db=Depends(get_read_db)):
+    """Get a single article, falling through to the archive for older ones"""
+    stored = await db.get(StoredArticle, article_id)
+    row = None
+    if stored is not None:
+        row = {column.name: getattr(stored, column.name) for column in StoredArticle.__table__.columns}
+    elif settings.article_archive_enabled:
+        row = await asyncio.to_thread(services.article_archive.get, article_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    record = ArticleRecord.from_row(row)
+    if settings.fast_json_enabled:
+        return FastJSONResponse(record)
+    return ArticleResponse(**record.to_response())
+
 @app.get("/api/newsletter/today", response_model=NewsletterResponse)
-async def get_todays_newsletter(db=Depends(get_db)):
+async def get_todays_newsletter(request: Request, db=Depends(get_read_db)):
     """Get today's AI newsletter"""
     try:
-        newsletter = await ai_processor.get_todays_newsletter(db=db)
+        newsletter = await services.ai_processor.get_todays_newsletter(db=db)
         if not newsletter:
             # Generate newsletter if it doesn't exist
-            newsletter = await ai_processor.generate_daily_newsletter(db=db)
+            newsletter = await services.ai_processor.generate_daily_newsletter(db=db)
         
-        return NewsletterResponse(**newsletter.dict())
+        if not is_revalidation(request.scope):  # a cache refresh serves nobody
+            services.engagement.record_view(newsletter["id"])
+        content = {field: newsletter[field] for field in NewsletterResponse.model_fields}
+        if settings.fast_json_enabled:
+            return FastJSONResponse(content)
+        content["articles"] = [ArticleResponse(**article.to_response()) for article in content["articles"]]
+        return NewsletterResponse(**content)
     except Exception as e:
         logger.error(f"Error fetching today's newsletter: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch newsletter")
 
+@app.get("/api/newsletter/today/personalized")
+async def get_personalized_newsletter(
+    topics: List[str] = Query(default=[]),
+    format: str = "markdown"
+):
+    """Get today's newsletter assembled for a set of topics"""
+    if format not in ("markdown", "html"):
+        raise HTTPException(status_code=400, detail="Format must be 'markdown' or 'html'")
+    try:
+        newsletter = await services.ai_processor.get_todays_newsletter()
+        if not newsletter:
+            newsletter = await services.ai_processor.generate_daily_newsletter()
+        content = services.edition_engine.assemble(newsletter, topics, fmt=format)
+        services.engagement.record_view(newsletter["id"])
+        return {
+            "id": newsletter["id"],
+            "date": newsletter["date"],
+            "title": newsletter["title"],
+            "topics": topics,
+            "format": format,
+            "content": content
+        }
+    except Exception as e:
+        logger.error(f"Error building personalized newsletter: {e}")
+        raise HTTPException(status_code=500, detail="Failed to build newsletter")
+
+async def generate_newsletter_job(date: Optional[str] = None, force_regenerate: bool = False):
+    """Background newsletter generation with its own session lifecycle"""
+    async with background_session() as db:
+        await services.ai_processor.generate_daily_newsletter(
+            date=date,
+            force_regenerate=force_regenerate,
+            db=db
+        )
+
 @app.post("/api/newsletter/generate", response_model=NewsletterResponse)
 async def generate_newsletter(
     request: NewsletterRequest,
-    background_tasks: BackgroundTasks,
-    db=Depends(get_db)
+    background_tasks: BackgroundTasks
 ):
     """Generate a new newsletter"""
     try:
-        # Add to background task for async processing
+        # Add to background task for async processing; the job opens its own
+        # session since the request's one is closed before background tasks run
         background_tasks.add_task(
-            ai_processor.generate_daily_newsletter,
+            generate_newsletter_job,
             date=request.date,
-            force_regenerate=request.force_regenerate,
-            db=db
+            force_regenerate=request.force_regenerate
         )
         
         return {"message": "Newsletter generation started", "status": "processing"}
@@ -166,49 +475,142 @@ async def generate_newsletter(
         logger.error(f"Error generating newsletter: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate newsletter")
 
+@app.post("/api/newsletter/{newsletter_id}/engagement", status_code=202)
+async def track_newsletter_engagement(newsletter_id: str, action: str):
+    """Record a newsletter share or click"""
+    if action not in ("share", "click"):
+        raise HTTPException(status_code=400, detail="Action must be 'share' or 'click'")
+    services.engagement.record(newsletter_id, f"{action}s")
+    return {"status": "recorded"}
+
 @app.get("/api/sources")
 async def get_news_sources():
-    """Get list of monitored news sources"""
+    """Get monitored news sources with their circuit state and health score"""
+    aggregator = services.news_aggregator
+    sources = aggregator.source_table()
+    successes = [b.last_success_at for b in aggregator.health.breakers.values() if b.last_success_at]
     return {
-        "sources": [
-            {"name": "ArXiv", "type": "research", "url": "https://arxiv.org"},
-            {"name": "HackerNews", "type": "community", "url": "https://news.ycombinator.com"},
-            {"name": "Reddit r/MachineLearning", "type": "community", "url": "https://reddit.com/r/MachineLearning"},
-            {"name": "OpenAI Blog", "type": "official", "url": "https://openai.com/blog"},
-            {"name": "Google AI Blog", "type": "official", "url": "https://ai.googleblog.com"},
-            {"name": "MIT Technology Review", "type": "publication", "url": "https://technologyreview.com"},
-            {"name": "Nature AI", "type": "academic", "url": "https://nature.com/subjects/machine-learning"},
-            {"name": "AI News", "type": "publication", "url": "https://artificialintelligence-news.com"},
-        ],
-        "total_sources": 247,
-        "active_sources": 235,
-        "last_updated": "2024-01-15T12:00:00Z"
+        "sources": sources,
+        "total_sources": len(sources),
+        "active_sources": sum(1 for source in sources if source["health"]["state"] != "open"),
+        "last_updated": datetime.fromtimestamp(max(successes), timezone.utc).isoformat() if successes else None
     }
 
 @app.get("/api/stats")
 async def get_platform_stats():
     """Get platform statistics"""
-    return {
-        "articles_processed_today": 1432,
-        "total_articles": 89234,
-        "sources_monitored": 247,
-        "ai_accuracy_score": 98.7,
-        "newsletters_generated": 365,
-        "active_subscribers": 12847,
-        "last_updated": "2024-01-15T12:00:00Z"
-    }
+    return services.stats_rollup.get_snapshot()
+
+@app.get("/api/stats/events")
+async def get_event_stats(
+    granularity: str = "hour",
+    event_type: Optional[str] = None,
+    since: Optional[datetime] = None
+):
+    """Get time-bucketed analytics event counts"""
+    try:
+        series = await services.stats_rollup.get_event_series(
+            granularity=granularity,
+            event_type=event_type,
+            since=since
+        )
+        return {"granularity": granularity, "buckets": series}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching event stats: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch event stats")
 
 @app.post("/api/subscribe")
-async def subscribe_newsletter(email: str):
+async def subscribe_newsletter(subscriber: SubscriberCreate):
     """Subscribe to newsletter"""
-    # TODO: Implement newsletter subscription
-    return {"message": f"Successfully subscribed {email} to SOTA.ai newsletter"}
+    try:
+        stored, activated = await upsert_subscriber(subscriber)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error subscribing {subscriber.email}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to subscribe")
+    
+    if activated:
+        services.stats_rollup.record_subscriber()
+    return {
+        "message": f"Successfully subscribed {stored['email']} to SOTA.ai newsletter",
+        "subscriber": stored
+    }
+
+@app.post("/api/newsletter/deliver", status_code=202)
+async def deliver_newsletter(request: DeliveryRequest, background_tasks: BackgroundTasks):
+    """Send a generated newsletter to subscribers"""
+    newsletter = await services.ai_processor.generate_daily_newsletter(date=request.date)
+    background_tasks.add_task(
+        services.delivery_pipeline.deliver,
+        newsletter,
+        frequency=request.frequency,
+        topics=request.topics
+    )
+    return {"message": "Newsletter delivery started", "newsletter_id": newsletter["id"]}
+
+@app.post("/api/backfill", status_code=202)
+async def start_backfill(request: BackfillRequest):
+    """Backfill historical articles for a date range, resuming from its checkpoint"""
+    try:
+        if request.start is None:
+            job = await services.backfill_manager.catch_up(request.source)
+            if job is None:
+                return {"message": "Already caught up", "source": request.source}
+        else:
+            end = request.end or datetime.utcnow().replace(second=0, microsecond=0)
+            job = services.backfill_manager.submit(request.source, request.start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Backfill started", "backfill": job.progress()}
+
+@app.get("/api/backfill")
+async def get_backfill_status():
+    """Progress of this worker's backfills and the stored checkpoints"""
+    try:
+        return {
+            "running": services.backfill_manager.status(),
+            "checkpoints": await services.backfill_manager.checkpoints()
+        }
+    except Exception as e:
+        logger.error(f"Error fetching backfill status: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch backfill status")
+
+@app.post("/api/events", status_code=202)
+async def ingest_events(
+    events: Union[AnalyticsEventCreate, List[AnalyticsEventCreate]],
+    request: Request
+):
+    """Accept one or many analytics events for buffered, batched storage"""
+    if not isinstance(events, list):
+        events = [events]
+    
+    ip_address = request.client.host if request.client else None
+    user_agent = request.headers.get("user-agent")
+    batch = []
+    for event in events:
+        data = event.model_dump()
+        data["ip_address"] = data["ip_address"] or ip_address
+        data["user_agent"] = data["user_agent"] or user_agent
+        batch.append(data)
+    
+    try:
+        accepted = services.event_ingestor.enqueue_many(batch)
+    except BufferFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Event buffer is full, retry later",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    return {"accepted": accepted}
 
 @app.get("/api/mcp/status")
 async def get_mcp_status():
     """Get MCP server status"""
     try:
-        status = await mcp_server.get_status()
+        status = await services.mcp_server.get_status()
         return status
     except Exception as e:
         logger.error(f"Error getting MCP status: {e}")
@@ -218,34 +620,87 @@ async def get_mcp_status():
 async def process_with_mcp(content: str):
     """Process content using MCP server"""
     try:
-        result = await mcp_server.process_content(content)
+        result = await services.mcp_server.process_content(content)
         return {"result": result}
     except Exception as e:
         logger.error(f"Error processing with MCP: {e}")
         raise HTTPException(status_code=500, detail="Failed to process with MCP")
 
+@app.post("/api/admin/profile", status_code=202, dependencies=[Depends(require_admin)])
+async def start_profiling(request: ProfileRequest):
+    """Profile every worker for a while; output lands in PROFILE_OUTPUT_DIR on each host"""
+    options = request.model_dump()
+    try:
+        session = profiler.start(**options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    await bus.publish("profiling.start", options)
+    return {"message": "Profiling started", "session": session.describe()}
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def get_profiling_status():
+    """This worker's running session and its recent results"""
+    return {
+        "active": profiler.session.describe() if profiler.session is not None else None,
+        "recent": list(profiler.recent)
+    }
+
+@app.delete("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def stop_profiling():
+    """End the running session early and write its output"""
+    result = await profiler.stop()
+    await bus.publish("profiling.stop", {})
+    if result is None:
+        raise HTTPException(status_code=404, detail="No profiling session is running")
+    return {"message": "Profiling stopped", "result": result}
+
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws/updates")
-async def websocket_endpoint(websocket):
-    """WebSocket endpoint for real-time AI news updates"""
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+    """Real-time AI news updates: a snapshot or the missed deltas, then deltas and heartbeats"""
+    if ws_hub.draining:
+        await websocket.close(code=1001)
+        return
     await websocket.accept()
     try:
+        if not ws_hub.synced.is_set():
+            # Fresh worker: only the leader advances the log, so ask it for its state
+            if not leader.is_leader:
+                await bus.publish("ws.snapshot_request", {})
+            if not await ws_hub.wait_synced(settings.ws_update_interval):
+                await websocket.close(code=1013)  # try again later
+                return
+        for update in ws_hub.log.catch_up(since, epoch):
+            await ws_hub.send(websocket, update)
+        # Anything broadcast while catching up is missed; the client sees the gap and resyncs
+        ws_hub.add(websocket)
         while True:
-            # Send real-time updates
-            update = await news_aggregator.get_latest_update()
-            await websocket.send_json(update)
-            await asyncio.sleep(30)  # Send updates every 30 seconds
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                request = json.loads(message.get("text") or "{}")
+            except ValueError:
+                continue
+            if isinstance(request, dict) and request.get("type") == "resync":
+                for update in ws_hub.log.catch_up(request.get("since"), request.get("epoch")):
+                    await ws_hub.send(websocket, update)
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        await websocket.close()
+        ws_hub.discard(websocket)
 
 if __name__ == "__main__":
+    import uvicorn
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=True,
+        ws_per_message_deflate=settings.ws_per_message_deflate,
         log_level="info"
     )
 
@@ -4,20 +4,106 @@ Handles newsletter generation, content analysis, and AI-powered curation
 """
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+import time
+from typing import Dict, Any, List, Optional, Awaitable, Callable
+from datetime import datetime, timedelta, timezone
 import json
 
+from sqlalchemy import update
+
+from .config import settings
+from .database import Newsletter, engine
+from .metrics import LLM_LATENCY, LLM_REQUESTS, LLM_TOKENS, span
+from .response_cache import ResponseCache, estimate_tokens
+from .rollups import StatsRollup
+from .personalization import render_article_markdown
+from .profiling import stage
+from .ranking import RankingEngine
+from .records import ArticleRecord
+
 logger = logging.getLogger(__name__)
 
 class AIProcessor:
     """AI-powered content processing and newsletter generation"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        response_cache: Optional[ResponseCache] = None,
+        stats_rollup: Optional[StatsRollup] = None
+    ):
         self.openai_client = None  # Initialize with actual OpenAI client
         self.anthropic_client = None  # Initialize with actual Anthropic client
         self.newsletter_cache = {}
+        self.provider = settings.ai_provider
+        self.model = settings.ai_model
+        
+        # Prompt/response cache below the model clients
+        self._owns_response_cache = response_cache is None
+        if response_cache is None and settings.response_cache_enabled:
+            response_cache = ResponseCache(
+                path=settings.response_cache_path,
+                memory_entries=settings.response_cache_memory_entries,
+                ttl_seconds=settings.response_cache_ttl_seconds
+            )
+        self.response_cache = response_cache
+        self.stats_rollup = stats_rollup
+        self.ranker = RankingEngine()
+        
+        # Invalidation hooks, called with each newly generated newsletter
+        self.on_newsletter_generated: List[Callable[[Dict[str, Any]], None]] = []
+    
+    @stage("ai.complete")
+    async def _complete(
+        self,
+        prompt: str,
+        compute: Callable[[], Awaitable[str]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Run a model call through the response cache"""
+        called = False
+        
+        async def counted() -> str:
+            nonlocal called
+            called = True
+            response = await compute()
+            self._count_tokens(prompt, response)
+            return response
+        
+        task = (params or {}).get("task", "completion")
+        started = time.perf_counter()
+        with span("llm.complete", task=task, provider=self.provider, model=self.model):
+            if self.response_cache is None:
+                response = await counted()
+            else:
+                response = await self.response_cache.get_or_compute(
+                    self.provider, self.model, prompt, counted, params=params
+                )
+        self._observe_call(task, "miss" if called else "hit", started)
+        return response
+    
+    def _count_tokens(self, prompt: str, response: str):
+        LLM_TOKENS.labels(self.provider, self.model, "prompt").inc(estimate_tokens(prompt))
+        LLM_TOKENS.labels(self.provider, self.model, "completion").inc(estimate_tokens(response))
+    
+    def _observe_call(self, task: str, cache: str, started: float):
+        """Model call metrics; cache is hit, prefix_hit or miss ("disabled" without a cache)"""
+        if self.response_cache is None:
+            cache = "disabled"
+        LLM_REQUESTS.labels(self.provider, self.model, task, cache).inc()
+        LLM_LATENCY.labels(self.provider, self.model, task, cache).observe(time.perf_counter() - started)
+    
+    async def close(self):
+        """Release the response cache if this processor created it"""
+        if self._owns_response_cache and self.response_cache is not None:
+            self.response_cache.close()
     
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Response cache statistics (saved tokens, latency, hit rate)"""
+        if self.response_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.response_cache.stats()}
+    
+    @stage("newsletter.today")
     async def get_todays_newsletter(self, db=None) -> Optional[Dict[str, Any]]:
         """Get today's newsletter if it exists"""
         today = datetime.now().strftime('%Y-%m-%d')
@@ -33,25 +119,27 @@ class AIProcessor:
             "title": f"SOTA.ai Daily Digest - {datetime.now().strftime('%B %d, %Y')}",
             "content": self._generate_mock_newsletter_content(),
             "articles": [
-                {
-                    "id": "1",
-                    "title": "OpenAI Announces GPT-5 with Revolutionary Multimodal Capabilities",
-                    "summary": "The latest iteration promises unprecedented understanding across text, image, audio, and video modalities.",
-                    "url": "https://openai.com/blog/gpt-5-announcement",
-                    "source": "OpenAI Blog",
-                    "published_at": (datetime.now() - timedelta(hours=2)).isoformat(),
-                    "tags": ["OpenAI", "GPT-5", "Multimodal", "LLM"],
-                    "importance": "high",
-                    "ai_score": 0.95
-                }
+                ArticleRecord(
+                    id="1",
+                    title="OpenAI Announces GPT-5 with Revolutionary Multimodal Capabilities",
+                    summary="The latest iteration promises unprecedented understanding across text, image, audio, and video modalities.",
+                    url="https://openai.com/blog/gpt-5-announcement",
+                    source="OpenAI Blog",
+                    published_at=(datetime.now() - timedelta(hours=2)).isoformat(),
+                    tags=("OpenAI", "GPT-5", "Multimodal", "LLM"),
+                    importance="high",
+                    ai_score=0.95
+                )
             ],
             "generated_at": datetime.now().isoformat()
         }
         
         # Cache the newsletter
         self.newsletter_cache[today] = newsletter
+        await self._store_newsletter(newsletter)
         return newsletter
     
+    @stage("newsletter.generate", root=True)
     async def generate_daily_newsletter(
         self, 
         date: Optional[str] = None, 
@@ -72,11 +160,19 @@ class AIProcessor:
             articles = await self._gather_articles_for_date(target_date)
             
             # Step 2: Analyze and rank articles
-            analyzed_articles = await self._analyze_articles(articles)
+            analyzed_articles = await self._analyze_articles(articles, target_date)
+            self.ranker.remember(target_date, analyzed_articles)
             
             # Step 3: Generate newsletter content
             newsletter_content = await self._generate_newsletter_content(analyzed_articles)
             
+            cache_stats = self.get_cache_stats()
+            if cache_stats["enabled"]:
+                logger.info(
+                    f"💾 Response cache: {cache_stats['hits']} hits, {cache_stats['prefix_hits']} prefix hits, "
+                    f"~{cache_stats['saved_tokens']} tokens and {cache_stats['saved_latency_ms']:.0f}ms saved"
+                )
+            
             # Step 4: Create newsletter object
             newsletter = {
                 "id": f"newsletter_{target_date}",
@@ -95,6 +191,13 @@ class AIProcessor:
             
             # Cache the newsletter
             self.newsletter_cache[target_date] = newsletter
+            await self._store_newsletter(newsletter)
+            
+            for hook in self.on_newsletter_generated:
+                try:
+                    hook(newsletter)
+                except Exception as e:
+                    logger.error(f"Newsletter hook failed: {e}")
             
             logger.info(f"✅ Newsletter generated successfully for {target_date}")
             return newsletter
@@ -103,67 +206,131 @@ class AIProcessor:
             logger.error(f"❌ Error generating newsletter: {e}")
             raise
     
-    async def _gather_articles_for_date(self, date: str) -> List[Dict[str, Any]]:
+    async def _store_newsletter(self, newsletter: Dict[str, Any]):
+        """Upsert the newsletter row that engagement counters are flushed into"""
+        table = Newsletter.__table__
+        stats = newsletter.get("stats", {})
+        values = {
+            "date": newsletter["date"],
+            "title": newsletter["title"],
+            "content": newsletter["content"],
+            "generated_at": datetime.fromisoformat(newsletter["generated_at"]),
+            "featured_articles": [article.id for article in newsletter["articles"]],
+            "total_articles_analyzed": stats.get("total_articles_analyzed", len(newsletter["articles"])),
+            "ai_confidence": stats.get("ai_confidence"),
+        }
+        try:
+            async with engine.begin() as conn:
+                # Regenerating keeps the row, and with it the engagement counts
+                result = await conn.execute(update(table).where(table.c.id == newsletter["id"]).values(**values))
+                created = False
+                if not result.rowcount:
+                    if conn.dialect.name == "postgresql":
+                        from sqlalchemy.dialects.postgresql import insert
+                    else:
+                        from sqlalchemy.dialects.sqlite import insert
+                    result = await conn.execute(
+                        insert(table).values(id=newsletter["id"], **values).on_conflict_do_nothing()
+                    )
+                    created = bool(result.rowcount)
+        except Exception as e:
+            logger.error(f"❌ Could not store newsletter {newsletter['id']}: {e}")
+            return
+        if created and self.stats_rollup is not None:
+            self.stats_rollup.record_newsletter()
+    
+    @stage("newsletter.gather")
+    async def _gather_articles_for_date(self, date: str) -> List[ArticleRecord]:
         """Gather articles for a specific date"""
         # Mock article gathering - in production, fetch from news aggregator
         mock_articles = [
-            {
-                "id": "1",
-                "title": "OpenAI Announces GPT-5 with Revolutionary Multimodal Capabilities",
-                "content": "OpenAI has unveiled GPT-5, marking a significant leap forward in artificial intelligence capabilities. The new model demonstrates unprecedented understanding across multiple modalities including text, images, audio, and video, setting new benchmarks in AI reasoning and comprehension.",
-                "url": "https://openai.com/blog/gpt-5-announcement",
-                "source": "OpenAI Blog",
-                "published_at": f"{date}T10:00:00Z"
-            },
-            {
-                "id": "2", 
-                "title": "Google DeepMind Achieves Breakthrough in Protein Folding Prediction",
-                "content": "Google DeepMind's AlphaFold 3 has achieved a remarkable 99.9% accuracy in predicting protein structures, potentially revolutionizing drug discovery and biological research. This breakthrough could accelerate the development of new medicines and treatments.",
-                "url": "https://deepmind.com/blog/alphafold-3",
-                "source": "DeepMind",
-                "published_at": f"{date}T14:30:00Z"
-            },
-            {
-                "id": "3",
-                "title": "Meta Releases Llama 3: Open Source Model Rivals GPT-4",
-                "content": "Meta has released Llama 3, an open-source language model that demonstrates competitive performance with proprietary models like GPT-4. This release continues Meta's commitment to open AI research and democratizing access to advanced language models.",
-                "url": "https://ai.meta.com/blog/llama-3-release",
-                "source": "Meta AI", 
-                "published_at": f"{date}T16:45:00Z"
-            }
+            ArticleRecord(
+                id="1",
+                title="OpenAI Announces GPT-5 with Revolutionary Multimodal Capabilities",
+                content="OpenAI has unveiled GPT-5, marking a significant leap forward in artificial intelligence capabilities. The new model demonstrates unprecedented understanding across multiple modalities including text, images, audio, and video, setting new benchmarks in AI reasoning and comprehension.",
+                url="https://openai.com/blog/gpt-5-announcement",
+                source="OpenAI Blog",
+                published_at=f"{date}T10:00:00Z"
+            ),
+            ArticleRecord(
+                id="2", 
+                title="Google DeepMind Achieves Breakthrough in Protein Folding Prediction",
+                content="Google DeepMind's AlphaFold 3 has achieved a remarkable 99.9% accuracy in predicting protein structures, potentially revolutionizing drug discovery and biological research. This breakthrough could accelerate the development of new medicines and treatments.",
+                url="https://deepmind.com/blog/alphafold-3",
+                source="DeepMind",
+                published_at=f"{date}T14:30:00Z"
+            ),
+            ArticleRecord(
+                id="3",
+                title="Meta Releases Llama 3: Open Source Model Rivals GPT-4",
+                content="Meta has released Llama 3, an open-source language model that demonstrates competitive performance with proprietary models like GPT-4. This release continues Meta's commitment to open AI research and democratizing access to advanced language models.",
+                url="https://ai.meta.com/blog/llama-3-release",
+                source="Meta AI", 
+                published_at=f"{date}T16:45:00Z"
+            )
         ]
         
         return mock_articles
     
-    async def _analyze_articles(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    @stage("ai.analyze_articles")
+    async def _analyze_articles(self, articles: List[ArticleRecord], date: Optional[str] = None) -> List[ArticleRecord]:
         """Analyze articles using AI to determine importance and extract insights"""
-        analyzed = []
+        now = self._reference_time(date)
+        
+        # Batch-rank on cheap features first so only a shortlist reaches the model
+        shortlist = articles
+        if len(articles) > settings.ranking_shortlist:
+            shortlist = self.ranker.rank(articles, settings.ranking_shortlist, now=now, exclude_edition=date)
         
-        for article in articles:
+        for article in shortlist:
             # Mock AI analysis - in production, use actual AI models
             analysis = await self._analyze_single_article(article)
             
-            # Only include high-importance articles
-            if analysis.get("importance_score", 0) >= 0.7:
-                analyzed.append({
-                    **article,
-                    "summary": analysis["summary"],
-                    "tags": analysis["tags"],
-                    "importance": analysis["importance_level"],
-                    "ai_score": analysis["importance_score"],
-                    "key_insights": analysis["key_insights"]
-                })
+            # Enriched in place
+            article.summary = analysis["summary"]
+            article.tags = tuple(analysis["tags"])
+            article.importance = analysis["importance_level"]
+            article.ai_score = analysis["importance_score"]
+            article.key_insights = tuple(analysis["key_insights"])
         
-        # Sort by AI score descending
-        analyzed.sort(key=lambda x: x["ai_score"], reverse=True)
-        return analyzed[:10]  # Top 10 articles
+        # Final ranking with the model's importance score, diversified (MMR)
+        return self.ranker.rank(shortlist, settings.ranking_top_k, now=now, exclude_edition=date)
     
-    async def _analyze_single_article(self, article: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def _reference_time(date: Optional[str]) -> Optional[float]:
+        """Recency is measured from the end of a past edition's day, otherwise from now"""
+        if not date:
+            return None
+        end_of_day = datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(days=1)
+        return min(end_of_day.timestamp(), datetime.now(timezone.utc).timestamp())
+    
+    @stage("ai.analyze_article")
+    async def _analyze_single_article(self, article: ArticleRecord) -> Dict[str, Any]:
         """Analyze a single article"""
+        prompt = self._build_analysis_prompt(article)
+        raw = await self._complete(
+            prompt,
+            lambda: self._run_article_analysis(article),
+            params={"task": "analyze_article"}
+        )
+        return json.loads(raw)
+    
+    def _build_analysis_prompt(self, article: ArticleRecord) -> str:
+        """Build the analysis prompt for an article"""
+        return (
+            "Analyze the following AI news article. Return a summary, up to 5 tags, "
+            "an importance level and score, and the key insights as JSON.\n\n"
+            f"Title: {article.title}\n"
+            f"Source: {article.source}\n"
+            f"Content: {article.content}"
+        )
+    
+    async def _run_article_analysis(self, article: ArticleRecord) -> str:
+        """Model call for article analysis, returns the raw JSON response"""
         await asyncio.sleep(0.1)  # Simulate AI processing time
         
         # Mock analysis based on article content
-        content = article.get("content", "") + " " + article.get("title", "")
+        content = article.content + " " + article.title
         
         # Determine importance based on keywords
         high_importance_keywords = [
@@ -191,7 +358,7 @@ class AIProcessor:
         ai_tags = ["AI", "Machine Learning", "Deep Learning", "LLM", "OpenAI", "Google", "Meta"]
         found_tags = [tag for tag in ai_tags if tag.lower() in content_lower]
         
-        return {
+        return json.dumps({
             "summary": content[:200] + "..." if len(content) > 200 else content,
             "tags": found_tags[:5],
             "importance_level": importance_level,
@@ -201,12 +368,48 @@ class AIProcessor:
                 "Potential impact on industry applications",
                 "Research implications for future development"
             ][:2]  # Top 2 insights
-        }
+        })
     
-    async def _generate_newsletter_content(self, articles: List[Dict[str, Any]]) -> str:
-        """Generate newsletter content using AI"""
-        await asyncio.sleep(0.5)  # Simulate AI generation time
+    @stage("ai.highlights")
+    async def _generate_highlights(self, articles: List[ArticleRecord]) -> str:
+        """Generate the highlight sections, reusing the longest cached prefix"""
+        segments = [
+            f"Write a newsletter highlight for: {article.title} | {article.source} | "
+            f"{article.ai_score:.2f} | {article.summary} | {article.url}"
+            for article in articles
+        ]
+        
+        reused = None  # None: not generated at all (full cache hit)
+        
+        async def generate(previous: str, remaining: List[str]) -> List[str]:
+            nonlocal reused
+            reused = bool(previous)
+            # Only the articles past the cached prefix reach the model
+            start = len(articles) - len(remaining)
+            await asyncio.sleep(0.15 * len(remaining))  # Simulate AI generation time
+            pieces = [self._render_highlight(article) for article in articles[start:]]
+            self._count_tokens("\n".join(remaining), "".join(pieces))
+            return pieces
         
+        started = time.perf_counter()
+        with span("llm.complete", task="newsletter_highlights", provider=self.provider, model=self.model):
+            if self.response_cache is None:
+                content = "".join(await generate("", segments))
+            else:
+                content = await self.response_cache.get_or_extend(
+                    self.provider, self.model, segments, generate,
+                    params={"task": "newsletter_highlights"}
+                )
+        self._observe_call("newsletter_highlights", "hit" if reused is None else "prefix_hit" if reused else "miss", started)
+        return content
+    
+    def _render_highlight(self, article: ArticleRecord) -> str:
+        """Render a single highlight section"""
+        return render_article_markdown(article)
+    
+    @stage("ai.newsletter_content")
+    async def _generate_newsletter_content(self, articles: List[ArticleRecord]) -> str:
+        """Generate newsletter content using AI"""
         # Mock newsletter generation - in production, use actual AI models
         date_str = datetime.now().strftime('%B %d, %Y')
         
@@ -220,24 +423,7 @@ class AIProcessor:
 
 """
         
-        for i, article in enumerate(articles[:3], 1):
-            importance_emoji = "🔥" if article["importance"] == "high" else "⭐" if article["importance"] == "medium" else "📝"
-            
-            content += f"""
-### {importance_emoji} {article['title']}
-
-**Source:** {article['source']} | **AI Score:** {article['ai_score']:.1f}/1.0
-
-{article['summary']}
-
-**Key Insights:**
-"""
-            
-            for insight in article.get('key_insights', []):
-                content += f"- {insight}\n"
-            
-            content += f"\n**Tags:** {', '.join(article.get('tags', []))}\n"
-            content += f"**[Read More →]({article['url']})**\n\n---\n"
+        content += await self._generate_highlights(articles[:3])
         
         content += f"""
 ## 🔍 Quick Scan
@@ -245,7 +431,7 @@ class AIProcessor:
 """
         
         for article in articles[3:6]:
-            content += f"• **{article['title']}** - {article['source']} ([link]({article['url']}))\n"
+            content += f"• **{article.title}** - {article.source} ([link]({article.url}))\n"
         
         content += f"""
 
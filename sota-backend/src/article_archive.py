@@ -0,0 +1,399 @@
+"""
+Columnar archive tier for historical SOTA.ai articles
+Articles past the hot window move into one compressed columnar file per month
+"""
+import asyncio
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, JSON, delete, func, select
+
+from .config import settings
+from .database import Article, engine
+
+logger = logging.getLogger(__name__)
+
+# File layout:
+#   MAGIC | column blocks ... | index block | footer (zlib JSON) | footer length (u64) | MAGIC
+# Rows are split into row groups; every column of a row group is its own
+# compressed block, so scans only decompress the columns they ask for.
+MAGIC = b"SOTAARC1"
+FORMAT_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+# Timestamps are stored as microseconds since the epoch (naive UTC)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Archived rows are deleted by id in batches of this many (bound parameters)
+DELETE_BATCH = 500
+
+
+def _column_kind(column) -> str:
+    if isinstance(column.type, JSON):
+        return "json"
+    if isinstance(column.type, DateTime):
+        return "datetime"
+    if isinstance(column.type, Float):
+        return "float"
+    if isinstance(column.type, Boolean):
+        return "bool"
+    if isinstance(column.type, Integer):
+        return "int"
+    return "str"
+
+
+ARTICLE_SCHEMA: List[Tuple[str, str]] = [
+    (column.name, _column_kind(column)) for column in Article.__table__.columns
+]
+
+# What listings need; content is by far the largest column and only point lookups return it
+LISTING_COLUMNS: Tuple[str, ...] = tuple(name for name, _ in ARTICLE_SCHEMA if name != "content")
+
+
+def encode_column(kind: str, values: Sequence[Any], level: int = 6) -> bytes:
+    """Null mask followed by a fixed-width or offset-encoded payload, compressed"""
+    nulls = bytes(1 if value is None else 0 for value in values)
+
+    if kind in ("str", "json"):
+        offsets = array("I", [0])
+        parts = []
+        total = 0
+        for value in values:
+            if value is None:
+                data = b""
+            elif kind == "json":
+                data = json.dumps(value).encode("utf-8")
+            else:
+                data = str(value).encode("utf-8")
+            parts.append(data)
+            total += len(data)
+            offsets.append(total)
+        payload = offsets.tobytes() + b"".join(parts)
+    elif kind == "float":
+        payload = array("d", [float("nan") if value is None else float(value) for value in values]).tobytes()
+    elif kind == "datetime":
+        payload = array("q", [0 if value is None else (value - EPOCH) // _MICROSECOND for value in values]).tobytes()
+    else:  # int, bool
+        payload = array("q", [0 if value is None else int(value) for value in values]).tobytes()
+
+    return zlib.compress(nulls + payload, level)
+
+
+def decode_column(kind: str, block, rows: int) -> List[Any]:
+    """Inverse of encode_column"""
+    data = memoryview(zlib.decompress(block))
+    nulls = data[:rows]
+    payload = data[rows:]
+
+    if kind in ("str", "json"):
+        offsets = array("I")
+        offsets.frombytes(payload[:4 * (rows + 1)])
+        body = payload[4 * (rows + 1):]
+        values = []
+        for i in range(rows):
+            if nulls[i]:
+                values.append(None)
+                continue
+            text = str(body[offsets[i]:offsets[i + 1]], "utf-8")
+            values.append(json.loads(text) if kind == "json" else text)
+        return values
+
+    numbers = array("d" if kind == "float" else "q")
+    numbers.frombytes(payload)
+    if kind == "datetime":
+        return [None if nulls[i] else EPOCH + numbers[i] * _MICROSECOND for i in range(rows)]
+    if kind == "bool":
+        return [None if nulls[i] else bool(numbers[i]) for i in range(rows)]
+    return [None if nulls[i] else numbers[i] for i in range(rows)]
+
+
+def write_archive(path: str, rows: List[Dict[str, Any]], row_group_size: int = 1024):
+    """Write rows (newest first) to a columnar archive file, atomically"""
+    rows = sorted(rows, key=lambda row: row["published_at"] or EPOCH, reverse=True)
+    tmp_path = path + ".tmp"
+    groups = []
+
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        for start in range(0, len(rows), row_group_size):
+            chunk = rows[start:start + row_group_size]
+            columns = {}
+            for name, kind in ARTICLE_SCHEMA:
+                block = encode_column(kind, [row.get(name) for row in chunk])
+                columns[name] = [f.tell(), len(block)]
+                f.write(block)
+            groups.append({"rows": len(chunk), "columns": columns})
+
+        # Point-lookup index: ids sorted, with their (group, row) position
+        positions = sorted(
+            (row["id"], i // row_group_size, i % row_group_size) for i, row in enumerate(rows)
+        )
+        index_block = zlib.compress(json.dumps([
+            [p[0] for p in positions], [p[1] for p in positions], [p[2] for p in positions]
+        ]).encode("utf-8"))
+        index = [f.tell(), len(index_block)]
+        f.write(index_block)
+
+        footer = zlib.compress(json.dumps({
+            "version": FORMAT_VERSION,
+            "schema": ARTICLE_SCHEMA,
+            "rows": len(rows),
+            "row_groups": groups,
+            "index": index,
+        }).encode("utf-8"))
+        f.write(footer)
+        f.write(struct.pack("<Q", len(footer)))
+        f.write(MAGIC)
+
+    os.replace(tmp_path, path)
+
+
+class ArchiveReader:
+    """Memory-mapped reader for one archive file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        # Identifies the file this reader mapped; a rewrite replaces the path with a new inode
+        stat = os.fstat(self._file.fileno())
+        self.version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self.users = 0  # threads currently reading, see ArticleArchive.reader
+        self.retired = False
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC or self._mm[-8:] != MAGIC:
+            raise ValueError(f"Not an article archive: {path}")
+        footer_length = struct.unpack("<Q", self._mm[-16:-8])[0]
+        footer_start = len(self._mm) - 16 - footer_length
+        self.footer = json.loads(zlib.decompress(self._mm[footer_start:footer_start + footer_length]))
+        self.schema = dict(self.footer["schema"])
+        self._index: Optional[Tuple[List[str], List[int], List[int]]] = None
+
+    @property
+    def rows(self) -> int:
+        return self.footer["rows"]
+
+    def group_rows(self, group: int) -> int:
+        return self.footer["row_groups"][group]["rows"]
+
+    def _block(self, offset: int, length: int) -> memoryview:
+        return memoryview(self._mm)[offset:offset + length]
+
+    def read_group(self, group: int, columns: Optional[Sequence[str]] = None) -> Dict[str, List[Any]]:
+        """Decode selected columns of one row group"""
+        meta = self.footer["row_groups"][group]
+        names = columns or list(self.schema)
+        return {
+            name: decode_column(self.schema[name], self._block(*meta["columns"][name]), meta["rows"])
+            for name in names
+        }
+
+    def scan(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, List[Any]]]:
+        """Column batches for bulk analytics, one row group at a time"""
+        for group in range(len(self.footer["row_groups"])):
+            yield self.read_group(group, columns)
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        for batch in self.scan():
+            names = list(batch)
+            for values in zip(*batch.values()):
+                yield dict(zip(names, values))
+
+    def get(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """Point lookup through the id index"""
+        if self._index is None:
+            self._index = tuple(json.loads(zlib.decompress(self._block(*self.footer["index"]))))
+        ids, groups, positions = self._index
+        i = bisect.bisect_left(ids, article_id)
+        if i == len(ids) or ids[i] != article_id:
+            return None
+        batch = self.read_group(groups[i])
+        return {name: values[positions[i]] for name, values in batch.items()}
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+class ArticleArchive:
+    """Monthly archive files plus the job that moves old articles out of the hot table"""
+
+    def __init__(
+        self,
+        directory: str = settings.article_archive_dir,
+        archive_after_days: int = settings.article_archive_after_days,
+        row_group_size: int = settings.article_archive_row_group_size,
+        interval: float = settings.article_archive_interval,
+    ):
+        self.directory = directory
+        self.archive_after_days = archive_after_days
+        self.row_group_size = row_group_size
+        self.interval = interval
+        self._readers: Dict[str, ArchiveReader] = {}
+        self._readers_lock = threading.Lock()  # readers are used from worker threads
+        self._task: Optional[asyncio.Task] = None
+
+    def _path(self, month: str) -> str:
+        return os.path.join(self.directory, f"articles-{month}.sota")
+
+    def months(self) -> List[str]:
+        """Archived months, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = [
+            name[len("articles-"):-len(".sota")]
+            for name in os.listdir(self.directory)
+            if name.startswith("articles-") and name.endswith(".sota")
+        ]
+        return sorted(names, reverse=True)
+
+    @contextmanager
+    def reader(self, month: str) -> Iterator[ArchiveReader]:
+        """The month's reader, reopened whenever the file was replaced since it was mapped
+
+        The leader rewrites month files on any worker's disk view (os.replace),
+        so a cached mapping can be of an older file. A replaced reader is only
+        closed once the last thread using it is done.
+        """
+        stat = os.stat(self._path(month))
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._readers_lock:
+            reader = self._readers.get(month)
+            if reader is None or reader.version != version:
+                if reader is not None:
+                    self._retire(reader)
+                reader = self._readers[month] = ArchiveReader(self._path(month))
+            reader.users += 1
+        try:
+            yield reader
+        finally:
+            with self._readers_lock:
+                reader.users -= 1
+                if reader.retired and not reader.users:
+                    reader.close()
+
+    def _retire(self, reader: ArchiveReader):
+        """Close a reader now or, if it is in use, when its last user finishes; needs the lock"""
+        reader.retired = True
+        if not reader.users:
+            reader.close()
+
+    def get(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """Find an archived article by id"""
+        for month in self.months():
+            with self.reader(month) as reader:
+                row = reader.get(article_id)
+            if row is not None:
+                return row
+        return None
+
+    def latest(
+        self,
+        limit: int,
+        importance: Optional[str] = None,
+        columns: Sequence[str] = LISTING_COLUMNS,
+    ) -> List[Dict[str, Any]]:
+        """Newest archived articles; files and row groups are stored newest first
+
+        Only the importance column is decoded to filter, and only ``columns``
+        of the row groups that contribute rows.
+        """
+        results = []
+        for month in self.months():
+            with self.reader(month) as reader:
+                for group in range(len(reader.footer["row_groups"])):
+                    picks = range(reader.group_rows(group))
+                    if importance:
+                        levels = reader.read_group(group, ["importance"])["importance"]
+                        picks = [i for i, level in enumerate(levels) if level == importance]
+                    picks = picks[:limit - len(results)]
+                    if not picks:
+                        continue
+                    batch = reader.read_group(group, columns)
+                    results.extend({name: values[i] for name, values in batch.items()} for i in picks)
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def write_month(self, month: str, rows: List[Dict[str, Any]]):
+        """Merge rows into a month file (re-archiving the same id replaces it)"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self._path(month)):
+            with self.reader(month) as reader:
+                for row in reader.iter_rows():
+                    merged[row["id"]] = row
+        for row in rows:
+            merged[row["id"]] = row
+
+        os.makedirs(self.directory, exist_ok=True)
+        write_archive(self._path(month), list(merged.values()), self.row_group_size)
+        with self._readers_lock:
+            reader = self._readers.pop(month, None)
+            if reader is not None:
+                self._retire(reader)
+
+    async def archive_old_articles(self) -> int:
+        """Move articles older than the hot window into monthly files, one month at a time"""
+        cutoff = datetime.utcnow() - timedelta(days=self.archive_after_days)
+        table = Article.__table__
+        moved = 0
+
+        async with engine.connect() as conn:
+            oldest = await conn.scalar(select(func.min(table.c.published_at)).where(table.c.published_at < cutoff))
+        if oldest is None:
+            return 0
+
+        month_start = oldest.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        while month_start < cutoff:
+            month_end = (month_start + timedelta(days=32)).replace(day=1)
+            window_end = min(month_end, cutoff)
+            window = (table.c.published_at >= month_start) & (table.c.published_at < window_end)
+
+            async with engine.connect() as conn:
+                rows = [dict(row._mapping) for row in await conn.execute(select(table).where(window))]
+            if rows:
+                # Write first, delete second: a crash in between is repaired by
+                # the next run, since re-archived ids replace their old copy.
+                # Delete only the ids just written: a backfill may insert into
+                # this window meanwhile, and those rows wait for the next run.
+                await asyncio.to_thread(self.write_month, month_start.strftime("%Y-%m"), rows)
+                ids = [row["id"] for row in rows]
+                async with engine.begin() as conn:
+                    for start in range(0, len(ids), DELETE_BATCH):
+                        await conn.execute(delete(table).where(table.c.id.in_(ids[start:start + DELETE_BATCH])))
+                moved += len(rows)
+                logger.info(f"📦 Archived {len(rows)} articles for {month_start.strftime('%Y-%m')}")
+            month_start = month_end
+
+        return moved
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        with self._readers_lock:
+            for reader in self._readers.values():
+                self._retire(reader)
+            self._readers.clear()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.archive_old_articles()
+            except Exception as e:
+                logger.error(f"❌ Article archival failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,613 @@
+"""
+Historical backfill for SOTA.ai
+Pages through arXiv and HackerNews by date range with resumable checkpoints
+
+Usage: python -m src.backfill arxiv --start 2024-01-01 --end 2024-07-01
+       python -m src.backfill arxiv --catch-up
+       python -m src.backfill --status
+"""
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+
+from .cluster import try_lock
+from .config import settings
+from .database import Article, BackfillCheckpoint, engine
+from .news_aggregator import is_ai_related
+from .records import ArticleRecord
+from .rollups import StatsRollup
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying; anything else fails the page immediately
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _insert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """The naive UTC datetimes the database stores"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    try:
+        return _utc_naive(datetime.fromisoformat(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _epoch(value: datetime) -> int:
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+class SourceThrottle:
+    """Spaces requests to one host at least ``interval`` seconds apart"""
+
+    _shared: Dict[str, "SourceThrottle"] = {}
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    @classmethod
+    def for_host(cls, host: str, interval: float) -> "SourceThrottle":
+        """One throttle per host, shared by every backfill running in this process"""
+        if host not in cls._shared:
+            cls._shared[host] = cls(interval)
+        return cls._shared[host]
+
+    async def wait(self):
+        async with self._lock:
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = time.monotonic() + self.interval
+
+
+class BackfillSource:
+    """A source that can be paged through by date range"""
+
+    name = ""
+    label = ""  # Article.source value
+    host = ""
+    window = timedelta(days=1)  # the range is fetched one window at a time
+    settle = timedelta(0)  # how long until a window stops gaining items
+    interval = 1.0  # seconds between requests
+
+    async def fetch_page(
+        self, client, start: datetime, end: datetime, cursor: int, page_size: int
+    ) -> Tuple[List[ArticleRecord], Optional[int]]:
+        """One page of [start, end): the records and the next cursor, None once the window is done"""
+        raise NotImplementedError
+
+
+class ArxivSource(BackfillSource):
+    """arXiv API search by submission date"""
+
+    name = "arxiv"
+    label = "ArXiv"
+    host = "export.arxiv.org"
+    window = timedelta(days=1)
+    settle = timedelta(days=2)  # papers are announced up to two days after submission
+    query = "cat:cs.AI OR cat:cs.LG OR cat:cs.CL"
+
+    def __init__(self, url: str = settings.arxiv_api_url, interval: float = settings.backfill_arxiv_interval):
+        self.url = url
+        self.interval = interval
+
+    async def fetch_page(self, client, start, end, cursor, page_size):
+        import feedparser
+
+        # submittedDate bounds are inclusive, to the minute
+        last = end - timedelta(minutes=1)
+        response = await client.get(self.url, params={
+            "search_query": f"({self.query}) AND submittedDate:[{start:%Y%m%d%H%M} TO {last:%Y%m%d%H%M}]",
+            "start": cursor,
+            "max_results": page_size,
+            "sortBy": "submittedDate",
+            "sortOrder": "ascending",
+        })
+        response.raise_for_status()
+        feed = await asyncio.to_thread(feedparser.parse, response.text)
+
+        records = []
+        for entry in feed.entries:
+            abstract = " ".join(entry.summary.split())
+            records.append(ArticleRecord(
+                id=f"arxiv_{entry.id.split('/')[-1]}",
+                title=" ".join(entry.title.split()),
+                url=entry.id,
+                source=self.label,
+                published_at=entry.published,
+                summary=abstract[:300] + "...",
+                content=abstract,
+                authors=tuple(author.name for author in entry.get("authors", [])),
+            ))
+
+        total = int(feed.feed.get("opensearch_totalresults", 0) or 0)
+        next_cursor = cursor + len(feed.entries)
+        if not feed.entries or next_cursor >= total:
+            return records, None
+        return records, next_cursor
+
+
+class HackerNewsSource(BackfillSource):
+    """HackerNews stories through the Algolia search API, filtered to AI topics"""
+
+    name = "hackernews"
+    label = "HackerNews"
+    host = "hn.algolia.com"
+    url = "https://hn.algolia.com/api/v1/search_by_date"
+    window = timedelta(hours=6)  # Algolia stops paging after 1000 hits per query
+    settle = timedelta(hours=1)
+
+    def __init__(self, interval: float = settings.backfill_hackernews_interval):
+        self.interval = interval
+
+    async def fetch_page(self, client, start, end, cursor, page_size):
+        response = await client.get(self.url, params={
+            "tags": "story",
+            "numericFilters": f"created_at_i>={_epoch(start)},created_at_i<{_epoch(end)}",
+            "hitsPerPage": min(page_size, 1000),
+            "page": cursor,
+        })
+        response.raise_for_status()
+        data = response.json()
+
+        records = []
+        for hit in data.get("hits", []):
+            title = hit.get("title") or ""
+            if not title or not is_ai_related(title):
+                continue
+            records.append(ArticleRecord(
+                id=f"hn_{hit['objectID']}",
+                title=title,
+                url=hit.get("url") or f"https://news.ycombinator.com/item?id={hit['objectID']}",
+                source=self.label,
+                published_at=datetime.fromtimestamp(hit["created_at_i"], timezone.utc).isoformat(),
+                score=hit.get("points") or 0,
+            ))
+
+        if cursor + 1 >= data.get("nbPages", 0):
+            return records, None
+        return records, cursor + 1
+
+
+BACKFILL_SOURCES = {source.name: source for source in (ArxivSource, HackerNewsSource)}
+
+
+def create_source(name: str) -> BackfillSource:
+    if name not in BACKFILL_SOURCES:
+        raise ValueError(f"Unknown backfill source: {name} (choose from {', '.join(BACKFILL_SOURCES)})")
+    return BACKFILL_SOURCES[name]()
+
+
+def _article_row(record: ArticleRecord) -> Optional[Dict[str, Any]]:
+    published_at = _parse_timestamp(record.published_at)
+    if published_at is None:
+        return None
+    now = datetime.utcnow()
+    return {
+        "id": record.id,
+        "title": record.title,
+        "summary": record.summary,
+        "content": record.content or None,
+        "url": record.url,
+        "source": record.source,
+        "published_at": published_at,
+        "created_at": now,
+        "updated_at": now,
+        "tags": list(record.tags),
+        "word_count": len(record.content.split()) if record.content else None,
+        "is_featured": False,
+        "is_active": True,
+    }
+
+
+@dataclass
+class BackfillPage:
+    """Fetched records and the position to resume from once they are stored"""
+    records: List[ArticleRecord]
+    window_start: datetime
+    cursor: int
+
+
+class Backfill:
+    """One date-range backfill of one source
+
+    A fetcher task pages through the range while the writer bulk-inserts;
+    the queue between them holds a couple of pages, so memory stays flat
+    however long the range is. Every stored page advances the checkpoint in
+    the same transaction, so a restart resumes at the next page.
+    """
+
+    def __init__(
+        self,
+        source: BackfillSource,
+        start: datetime,
+        end: datetime,
+        page_size: int = settings.backfill_page_size,
+        prefetch_pages: int = settings.backfill_prefetch_pages,
+        max_retries: int = settings.backfill_max_retries,
+        progress_interval: float = settings.backfill_progress_interval,
+        on_ingested: Optional[Callable[[List[ArticleRecord]], None]] = None,
+        rollup: Optional["StatsRollup"] = None,
+    ):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.page_size = page_size
+        self.prefetch_pages = prefetch_pages
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self.on_ingested = on_ingested
+        self.rollup = rollup
+        self.throttle = SourceThrottle.for_host(source.host, source.interval)
+
+        self.id = f"{source.name}:{start:%Y%m%dT%H%M}:{end:%Y%m%dT%H%M}"
+        self.status = "pending"  # pending, running, busy (running on another worker), completed, failed
+        self.error: Optional[str] = None
+        self.position = start
+        self.stats = {"pages": 0, "fetched": 0, "inserted": 0, "retries": 0}
+        self._session_fetched = 0
+        self._session_start = start
+        self._started_at: Optional[float] = None
+        self._last_report = 0.0
+
+    def progress(self) -> Dict[str, Any]:
+        """Position, counts and throughput for status endpoints and logs"""
+        span = (self.end - self.start).total_seconds()
+        done = (self.position - self.start).total_seconds()
+        remaining = (self.end - self.position).total_seconds()
+        done_this_run = (self.position - self._session_start).total_seconds()
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        rate = self._session_fetched / elapsed if elapsed > 0 else 0.0
+        percent = 100.0 * done / span if span > 0 else 100.0
+        return {
+            "id": self.id,
+            "source": self.source.name,
+            "status": self.status,
+            "range_start": self.start.isoformat(),
+            "range_end": self.end.isoformat(),
+            "position": self.position.isoformat(),
+            "percent": round(percent, 1),
+            **self.stats,
+            "articles_per_second": round(rate, 1),
+            "eta_seconds": round(elapsed * remaining / done_this_run) if done_this_run > 0 and remaining > 0 else None,
+            "error": self.error,
+        }
+
+    async def run(self) -> Dict[str, Any]:
+        self.status = "running"
+        self._started_at = time.monotonic()
+        try:
+            async with try_lock(f"backfill-{self.id}") as acquired:
+                if not acquired:
+                    self.status = "busy"
+                    self.error = "already running on another worker"
+                    logger.warning(f"⚠️ Backfill {self.id} is already running on another worker")
+                    return self.progress()
+                checkpoint = await self._load_checkpoint()
+                self.stats["fetched"] = checkpoint["fetched"]
+                self.stats["inserted"] = checkpoint["inserted"]
+                self.position = self._session_start = checkpoint["window_start"]
+                if checkpoint["completed_at"] is None:
+                    logger.info(f"🚀 Backfill {self.id} starting at {self.position.isoformat()}")
+                    await self._pump(checkpoint["window_start"], checkpoint["cursor"])
+                    await self._complete()
+            self.position = self.end
+            self.status = "completed"
+            self._report(force=True)
+        except asyncio.CancelledError:
+            self.status = "pending"  # resumes from the checkpoint next time
+            raise
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.error(f"❌ Backfill {self.id} failed at {self.position.isoformat()}: {e}")
+            raise
+        return self.progress()
+
+    async def _pump(self, window_start: datetime, cursor: int):
+        import httpx
+        from .http_replay import create_transport
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.prefetch_pages)
+        async with httpx.AsyncClient(
+            timeout=60.0, headers={"User-Agent": "SOTA.ai/1.0 (backfill)"}, transport=create_transport()
+        ) as client:
+            fetcher = asyncio.create_task(self._fetch_pages(client, queue, window_start, cursor))
+            try:
+                while True:
+                    page = await queue.get()
+                    if page is None:
+                        break
+                    await self._store(page)
+                    self._report()
+            finally:
+                if not fetcher.done():
+                    fetcher.cancel()
+                await asyncio.gather(fetcher, return_exceptions=True)
+            fetcher.result()  # surface fetch errors
+
+    async def _fetch_pages(self, client, queue: asyncio.Queue, window_start: datetime, cursor: int):
+        try:
+            while window_start < self.end:
+                window_end = min(window_start + self.source.window, self.end)
+                records, next_cursor = await self._fetch(client, window_start, window_end, cursor)
+                if next_cursor is None:
+                    window_start, cursor = window_end, 0
+                else:
+                    cursor = next_cursor
+                await queue.put(BackfillPage(records, window_start, cursor))
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _fetch(self, client, start: datetime, end: datetime, cursor: int):
+        """Fetch one page politely: rate-limited, retried with backoff on transient errors"""
+        import httpx
+
+        for attempt in range(self.max_retries + 1):
+            await self.throttle.wait()
+            try:
+                return await self.source.fetch_page(client, start, end, cursor, self.page_size)
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                if attempt == self.max_retries or (status is not None and status not in RETRY_STATUSES):
+                    raise
+                retry_after = e.response.headers.get("retry-after") if status else None
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else min(
+                    300.0, self.source.interval * 2 ** (attempt + 1)
+                )
+                self.stats["retries"] += 1
+                logger.warning(f"⚠️ Backfill {self.source.name} request failed ({e}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+    async def _load_checkpoint(self) -> Dict[str, Any]:
+        table = BackfillCheckpoint.__table__
+        async with engine.begin() as conn:
+            row = (await conn.execute(select(table).where(table.c.id == self.id))).first()
+            if row is not None:
+                return dict(row._mapping)
+            values = {
+                "id": self.id,
+                "source": self.source.name,
+                "range_start": self.start,
+                "range_end": self.end,
+                "window_start": self.start,
+                "cursor": 0,
+                "fetched": 0,
+                "inserted": 0,
+                "completed_at": None,
+            }
+            await conn.execute(insert(table).values(**values))
+            return values
+
+    async def _store(self, page: BackfillPage):
+        """Bulk-insert a page and advance the checkpoint in one transaction"""
+        rows = [row for row in map(_article_row, page.records) if row is not None]
+        articles = Article.__table__
+        checkpoints = BackfillCheckpoint.__table__
+
+        async with engine.begin() as conn:
+            inserted = 0
+            if rows:
+                # rowcount is unreliable for executemany; RETURNING yields only the rows actually inserted
+                stmt = (
+                    _insert(conn.dialect.name)(articles)
+                    .on_conflict_do_nothing(index_elements=["id"])
+                    .returning(articles.c.id)
+                )
+                inserted = len((await conn.execute(stmt, rows)).all())
+            await conn.execute(
+                update(checkpoints)
+                .where(checkpoints.c.id == self.id)
+                .values(
+                    window_start=page.window_start,
+                    cursor=page.cursor,
+                    fetched=checkpoints.c.fetched + len(page.records),
+                    inserted=checkpoints.c.inserted + inserted,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+
+        self.position = page.window_start
+        self.stats["pages"] += 1
+        self.stats["fetched"] += len(page.records)
+        self.stats["inserted"] += inserted
+        self._session_fetched += len(page.records)
+        if inserted and self.rollup is not None:
+            self.rollup.record_articles(inserted)
+        if inserted and self.on_ingested is not None:
+            self.on_ingested(page.records)
+
+    async def _complete(self):
+        table = BackfillCheckpoint.__table__
+        async with engine.begin() as conn:
+            await conn.execute(
+                update(table).where(table.c.id == self.id).values(
+                    window_start=self.end, cursor=0, completed_at=datetime.utcnow()
+                )
+            )
+
+    def _report(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        p = self.progress()
+        eta = f", ETA {p['eta_seconds'] // 60}m" if p["eta_seconds"] else ""
+        icon = "✅" if self.status == "completed" else "📦"
+        logger.info(
+            f"{icon} Backfill {self.id}: at {p['position'][:16]} ({p['percent']}%), "
+            f"{p['fetched']:,} fetched, {p['inserted']:,} new, {p['articles_per_second']}/s{eta}"
+        )
+
+
+class BackfillManager:
+    """Runs backfills in the background, plus an optional periodic catch-up"""
+
+    def __init__(
+        self,
+        on_ingested: Optional[Callable[[List[ArticleRecord]], None]] = None,
+        catch_up_interval: Optional[float] = settings.backfill_catch_up_interval,
+        catch_up_sources: Optional[List[str]] = None,
+        rollup: Optional["StatsRollup"] = None,
+    ):
+        self.on_ingested = on_ingested
+        self.rollup = rollup
+        self.catch_up_interval = catch_up_interval
+        self.catch_up_sources = catch_up_sources or list(settings.backfill_catch_up_sources)
+        self.jobs: Dict[str, Backfill] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._catch_up_task: Optional[asyncio.Task] = None
+
+    def submit(self, source: str, start: datetime, end: datetime) -> Backfill:
+        """Start a backfill in the background; resubmitting a running range returns it"""
+        start, end = _utc_naive(start), _utc_naive(end)
+        if start >= end:
+            raise ValueError("start must be before end")
+        job = Backfill(create_source(source), start, end, on_ingested=self.on_ingested, rollup=self.rollup)
+        task = self._tasks.get(job.id)
+        if task is not None and not task.done():
+            return self.jobs[job.id]
+        self.jobs[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        return job
+
+    async def _run(self, job: Backfill):
+        try:
+            await job.run()
+        except Exception:
+            pass  # logged and recorded on the job
+
+    async def catch_up_range(self, source: str) -> Tuple[datetime, datetime]:
+        """From where the last completed backfill (or the newest stored article) ends, up to the settled past"""
+        backfill_source = create_source(source)
+        end = (datetime.utcnow() - backfill_source.settle).replace(second=0, microsecond=0)
+
+        checkpoints = BackfillCheckpoint.__table__
+        articles = Article.__table__
+        async with engine.connect() as conn:
+            start = await conn.scalar(
+                select(func.max(checkpoints.c.range_end))
+                .where(checkpoints.c.source == source, checkpoints.c.completed_at.is_not(None))
+            )
+            if start is None:
+                start = await conn.scalar(
+                    select(func.max(articles.c.published_at)).where(articles.c.source == backfill_source.label)
+                )
+        return start or end - backfill_source.window, end
+
+    async def catch_up(self, source: str) -> Optional[Backfill]:
+        start, end = await self.catch_up_range(source)
+        if start >= end:
+            return None
+        return self.submit(source, start, end)
+
+    async def start(self):
+        if self.catch_up_interval and self._catch_up_task is None:
+            self._catch_up_task = asyncio.create_task(self._catch_up_loop())
+
+    async def _catch_up_loop(self):
+        while True:
+            for source in self.catch_up_sources:
+                try:
+                    await self.catch_up(source)
+                except Exception as e:
+                    logger.error(f"❌ Backfill catch-up for {source} failed: {e}")
+            await asyncio.sleep(self.catch_up_interval)
+
+    async def stop(self):
+        """Stop the periodic catch-up; running backfills carry on"""
+        if self._catch_up_task is not None:
+            self._catch_up_task.cancel()
+            await asyncio.gather(self._catch_up_task, return_exceptions=True)
+            self._catch_up_task = None
+
+    async def close(self):
+        """Cancel running backfills; each resumes from its checkpoint when resubmitted"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Backfills started by this worker"""
+        return [job.progress() for job in self.jobs.values()]
+
+    async def checkpoints(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Stored checkpoints, newest first, including ones from other workers and earlier runs"""
+        table = BackfillCheckpoint.__table__
+        async with engine.connect() as conn:
+            rows = await conn.execute(select(table).order_by(table.c.updated_at.desc()).limit(limit))
+            return [
+                {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row._mapping.items()}
+                for row in rows
+            ]
+
+
+def _parse_date(value: str) -> datetime:
+    return _utc_naive(datetime.fromisoformat(value))
+
+
+async def _main(args):
+    from .database import close_db, init_db
+
+    await init_db()
+    manager = BackfillManager()
+    try:
+        if args.status:
+            for checkpoint in await manager.checkpoints():
+                state = "done" if checkpoint["completed_at"] else f"at {checkpoint['window_start']}"
+                print(f"{checkpoint['id']}: {state}, {checkpoint['fetched']} fetched, {checkpoint['inserted']} new")
+            return
+
+        if args.catch_up:
+            start, end = await manager.catch_up_range(args.source)
+        else:
+            start, end = args.start, args.end or datetime.utcnow().replace(second=0, microsecond=0)
+        if start >= end:
+            print("Nothing to backfill")
+            return
+        await Backfill(create_source(args.source), start, end).run()
+    finally:
+        await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill historical articles by date range")
+    parser.add_argument("source", nargs="?", choices=sorted(BACKFILL_SOURCES))
+    parser.add_argument("--start", type=_parse_date, help="YYYY-MM-DD[THH:MM], UTC")
+    parser.add_argument("--end", type=_parse_date, help="defaults to now")
+    parser.add_argument("--catch-up", action="store_true", help="resume from the last completed backfill")
+    parser.add_argument("--status", action="store_true", help="list stored checkpoints")
+    args = parser.parse_args()
+    if not args.status and (args.source is None or (args.start is None and not args.catch_up)):
+        parser.error("a source and --start (or --catch-up) are required")
+
+    logging.basicConfig(level=settings.log_level, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
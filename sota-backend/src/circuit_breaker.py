@@ -0,0 +1,227 @@
+"""
+Per-source circuit breakers for SOTA.ai crawls
+Failure-rate and latency tripping, half-open probes and p95-derived timeout budgets
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile; None for no samples"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Breaker for one source
+
+    Closed: calls go through and their outcomes fill a sliding window. The
+    breaker opens when the window's failure rate or slow-call rate crosses
+    its threshold, or after a run of consecutive failures. Open: calls are
+    rejected without touching the network until the open period ends.
+    Half-open: one probe goes through with the full ``max_timeout`` budget;
+    success closes the breaker, failure re-opens it for twice as long.
+
+    Timed-out calls enter the latency window at the time they were given, so
+    a source that slows down raises its own p95 budget instead of timing out
+    at the old one forever.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = settings.source_breaker_window,
+        min_calls: int = settings.source_breaker_min_calls,
+        failure_rate: float = settings.source_breaker_failure_rate,
+        consecutive_failures: int = settings.source_breaker_consecutive_failures,
+        slow_call_seconds: float = settings.source_breaker_slow_call_seconds,
+        slow_call_rate: float = settings.source_breaker_slow_call_rate,
+        open_seconds: float = settings.source_breaker_open_seconds,
+        max_open_seconds: float = settings.source_breaker_max_open_seconds,
+        timeout_multiplier: float = settings.source_timeout_p95_multiplier,
+        min_timeout: float = settings.source_timeout_min,
+        max_timeout: float = settings.source_timeout_max,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate
+        self.consecutive_failures_threshold = consecutive_failures
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.clock = clock
+
+        self.state = CLOSED
+        self.calls: Deque[Tuple[bool, float]] = deque(maxlen=window)  # (succeeded, seconds)
+        self.latencies: Deque[float] = deque(maxlen=max(window * 5, 100))  # successes and timeouts
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.current_open_seconds = open_seconds
+        self.probe_in_flight = False
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "timeouts": 0, "opened": 0}
+        self.last_success_at: Optional[float] = None
+        self.last_failure_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.on_state_change: List[Callable[["CircuitBreaker", str, str], None]] = []
+
+    def timeout(self) -> float:
+        """Time budget for the next call: a multiple of observed p95, within bounds"""
+        if self.state == HALF_OPEN:
+            return self.max_timeout  # a probe judged by the old budget could never close the breaker
+        p95 = percentile(list(self.latencies), 0.95) if len(self.latencies) >= self.min_calls else None
+        if p95 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (reserving the probe when half-open)"""
+        if self.state == OPEN:
+            if self.clock() < self.open_until:
+                self.stats["rejected"] += 1
+                return False
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.probe_in_flight:
+                self.stats["rejected"] += 1
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self, seconds: float):
+        self.stats["calls"] += 1
+        self.calls.append((True, seconds))
+        self.latencies.append(seconds)
+        self.consecutive_failures = 0
+        self.last_success_at = time.time()
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+            self.current_open_seconds = self.open_seconds
+            self.calls.clear()
+            self._transition(CLOSED)
+        elif self._should_open():
+            self._open()
+
+    def record_failure(self, seconds: float, error: BaseException):
+        self.stats["calls"] += 1
+        self.stats["failures"] += 1
+        if isinstance(error, TimeoutError):
+            self.stats["timeouts"] += 1
+            self.latencies.append(seconds)  # at least this slow; lets the budget grow
+        self.calls.append((False, seconds))
+        self.consecutive_failures += 1
+        self.last_failure_at = time.time()
+        message = str(error).splitlines()[0] if str(error) else ""
+        self.last_error = f"{type(error).__name__}: {message}" if message else type(error).__name__
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+            self.current_open_seconds = min(self.max_open_seconds, self.current_open_seconds * 2)
+            self._open()
+        elif self._should_open():
+            self._open()
+
+    def abandon(self):
+        """The call was cancelled without an outcome; free the half-open probe"""
+        self.probe_in_flight = False
+
+    def failure_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for ok, _ in self.calls if not ok) / len(self.calls)
+
+    def slow_call_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, seconds in self.calls if seconds >= self.slow_call_seconds) / len(self.calls)
+
+    def _should_open(self) -> bool:
+        if self.consecutive_failures >= self.consecutive_failures_threshold:
+            return True
+        if len(self.calls) < self.min_calls:
+            return False
+        return (
+            self.failure_rate() >= self.failure_rate_threshold
+            or self.slow_call_rate() >= self.slow_call_rate_threshold
+        )
+
+    def _open(self):
+        self.open_until = self.clock() + self.current_open_seconds
+        self.stats["opened"] += 1
+        self._transition(OPEN)
+        logger.warning(
+            f"⚠️ Circuit for {self.name} opened for {self.current_open_seconds:.0f}s "
+            f"(failure rate {self.failure_rate():.0%}, last error: {self.last_error})"
+        )
+
+    def _transition(self, state: str):
+        previous, self.state = self.state, state
+        if previous == state:
+            return
+        if state == CLOSED:
+            logger.info(f"✅ Circuit for {self.name} closed")
+        for hook in self.on_state_change:
+            try:
+                hook(self, previous, state)
+            except Exception as e:
+                logger.error(f"Circuit state hook failed: {e}")
+
+    def health(self) -> Dict[str, Any]:
+        """Snapshot for the source health table"""
+        latencies = list(self.latencies)
+        p50 = percentile(latencies, 0.5)
+        p95 = percentile(latencies, 0.95)
+        success_rate = 1.0 - self.failure_rate()
+        # 0-100: success rate, discounted when p95 eats into the timeout budget
+        score = 0 if self.state == OPEN else round(
+            100 * success_rate * (1.0 - 0.5 * min(1.0, (p95 or 0.0) / self.max_timeout))
+        )
+        return {
+            "state": self.state,
+            "health_score": score,
+            "success_rate": round(success_rate, 3),
+            "slow_call_rate": round(self.slow_call_rate(), 3),
+            "latency_p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "timeout_budget_s": round(self.timeout(), 2),
+            "retry_in_s": round(max(0.0, self.open_until - self.clock()), 1) if self.state == OPEN else None,
+            "consecutive_failures": self.consecutive_failures,
+            "last_success_at": self.last_success_at,
+            "last_failure_at": self.last_failure_at,
+            "last_error": self.last_error,
+            **self.stats,
+        }
+
+
+class SourceHealth:
+    """One breaker per source, created on first use"""
+
+    def __init__(self, **breaker_options):
+        self.breaker_options = breaker_options
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.on_state_change: List[Callable[[CircuitBreaker, str, str], None]] = []
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            breaker = CircuitBreaker(name, **self.breaker_options)
+            breaker.on_state_change = self.on_state_change  # shared list, like the service hooks
+            self.breakers[name] = breaker
+        return self.breakers[name]
+
+    def table(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.health() for name, breaker in self.breakers.items()}
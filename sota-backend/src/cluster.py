@@ -0,0 +1,487 @@
+"""
+Multi-worker coordination for SOTA.ai
+Leader election for singleton duties, a cross-worker message bus and WebSocket fan-out
+"""
+import asyncio
+import inspect
+import json
+import logging
+import os
+import re
+import socket
+import uuid
+import zlib
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import text
+
+from .config import settings
+from .live_updates import UpdateLog
+from .metrics import WEBSOCKET_DROPPED, WEBSOCKET_MESSAGES, WEBSOCKET_SENT_BYTES
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Largest bus message sent over a Unix datagram socket
+MAX_DATAGRAM = 200_000
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+
+async def _call_all(callbacks: List[Callable[[], Awaitable[None]]], label: str):
+    for callback in callbacks:
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"❌ {label} callback failed: {e}")
+
+
+@asynccontextmanager
+async def startup_lock(
+    backend: str = settings.leader_lock_backend,
+    lock_path: str = settings.leader_lock_path + ".startup",
+    lock_key: int = settings.leader_lock_key + 1,
+) -> AsyncIterator[None]:
+    """Serialize a startup step (schema creation) across workers"""
+    if backend == "postgres":
+        from .database import engine
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": lock_key})
+            await conn.commit()
+            try:
+                yield
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": lock_key})
+                await conn.commit()
+        return
+
+    import fcntl
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+@asynccontextmanager
+async def try_lock(
+    name: str,
+    backend: str = settings.leader_lock_backend,
+    lock_dir: str = os.path.dirname(settings.leader_lock_path),
+    lock_class: int = settings.leader_lock_key + 2,
+) -> AsyncIterator[bool]:
+    """Hold a named lock across workers without waiting; yields whether it was acquired"""
+    if backend == "postgres":
+        from .database import engine
+        # two-key form: the class keeps these apart from the leader and startup locks
+        keys = {"class": lock_class, "key": zlib.crc32(name.encode()) - 2**31}
+        async with engine.connect() as conn:
+            acquired = bool((await conn.execute(
+                text("SELECT pg_try_advisory_lock(:class, :key)"), keys
+            )).scalar())
+            await conn.commit()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:class, :key)"), keys)
+                    await conn.commit()
+        return
+
+    import fcntl
+    os.makedirs(lock_dir or ".", exist_ok=True)
+    fd = os.open(os.path.join(lock_dir, re.sub(r"[^\w.-]", "_", name) + ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            acquired = True
+        except BlockingIOError:
+            acquired = False
+        yield acquired
+    finally:
+        os.close(fd)
+
+
+class LeaderElection:
+    """Elects one worker to run singleton duties (crawl scheduling, maintenance, spill replay)
+
+    The ``file`` backend holds an exclusive flock, which the kernel releases if the
+    worker dies; the ``postgres`` backend holds a session advisory lock on a
+    dedicated connection, which also covers workers on different hosts.
+    """
+
+    def __init__(
+        self,
+        backend: str = settings.leader_lock_backend,
+        lock_path: str = settings.leader_lock_path,
+        lock_key: int = settings.leader_lock_key,
+        check_interval: float = settings.leader_check_interval,
+    ):
+        self.backend = backend
+        self.lock_path = lock_path
+        self.lock_key = lock_key
+        self.check_interval = check_interval
+        self.is_leader = False
+        self.on_elected: List[Callable[[], Awaitable[None]]] = []
+        self.on_demoted: List[Callable[[], Awaitable[None]]] = []
+        self._fd: Optional[int] = None
+        self._conn = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Try for leadership now, then keep checking in the background"""
+        await self._check()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            await self._demote()
+        await self._release()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self._check()
+
+    async def _check(self):
+        try:
+            if self.is_leader:
+                if not await self._still_held():
+                    logger.warning("⚠️ Lost leadership lock")
+                    await self._demote()
+                    await self._release()
+            elif await self._acquire():
+                self.is_leader = True
+                logger.info(f"👑 Worker {os.getpid()} elected leader")
+                await _call_all(self.on_elected, "Leader election")
+        except Exception as e:
+            logger.error(f"❌ Leader election check failed: {e}")
+
+    async def _demote(self):
+        self.is_leader = False
+        logger.info(f"🔄 Worker {os.getpid()} stepping down as leader")
+        await _call_all(self.on_demoted, "Leader demotion")
+
+    async def _acquire(self) -> bool:
+        if self.backend == "postgres":
+            from .database import engine
+            conn = await engine.connect()
+            try:
+                acquired = (await conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}
+                )).scalar()
+                await conn.commit()
+                if acquired:
+                    self._conn = conn
+            finally:
+                if self._conn is not conn:
+                    await conn.close()
+            return bool(acquired)
+
+        import fcntl
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    async def _still_held(self) -> bool:
+        if self.backend != "postgres":
+            return self._fd is not None
+        try:
+            await self._conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    async def _release(self):
+        if self._fd is not None:
+            os.close(self._fd)  # closing the descriptor drops the flock
+            self._fd = None
+        if self._conn is not None:
+            try:
+                await self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+                await self._conn.commit()
+            except Exception:
+                pass  # the lock goes with the session anyway
+            await self._conn.close()
+            self._conn = None
+
+
+class MessageBus:
+    """Pub/sub between the workers of one deployment
+
+    ``publish`` reaches the other workers only; the publishing worker applies
+    its own side effects directly.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.stats = {"published": 0, "received": 0, "dropped": 0}
+        self._pending: Set[asyncio.Task] = set()
+
+    def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel].append(handler)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, data: Dict[str, Any]):
+        payload = json.dumps({"origin": self.worker_id, "channel": channel, "data": data}).encode("utf-8")
+        self.stats["published"] += 1
+        await self._send(payload)
+
+    def publish_nowait(self, channel: str, data: Dict[str, Any]):
+        """Publish from synchronous hooks running inside the event loop"""
+        self._track(asyncio.get_running_loop().create_task(self.publish(channel, data)), f"Bus publish to {channel}")
+
+    def _track(self, task: asyncio.Task, label: str):
+        """Keep a fire-and-forget task alive and log how it failed, since nobody awaits it"""
+        self._pending.add(task)
+
+        def done(task: asyncio.Task):
+            self._pending.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"❌ {label} failed: {task.exception()!r}")
+
+        task.add_done_callback(done)
+
+    async def _send(self, payload: bytes):
+        pass  # single process: nobody else to tell
+
+    def _receive(self, payload: bytes):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            self.stats["dropped"] += 1
+            return
+        if message.get("origin") == self.worker_id:
+            return
+        self.stats["received"] += 1
+        for handler in self.handlers.get(message.get("channel"), []):
+            try:
+                result = handler(message["data"])
+                if inspect.isawaitable(result):
+                    self._track(asyncio.ensure_future(result), f"Bus handler for {message.get('channel')}")
+            except Exception as e:
+                logger.error(f"Bus handler for {message.get('channel')} failed: {e}")
+
+
+class UnixSocketBus(MessageBus):
+    """Brokerless bus: every worker binds a datagram socket in a shared directory"""
+
+    def __init__(self, socket_dir: str = settings.pubsub_socket_dir):
+        super().__init__()
+        self.socket_dir = socket_dir
+        self.path = os.path.join(socket_dir, f"worker-{self.worker_id}.sock")
+        self._sock: Optional[socket.socket] = None
+
+    async def start(self):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._on_readable)
+
+    async def stop(self):
+        if self._sock is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _on_readable(self):
+        while self._sock is not None:
+            try:
+                payload = self._sock.recv(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._receive(payload)
+
+    async def _send(self, payload: bytes):
+        if self._sock is None:
+            return
+        if len(payload) > MAX_DATAGRAM:
+            self.stats["dropped"] += 1
+            logger.warning(f"⚠️ Bus message of {len(payload)} bytes is too large, dropped")
+            return
+        for name in os.listdir(self.socket_dir):
+            peer = os.path.join(self.socket_dir, name)
+            if peer == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self._sock.sendto(payload, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Left behind by a worker that died without cleaning up
+                try:
+                    os.unlink(peer)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                self.stats["dropped"] += 1
+                logger.warning(f"⚠️ Bus peer {name} is not reading, message dropped")
+
+
+class RedisBus(MessageBus):
+    """Bus over Redis pub/sub, for workers spread across hosts"""
+
+    CHANNEL = "sota:bus"
+
+    def __init__(self, url: str = settings.redis_url):
+        super().__init__()
+        self.url = url
+        self._client = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        import redis.asyncio as redis
+        self._client = redis.from_url(self.url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.CHANNEL)
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            await self._client.close()
+            self._pubsub = self._client = None
+
+    async def _listen(self):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") == "message":
+                        self._receive(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Redis bus connection lost: {e}")
+                await asyncio.sleep(1.0)
+
+    async def _send(self, payload: bytes):
+        try:
+            await self._client.publish(self.CHANNEL, payload)
+        except Exception as e:
+            self.stats["dropped"] += 1
+            logger.error(f"❌ Redis bus publish failed: {e}")
+
+
+def create_bus(backend: str = settings.pubsub_backend) -> MessageBus:
+    """Message bus for the configured backend (redis, unix or local)"""
+    if backend == "redis":
+        return RedisBus()
+    if backend == "unix":
+        return UnixSocketBus()
+    return MessageBus()
+
+
+class WebSocketHub:
+    """This worker's WebSocket clients and update log; the bus carries updates to other workers"""
+
+    def __init__(self, send_timeout: float = settings.ws_send_timeout):
+        self.clients: Set[Any] = set()
+        self.log = UpdateLog()
+        self.send_timeout = send_timeout
+        self.draining = False
+        self.synced = asyncio.Event()  # set once the log holds the leader's state
+        self._closing: Set[asyncio.Task] = set()
+
+    def advance(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Leader only: diff ``state`` into the log"""
+        message = self.log.advance(state)
+        self.synced.set()
+        return message
+
+    def follow(self, data: Dict[str, Any]):
+        """Follower: take an update the leader published on the bus"""
+        self.log.sync(data["epoch"], data["message"], data["state"])
+        self.synced.set()
+
+    async def wait_synced(self, timeout: float) -> bool:
+        """Whether the log holds the leader's state, waiting up to ``timeout`` for it"""
+        try:
+            await asyncio.wait_for(self.synced.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def add(self, websocket):
+        self.clients.add(websocket)
+
+    def discard(self, websocket):
+        self.clients.discard(websocket)
+
+    async def send(self, websocket, message: Dict[str, Any]):
+        """One message to one client (catch-up and resync replies)"""
+        payload = dumps(message).decode("utf-8")
+        await websocket.send_text(payload)
+        WEBSOCKET_MESSAGES.labels(message["type"]).inc()
+        WEBSOCKET_SENT_BYTES.labels(message["type"]).inc(len(payload))
+
+    async def broadcast(self, message: Dict[str, Any]):
+        """Send to every local client, encoded once, dropping the ones that fail or lag
+
+        Each send gets ``send_timeout``, so one client with a full socket buffer
+        cannot hold up the broadcast; it is disconnected and resyncs when it
+        reconnects.
+        """
+        payload = dumps(message).decode("utf-8")
+        clients = list(self.clients)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(client.send_text(payload), self.send_timeout) for client in clients),
+            return_exceptions=True,
+        )
+        sent = 0
+        for client, result in zip(clients, results):
+            if isinstance(result, asyncio.TimeoutError):
+                self._drop(client)
+            elif isinstance(result, Exception):
+                self.clients.discard(client)
+            else:
+                sent += 1
+        WEBSOCKET_MESSAGES.labels(message["type"]).inc(sent)
+        WEBSOCKET_SENT_BYTES.labels(message["type"]).inc(len(payload) * sent)
+
+    def _drop(self, websocket):
+        """Disconnect a lagging client without waiting on it"""
+        self.clients.discard(websocket)
+        WEBSOCKET_DROPPED.inc()
+        logger.warning("⚠️ Dropping a WebSocket client that could not keep up")
+        # 1013 "try again later": the client reconnects and catches up from its last seq
+        task = asyncio.create_task(asyncio.wait_for(websocket.close(code=1013), self.send_timeout))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def drain(self, code: int = 1001):
+        """Close every client with 'going away' so they reconnect to another worker"""
+        self.draining = True
+        clients = list(self.clients)
+        self.clients.clear()
+        await asyncio.gather(*(client.close(code=code) for client in clients), return_exceptions=True)
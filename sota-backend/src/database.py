@@ -3,22 +3,102 @@ Database configuration and models for SOTA.ai
 """
 import asyncio
 import logging
-from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, String, DateTime, Text, Float, Integer, Boolean, JSON
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import Column, String, DateTime, Text, Float, Integer, Boolean, JSON, Index, event, text
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
 from datetime import datetime
 
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
-# Database engine
-engine = create_async_engine(
-    settings.database_url.replace("postgresql://", "postgresql+asyncpg://"),
-    echo=settings.debug,
-    pool_pre_ping=True,
-    pool_recycle=300
+class PoolStats:
+    """Connection pool checkout and wait-time counters"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+    
+    def record_wait(self, wait_ms: float):
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        if wait_ms >= settings.db_pool_wait_warning_ms:
+            logger.warning(f"⚠️ Waited {wait_ms:.0f}ms for a {self.name} database connection")
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that times how long each checkout waits"""
+    
+    checkout_stats: PoolStats
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.checkout_stats.timeouts += 1
+            raise
+        finally:
+            self.checkout_stats.record_wait((time.perf_counter() - started) * 1000)
+
+def create_engine_for(url: str, name: str, pool_size: int, max_overflow: int) -> AsyncEngine:
+    """Create an async engine with its own instrumented pool"""
+    stats = PoolStats(name)
+    pool_class = type(f"InstrumentedPool_{name}", (InstrumentedPool,), {"checkout_stats": stats})
+    new_engine = create_async_engine(
+        url.replace("postgresql://", "postgresql+asyncpg://"),
+        echo=settings.debug,
+        poolclass=pool_class,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=True,
+        pool_recycle=settings.db_pool_recycle
+    )
+    
+    @event.listens_for(new_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        stats.connects += 1
+    
+    @event.listens_for(new_engine.sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checkouts += 1
+        stats.checked_out += 1
+        stats.max_checked_out = max(stats.max_checked_out, stats.checked_out)
+    
+    @event.listens_for(new_engine.sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        stats.checked_out -= 1
+    
+    return new_engine
+
+# Primary engine: all writes, and reads that must see them
+engine = create_engine_for(
+    settings.database_url, "primary", settings.db_pool_size, settings.db_max_overflow
+)
+
+# Read replicas for article and newsletter reads
+replica_engines: List[AsyncEngine] = [
+    create_engine_for(url, f"replica{i}", settings.db_pool_size, settings.db_max_overflow)
+    for i, url in enumerate(settings.database_replica_urls)
+]
+
+# Separate pool for analytics/rollup batch work, so it can't starve user-facing requests
+analytics_engine = create_engine_for(
+    settings.database_analytics_url or settings.database_url,
+    "analytics",
+    settings.db_analytics_pool_size,
+    settings.db_analytics_max_overflow
 )
 
 # Session factory
@@ -79,7 +159,8 @@ class Newsletter(Base):
     # Engagement metrics
     views = Column(Integer, default=0)
     shares = Column(Integer, default=0)
-    click_through_rate = Column(Float, default=0.0)
+    clicks = Column(Integer, default=0)
+    click_through_rate = Column(Float, default=0.0)  # clicks / views
     
     # Status
     is_published = Column(Boolean, default=True)
@@ -103,13 +184,29 @@ class Subscriber(Base):
     open_rate = Column(Float, default=0.0)
     click_rate = Column(Float, default=0.0)
 
+class NewsletterDelivery(Base):
+    """Per-subscriber delivery log, used to resume sends without duplicates"""
+    __tablename__ = "newsletter_deliveries"
+    
+    newsletter_id = Column(String, primary_key=True)
+    subscriber_id = Column(String, primary_key=True)
+    status = Column(String, nullable=False)  # sending, sent, failed
+    digest_key = Column(String)  # topic combination the digest was rendered for
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    error = Column(Text)
+
 class AnalyticsEvent(Base):
-    """Analytics events model"""
+    """Analytics events model, range-partitioned by timestamp on PostgreSQL"""
     __tablename__ = "analytics_events"
+    __table_args__ = (
+        Index("ix_analytics_events_type_timestamp", "event_type", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
     
+    # The partition key has to be part of the primary key
     id = Column(String, primary_key=True)
     event_type = Column(String, nullable=False)  # page_view, article_click, newsletter_open, etc.
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, primary_key=True, default=datetime.utcnow)
     
     # Event data
     user_id = Column(String)
@@ -117,36 +214,259 @@ class AnalyticsEvent(Base):
     article_id = Column(String)
     newsletter_id = Column(String)
     
-    # Additional metadata
-    metadata = Column(JSON)
+    # Additional metadata ("metadata" is reserved on declarative models)
+    event_metadata = Column("metadata", JSON)
     ip_address = Column(String)
     user_agent = Column(String)
 
+class AnalyticsRollup(Base):
+    """Time-bucketed event counts materialized from analytics_events"""
+    __tablename__ = "analytics_rollups"
+    
+    granularity = Column(String, primary_key=True)  # minute, hour, day
+    bucket_start = Column(DateTime, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BackfillCheckpoint(Base):
+    """Resume point of a historical backfill, advanced with every stored page"""
+    __tablename__ = "backfill_checkpoints"
+    
+    id = Column(String, primary_key=True)  # source:range_start:range_end
+    source = Column(String, nullable=False, index=True)
+    range_start = Column(DateTime, nullable=False)
+    range_end = Column(DateTime, nullable=False)
+    window_start = Column(DateTime, nullable=False)  # window being paged
+    cursor = Column(Integer, nullable=False, default=0)  # page position inside the window
+    fetched = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime)
+
+# Tables written through analytics_engine, which may be a separate database
+ANALYTICS_TABLES = [AnalyticsEvent.__table__, AnalyticsRollup.__table__]
+
+def analytics_is_separate() -> bool:
+    return bool(settings.database_analytics_url) and settings.database_analytics_url != settings.database_url
+
 async def init_db():
-    """Initialize database tables"""
+    """Initialize database tables, the analytics ones on the analytics database"""
     try:
         logger.info("🗄️  Initializing database...")
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        if analytics_is_separate():
+            primary_tables = [table for table in Base.metadata.sorted_tables if table not in ANALYTICS_TABLES]
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all, tables=primary_tables)
+            async with analytics_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all, tables=ANALYTICS_TABLES)
+        else:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
         logger.info("✅ Database initialized successfully")
     except Exception as e:
         logger.error(f"❌ Database initialization failed: {e}")
         raise
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    """Get database session"""
+class LazySession:
+    """Request-scoped session that only checks out a connection when first used"""
+    
+    def __init__(self, factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+    
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+    
+    @property
+    def is_started(self) -> bool:
+        return self._session is not None
+    
+    def __getattr__(self, name: str):
+        # Anything not defined here (execute, scalars, add, commit...) starts the session
+        return getattr(self.session, name)
+    
+    async def rollback(self):
+        if self._session is not None:
+            await self._session.rollback()
+    
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+# The last replayed transaction only dates the lag while WAL is still waiting to
+# be replayed; once replay has caught up with what was received, an idle
+# primary would otherwise make a current replica look ever further behind.
+# Without a streaming WAL receiver "caught up" means nothing (the replica just
+# stopped hearing from the primary), so the query returns NULL: unhealthy.
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() IS NULL
+          OR NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaRouter:
+    """Routes reads to healthy, caught-up replicas, falling back to the primary"""
+    
+    def __init__(self, replicas: List[AsyncEngine], max_lag: float, check_interval: float):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Dict[int, Optional[float]] = {i: None for i in range(len(replicas))}
+        self.fallbacks = 0
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+        self._sessionmakers = {
+            id(target): async_sessionmaker(target, class_=AsyncSession, expire_on_commit=False)
+            for target in [engine, *replicas]
+        }
+    
+    def healthy_replicas(self) -> List[AsyncEngine]:
+        return [
+            replica for i, replica in enumerate(self.replicas)
+            if self.lag[i] is not None and self.lag[i] <= self.max_lag
+        ]
+    
+    def read_engine(self) -> AsyncEngine:
+        """Round-robin over healthy replicas, or the primary if none qualify"""
+        candidates = self.healthy_replicas()
+        if not candidates:
+            if self.replicas:
+                self.fallbacks += 1
+            return engine
+        self._next = (self._next + 1) % len(candidates)
+        return candidates[self._next]
+    
+    def read_session(self) -> AsyncSession:
+        return self._sessionmakers[id(self.read_engine())]()
+    
+    async def check_lag(self):
+        """Measure replication lag; unreachable replicas are taken out of rotation"""
+        for i, replica in enumerate(self.replicas):
+            try:
+                async with replica.connect() as conn:
+                    if conn.dialect.name == "postgresql":
+                        lag = await conn.scalar(REPLICA_LAG_QUERY)
+                    else:
+                        await conn.execute(text("SELECT 1"))
+                        lag = 0.0
+                if lag is None:
+                    if self.lag[i] is not None:
+                        logger.warning(f"⚠️ Read replica {i} is not streaming WAL, routing reads to primary")
+                    self.lag[i] = None
+                else:
+                    self.lag[i] = float(lag)
+            except Exception as e:
+                if self.lag[i] is not None:
+                    logger.warning(f"⚠️ Read replica {i} unavailable, routing reads to primary: {e}")
+                self.lag[i] = None
+    
+    async def start(self):
+        if not self.replicas:
+            return
+        await self.check_lag()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🔀 Read routing across {len(self.healthy_replicas())}/{len(self.replicas)} replicas")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_lag()
+
+replica_router = ReplicaRouter(
+    replica_engines,
+    max_lag=settings.replica_max_lag_seconds,
+    check_interval=settings.replica_lag_check_interval
+)
+
+async def get_db() -> AsyncGenerator[LazySession, None]:
+    """Get a lazily started database session for the request"""
+    db = LazySession()
+    try:
+        yield db
+    except Exception as e:
+        # Route errors such as HTTPException(404) pass through; only database failures are logged
+        if isinstance(e, SQLAlchemyError):
+            logger.error(f"Database session error: {e}")
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+async def get_read_db() -> AsyncGenerator[LazySession, None]:
+    """Get a lazily started read-only session, served by a replica when one is caught up"""
+    db = LazySession(replica_router.read_session)
+    try:
+        yield db
+    except Exception as e:
+        # Route errors such as HTTPException(404) pass through; only database failures are logged
+        if isinstance(e, SQLAlchemyError):
+            logger.error(f"Database session error: {e}")
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+@asynccontextmanager
+async def background_session() -> AsyncIterator[AsyncSession]:
+    """Session owned by a background job, independent of any request"""
     async with AsyncSessionLocal() as session:
         try:
             yield session
+            await session.commit()
         except Exception as e:
-            logger.error(f"Database session error: {e}")
+            logger.error(f"Background session error: {e}")
             await session.rollback()
             raise
-        finally:
-            await session.close()
 
-async def close_db():
-    """Close database connections"""
-    await engine.dispose()
+def _engine_pool_stats(target: AsyncEngine) -> Dict[str, Any]:
+    pool = target.sync_engine.pool
+    stats = pool.checkout_stats
+    return {
+        "size": pool.size(),
+        "checked_out": stats.checked_out,
+        "max_checked_out": stats.max_checked_out,
+        "overflow": pool.overflow(),
+        "checkouts": stats.checkouts,
+        "connects": stats.connects,
+        "timeouts": stats.timeouts,
+        "avg_wait_ms": stats.total_wait_ms / stats.checkouts if stats.checkouts else 0.0,
+        "max_wait_ms": stats.max_wait_ms,
+    }
+
+async def ping():
+    """Cheapest round trip to the primary; raises when it is unreachable"""
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
 
+def get_pool_stats() -> Dict[str, Any]:
+    """Current pool usage and checkout wait statistics per engine"""
+    return {
+        "primary": _engine_pool_stats(engine),
+        "analytics": _engine_pool_stats(analytics_engine),
+        "replicas": [
+            {**_engine_pool_stats(replica), "lag_seconds": replica_router.lag[i]}
+            for i, replica in enumerate(replica_engines)
+        ],
+        "replica_fallbacks": replica_router.fallbacks,
+    }
 
+async def close_db():
+    """Close database connections"""
+    await replica_router.stop()
+    for target in [engine, analytics_engine, *replica_engines]:
+        await target.dispose()
\ No newline at end of file
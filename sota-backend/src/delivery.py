@@ -0,0 +1,318 @@
+"""
+Newsletter delivery pipeline for SOTA.ai
+Streams subscribers, renders one digest per topic combination and sends through pooled SMTP
+"""
+import asyncio
+import logging
+import smtplib
+import time
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, insert, select, update
+
+from .config import settings
+from .database import NewsletterDelivery, engine
+from .personalization import EditionEngine, normalize_topics
+from .subscribers import normalize_email, stream_subscribers
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """Fixed-size pool of SMTP connections; the pool size is the send concurrency"""
+
+    def __init__(
+        self,
+        host: str = settings.smtp_host,
+        port: int = settings.smtp_port,
+        size: int = settings.smtp_pool_size,
+        username: Optional[str] = settings.smtp_username,
+        password: Optional[str] = settings.smtp_password,
+        use_tls: bool = settings.smtp_use_tls,
+        timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._slots: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self._slots.put_nowait(None)  # connections are opened lazily
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        conn.ehlo()
+        if self.use_tls:
+            conn.starttls()
+            conn.ehlo()
+        if self.username:
+            conn.login(self.username, self.password or "")
+        return conn
+
+    async def send(self, from_addr: str, to_addr: str, message: bytes):
+        """Send one message on a pooled connection"""
+        conn = await self._slots.get()
+        try:
+            if conn is None:
+                conn = await asyncio.to_thread(self._connect)
+            try:
+                await asyncio.to_thread(conn.sendmail, from_addr, [to_addr], message)
+            except smtplib.SMTPServerDisconnected:
+                # Idle connections get dropped by the server; reconnect once
+                conn = await asyncio.to_thread(self._connect)
+                await asyncio.to_thread(conn.sendmail, from_addr, [to_addr], message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            conn = None
+            raise
+        finally:
+            self._slots.put_nowait(conn)
+
+    async def close(self):
+        """Close every open connection"""
+        for _ in range(self.size):
+            conn = await self._slots.get()
+            if conn is not None:
+                try:
+                    await asyncio.to_thread(conn.quit)
+                except (smtplib.SMTPException, OSError):
+                    pass
+        for _ in range(self.size):
+            self._slots.put_nowait(None)
+
+
+class SMTPSink:
+    """Minimal in-process SMTP server that records messages, for tests and benchmarks"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.messages: List[Tuple[str, List[str], bytes]] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        sender, recipients = "", []
+        writer.write(b"220 sota-sink ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                verb = command[:4].upper()
+
+                if verb in ("EHLO", "HELO"):
+                    writer.write(b"250 sota-sink\r\n")
+                elif verb == "MAIL":
+                    sender, recipients = command.split(":", 1)[1].strip(" <>"), []
+                    writer.write(b"250 OK\r\n")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].strip(" <>"))
+                    writer.write(b"250 OK\r\n")
+                elif verb == "DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        data_line = await reader.readline()
+                        if data_line in (b".\r\n", b".\n", b""):
+                            break
+                        lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                    self.messages.append((sender, recipients, b"".join(lines)))
+                    writer.write(b"250 OK queued\r\n")
+                elif verb in ("RSET", "NOOP"):
+                    writer.write(b"250 OK\r\n")
+                elif verb == "QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"502 Command not implemented\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class DeliveryPipeline:
+    """Sends a newsletter to every matching subscriber exactly once"""
+
+    def __init__(
+        self,
+        pool: Optional[SMTPPool] = None,
+        from_address: str = settings.newsletter_from_address,
+        page_size: int = settings.delivery_page_size,
+        edition_engine: Optional[EditionEngine] = None,
+    ):
+        self.pool = pool or SMTPPool()
+        self.edition_engine = edition_engine or EditionEngine()
+        self.from_address = from_address
+        self.page_size = page_size
+
+    async def close(self):
+        """Close pooled SMTP connections"""
+        await self.pool.close()
+
+    @staticmethod
+    def digest_key(topics: List[str]) -> str:
+        """Subscribers with the same topic set share one rendered digest"""
+        return "|".join(normalize_topics(topics)) or "*"
+
+    def render_digest(self, newsletter: Dict[str, Any], topics: List[str]) -> str:
+        """Newsletter body personalized for a topic combination"""
+        return self.edition_engine.assemble(newsletter, topics)
+
+    def _build_message(self, newsletter: Dict[str, Any], body: str) -> bytes:
+        """Encode the digest once; only the To header differs per recipient"""
+        message = EmailMessage(policy=SMTP_POLICY)
+        message["From"] = self.from_address
+        message["Subject"] = newsletter["title"]
+        message["List-Unsubscribe"] = "<https://sota.ai/unsubscribe>"
+        message.set_content(body)
+        return message.as_bytes()
+
+    async def deliver(
+        self,
+        newsletter: Dict[str, Any],
+        frequency: Optional[str] = "daily",
+        topics: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Deliver a newsletter; safe to re-run after a crash"""
+        newsletter_id = newsletter["id"]
+        digests: Dict[str, bytes] = {}
+        report = {"sent": 0, "failed": 0, "skipped": 0, "unconfirmed": 0, "digests_rendered": 0}
+        started = time.perf_counter()
+        logger.info(f"📬 Delivering {newsletter_id}...")
+
+        async for page in stream_subscribers(frequency=frequency, topics=topics, page_size=self.page_size):
+            pending = await self._claim(newsletter_id, page, report)
+            if not pending:
+                continue
+
+            for subscriber in pending:
+                key = self.digest_key(subscriber["topics"])
+                if key not in digests:
+                    body = self.render_digest(newsletter, subscriber["topics"])
+                    digests[key] = self._build_message(newsletter, body)
+                    report["digests_rendered"] += 1
+                subscriber["digest_key"] = key
+
+            results = await asyncio.gather(
+                *(self._send(subscriber, digests[subscriber["digest_key"]]) for subscriber in pending)
+            )
+            await self._record(newsletter_id, pending, results, report)
+
+        elapsed = time.perf_counter() - started
+        report["elapsed_seconds"] = round(elapsed, 3)
+        report["messages_per_second"] = round(report["sent"] / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(
+            f"✅ Delivered {newsletter_id}: {report['sent']} sent, {report['failed']} failed, "
+            f"{report['skipped']} already delivered ({report['messages_per_second']} msg/s)"
+        )
+        return report
+
+    async def _claim(
+        self, newsletter_id: str, page: List[Dict[str, Any]], report: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Mark a page as 'sending' before any message goes out.
+
+        Subscribers already marked 'sent' are skipped and 'failed' ones are
+        retried. Rows left in 'sending' by a crash are reported as
+        unconfirmed instead of being sent a second time.
+        """
+        table = NewsletterDelivery.__table__
+        ids = [subscriber["id"] for subscriber in page]
+
+        async with engine.begin() as conn:
+            existing = dict((await conn.execute(
+                select(table.c.subscriber_id, table.c.status).where(
+                    and_(table.c.newsletter_id == newsletter_id, table.c.subscriber_id.in_(ids))
+                )
+            )).all())
+
+            fresh = [subscriber for subscriber in page if subscriber["id"] not in existing]
+            retry = [subscriber for subscriber in page if existing.get(subscriber["id"]) == "failed"]
+            if fresh:
+                await conn.execute(insert(table), [
+                    {
+                        "newsletter_id": newsletter_id,
+                        "subscriber_id": subscriber["id"],
+                        "status": "sending",
+                        "digest_key": self.digest_key(subscriber["topics"]),
+                    }
+                    for subscriber in fresh
+                ])
+            if retry:
+                await conn.execute(
+                    update(table)
+                    .where(
+                        table.c.newsletter_id == newsletter_id,
+                        table.c.subscriber_id.in_([subscriber["id"] for subscriber in retry]),
+                    )
+                    .values(status="sending", error=None)
+                )
+
+        report["skipped"] += sum(1 for status in existing.values() if status == "sent")
+        report["unconfirmed"] += sum(1 for status in existing.values() if status == "sending")
+        return fresh + retry
+
+    async def _send(self, subscriber: Dict[str, Any], digest: bytes) -> Optional[str]:
+        """Send to one subscriber, returning an error message on failure"""
+        try:
+            # Rows stored before validation tightened could still break the header
+            email = normalize_email(subscriber["email"])
+            message = b"To: " + email.encode("utf-8") + b"\r\n" + digest
+            await self.pool.send(self.from_address, email, message)
+            return None
+        except Exception as e:
+            return str(e)
+
+    async def _record(
+        self,
+        newsletter_id: str,
+        pending: List[Dict[str, Any]],
+        results: List[Optional[str]],
+        report: Dict[str, Any],
+    ):
+        """Persist the outcome of a page"""
+        table = NewsletterDelivery.__table__
+        sent = [subscriber["id"] for subscriber, error in zip(pending, results) if error is None]
+        failed = [
+            {"b_id": subscriber["id"], "b_error": error[:500]}
+            for subscriber, error in zip(pending, results) if error is not None
+        ]
+
+        async with engine.begin() as conn:
+            if sent:
+                await conn.execute(
+                    update(table)
+                    .where(table.c.newsletter_id == newsletter_id, table.c.subscriber_id.in_(sent))
+                    .values(status="sent")
+                )
+            if failed:
+                await conn.execute(
+                    update(table)
+                    .where(table.c.newsletter_id == newsletter_id, table.c.subscriber_id == bindparam("b_id"))
+                    .values(status="failed", error=bindparam("b_error")),
+                    failed
+                )
+
+        report["sent"] += len(sent)
+        report["failed"] += len(failed)
+        for row in failed[:5]:
+            logger.warning(f"⚠️ Delivery to {row['b_id']} failed: {row['b_error']}")
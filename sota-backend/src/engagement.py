@@ -0,0 +1,111 @@
+"""
+Newsletter engagement counters for SOTA.ai
+Views, shares and clicks accumulate in-process and are flushed as one delta per newsletter
+"""
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, case, update
+
+from .config import settings
+from .database import Newsletter, engine
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("views", "shares", "clicks")
+
+
+class EngagementCounters:
+    """In-process counters flushed periodically to the newsletters table
+
+    Every caller runs on the event loop, so a plain dict needs no locking.
+    """
+
+    def __init__(self, flush_interval: float = settings.engagement_flush_interval):
+        self.flush_interval = flush_interval
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+
+    def record(self, newsletter_id: str, action: str, amount: int = 1):
+        """Count an engagement action; never touches the database"""
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown engagement action: {action}")
+        self._counts[newsletter_id][action] += amount
+
+    def record_view(self, newsletter_id: str):
+        self.record(newsletter_id, "views")
+
+    def record_share(self, newsletter_id: str):
+        self.record(newsletter_id, "shares")
+
+    def record_click(self, newsletter_id: str):
+        self.record(newsletter_id, "clicks")
+
+    def pending(self, newsletter_id: str) -> Dict[str, int]:
+        """Unflushed deltas for a newsletter"""
+        counter = self._counts.get(newsletter_id, Counter())
+        return {action: counter.get(action, 0) for action in ACTIONS}
+
+    async def flush(self):
+        """Apply accumulated deltas, one UPDATE row per newsletter"""
+        deltas, self._counts = self._counts, defaultdict(Counter)
+        if not deltas:
+            return
+
+        rows: List[Dict[str, int]] = [
+            {
+                "b_id": newsletter_id,
+                "d_views": counter.get("views", 0),
+                "d_shares": counter.get("shares", 0),
+                "d_clicks": counter.get("clicks", 0),
+            }
+            for newsletter_id, counter in deltas.items()
+        ]
+
+        table = Newsletter.__table__
+        new_views = table.c.views + bindparam("d_views")
+        new_clicks = table.c.clicks + bindparam("d_clicks")
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                views=new_views,
+                shares=table.c.shares + bindparam("d_shares"),
+                clicks=new_clicks,
+                # CTR is derived from the aggregated totals, not incremented
+                click_through_rate=case(
+                    (new_views > 0, new_clicks * 1.0 / new_views),
+                    else_=0.0,
+                ),
+            )
+        )
+
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(stmt, rows)
+            self.flushes += 1
+        except Exception as e:
+            logger.error(f"Engagement flush failed, will retry: {e}")
+            for newsletter_id, counter in deltas.items():
+                self._counts[newsletter_id].update(counter)
+
+    async def start(self):
+        """Start periodic flushing"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop periodic flushing and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
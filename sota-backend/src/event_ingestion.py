@@ -0,0 +1,273 @@
+"""
+Buffered analytics event ingestion for SOTA.ai
+Requests only enqueue; a background task flushes batches to Postgres
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert
+
+from .config import settings
+from .database import AnalyticsEvent, analytics_engine
+from .rollups import StatsRollup
+
+logger = logging.getLogger(__name__)
+
+# Column order shared by the multi-row insert, COPY and the spill file
+EVENT_COLUMNS = (
+    "id", "event_type", "timestamp", "user_id", "session_id", "article_id",
+    "newsletter_id", "metadata", "ip_address", "user_agent",
+)
+
+
+class BufferFullError(Exception):
+    """Raised when the event buffer is at capacity"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Analytics event buffer is full")
+        self.retry_after = retry_after
+
+
+class EventIngestor:
+    """Ring-buffered analytics writer with size/time flushing and disk spill"""
+
+    def __init__(
+        self,
+        capacity: int = settings.analytics_buffer_capacity,
+        batch_size: int = settings.analytics_flush_batch_size,
+        flush_interval: float = settings.analytics_flush_interval,
+        spill_path: Optional[str] = settings.analytics_spill_path if settings.analytics_spill_enabled else None,
+        use_copy: bool = settings.analytics_use_copy,
+        rollup: Optional["StatsRollup"] = None,
+    ):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.use_copy = use_copy
+        self.rollup = rollup
+        # Workers share the spill file, so only the elected leader replays it
+        self.replay_enabled = True
+        self.buffer: Deque[tuple] = deque()
+        self._flush_needed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self.stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    def enqueue(self, event: Dict[str, Any]) -> None:
+        """Add one event; the only work done on the request path"""
+        if len(self.buffer) >= self.capacity:
+            self.stats["rejected"] += 1
+            raise BufferFullError(retry_after=self.flush_interval)
+
+        self.buffer.append((
+            uuid.uuid4().hex,
+            event["event_type"],
+            event.get("timestamp") or datetime.utcnow(),
+            event.get("user_id"),
+            event.get("session_id"),
+            event.get("article_id"),
+            event.get("newsletter_id"),
+            event.get("metadata") or {},
+            event.get("ip_address"),
+            event.get("user_agent"),
+        ))
+        self.stats["enqueued"] += 1
+        if len(self.buffer) >= self.batch_size:
+            self._flush_needed.set()
+
+    def enqueue_many(self, events: Iterable[Dict[str, Any]]) -> int:
+        """Add a batch of events, all or nothing"""
+        events = list(events)
+        if len(self.buffer) + len(events) > self.capacity:
+            self.stats["rejected"] += len(events)
+            raise BufferFullError(retry_after=self.flush_interval)
+        for event in events:
+            self.enqueue(event)
+        return len(events)
+
+    async def start(self):
+        """Start the background flusher"""
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("📊 Analytics event ingestion started")
+
+    async def stop(self):
+        """Stop the flusher and drain whatever is buffered"""
+        self._running = False
+        self._flush_needed.set()
+        if self._task:
+            await self._task
+            self._task = None
+        while self.buffer:
+            if not await self.flush():
+                break
+        if self.buffer:
+            # The database is down and there is no next interval to retry in
+            batch = list(self.buffer)
+            self.buffer.clear()
+            if self.spill_path:
+                self._spill(batch)
+                self._record_rollup(batch)
+            else:
+                logger.error(f"❌ Database unavailable at shutdown, {len(batch)} analytics events dropped")
+        logger.info("✅ Analytics event ingestion stopped")
+
+    async def _run(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+
+            try:
+                # Drain in batch-sized chunks while there is a backlog
+                healthy = True
+                while self.buffer:
+                    healthy = await self.flush()
+                    if not healthy or len(self.buffer) < self.batch_size:
+                        break
+                if healthy:
+                    await self._replay_spill()
+            except Exception as e:
+                logger.error(f"Analytics flush loop error: {e}")
+
+    def _drain(self) -> List[tuple]:
+        count = min(self.batch_size, len(self.buffer))
+        popleft = self.buffer.popleft
+        return [popleft() for _ in range(count)]
+
+    async def flush(self) -> bool:
+        """Write one batch; spill it to disk if the database is unavailable"""
+        batch = self._drain()
+        if not batch:
+            return True
+
+        started = time.perf_counter()
+        try:
+            await self._write(batch)
+        except Exception as e:
+            logger.error(f"❌ Analytics flush of {len(batch)} events failed: {e}")
+            if self.spill_path:
+                self._spill(batch)
+                self._record_rollup(batch)
+            else:
+                # Put the batch back in front so it is retried next interval
+                self.buffer.extendleft(reversed(batch))
+            return False
+
+        self._record_rollup(batch)
+        self.stats["flushed"] += len(batch)
+        self.stats["flushes"] += 1
+        self.stats["last_flush_ms"] = (time.perf_counter() - started) * 1000
+        return True
+
+    def _record_rollup(self, batch: List[tuple]):
+        """Feed durable events into the time-bucketed aggregates"""
+        if self.rollup is not None:
+            self.rollup.record_events((row[1], row[2]) for row in batch)
+
+    async def _write(self, batch: List[tuple]):
+        """Multi-row insert, or COPY when running on asyncpg"""
+        async with analytics_engine.begin() as conn:
+            if self.use_copy and conn.dialect.driver == "asyncpg":
+                raw = await conn.get_raw_connection()
+                records = [
+                    row[:7] + (json.dumps(row[7]),) + row[8:]
+                    for row in batch
+                ]
+                await raw.driver_connection.copy_records_to_table(
+                    AnalyticsEvent.__tablename__,
+                    records=records,
+                    columns=list(EVENT_COLUMNS),
+                )
+            else:
+                await conn.execute(
+                    insert(AnalyticsEvent.__table__),
+                    [dict(zip(EVENT_COLUMNS, row)) for row in batch],
+                )
+
+    def _spill(self, batch: List[tuple]):
+        """Append a failed batch to the local spill file"""
+        try:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for row in batch:
+                    record = dict(zip(EVENT_COLUMNS, row))
+                    record["timestamp"] = record["timestamp"].isoformat()
+                    f.write(json.dumps(record, default=str) + "\n")
+            self.stats["spilled"] += len(batch)
+            logger.warning(f"⚠️ Spilled {len(batch)} analytics events to {self.spill_path}")
+        except OSError as e:
+            logger.error(f"❌ Could not spill analytics events, {len(batch)} dropped: {e}")
+
+    async def _replay_spill(self):
+        """Load spilled events back into the database once it is reachable"""
+        if not self.spill_path or not self.replay_enabled:
+            return
+
+        replay_path = self.spill_path + ".replay"
+        offset_path = replay_path + ".offset"
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.spill_path):
+                return
+            os.replace(self.spill_path, replay_path)
+
+        # The offset sidecar records how far replay got, so a failure part
+        # way through resumes without re-inserting earlier batches
+        offset = 0
+        if os.path.exists(offset_path):
+            with open(offset_path) as f:
+                offset = int(f.read() or 0)
+
+        with open(replay_path, "rb") as f:
+            f.seek(offset)
+            while True:
+                batch: List[tuple] = []
+                while len(batch) < self.batch_size:
+                    line = f.readline()
+                    if not line:
+                        break
+                    record = json.loads(line)
+                    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+                    batch.append(tuple(record[column] for column in EVENT_COLUMNS))
+                if not batch:
+                    break
+                await self._write(batch)
+                self.stats["replayed"] += len(batch)
+                with open(offset_path, "w") as offset_file:
+                    offset_file.write(str(f.tell()))
+
+        os.remove(replay_path)
+        if os.path.exists(offset_path):
+            os.remove(offset_path)
+        logger.info("✅ Replayed spilled analytics events")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Ingestion counters and current buffer depth"""
+        return {
+            **self.stats,
+            "buffered": len(self.buffer),
+            "capacity": self.capacity,
+            "running": self._task is not None and not self._task.done(),
+        }
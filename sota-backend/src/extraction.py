@@ -0,0 +1,335 @@
+"""
+Full-text content extraction for SOTA.ai
+Downloads article pages concurrently and parses them on a process pool
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import multiprocessing
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urljoin
+
+from .config import settings
+from .records import ArticleRecord
+
+logger = logging.getLogger(__name__)
+
+WORDS_PER_MINUTE = 230
+
+# Elements that never hold article text
+BOILERPLATE_TAGS = [
+    "script", "style", "noscript", "template", "svg", "iframe", "form",
+    "nav", "header", "footer", "aside", "button", "figure",
+]
+TEXT_TAGS = ["p", "h2", "h3", "blockquote", "pre"]
+MIN_BLOCK_CHARS = 25
+
+# Dated article URLs, e.g. /2024/05/14/1092407/some-slug/
+ARTICLE_LINK = re.compile(r"/(\d{4})/(\d{2})/(\d{2})/\d+/")
+
+
+# Parsers run in worker processes: module-level, picklable arguments only
+
+def _densest_block(soup):
+    """The element whose direct paragraphs hold the most text"""
+    scores: Dict[int, Any] = {}
+    for paragraph in soup.find_all("p"):
+        parent = paragraph.parent
+        if parent is None:
+            continue
+        entry = scores.setdefault(id(parent), [parent, 0])
+        entry[1] += len(paragraph.get_text(strip=True))
+    if not scores:
+        return None
+    return max(scores.values(), key=lambda entry: entry[1])[0]
+
+
+def extract_text(html: str, max_chars: int = 100_000) -> Dict[str, Any]:
+    """Strip boilerplate from an article page and return its text"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+
+    root = soup.find("article") or soup.find("main") or _densest_block(soup) or soup.body or soup
+    blocks = [block.get_text(" ", strip=True) for block in root.find_all(TEXT_TAGS)]
+    text = "\n\n".join(block for block in blocks if len(block) >= MIN_BLOCK_CHARS)
+    if not text:
+        text = root.get_text(" ", strip=True)
+    text = text[:max_chars]
+
+    word_count = len(text.split())
+    return {
+        "title": title,
+        "content": text,
+        "word_count": word_count,
+        "read_time": max(1, math.ceil(word_count / WORDS_PER_MINUTE)) if word_count else None,
+    }
+
+
+def extract_links(html: str, base_url: str) -> List[Dict[str, str]]:
+    """Dated article links on a listing page, in page order"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    links: Dict[str, Dict[str, str]] = {}
+    for anchor in soup.find_all("a", href=True):
+        url = urljoin(base_url, anchor["href"]).split("#")[0]
+        match = ARTICLE_LINK.search(url)
+        if not match:
+            continue
+        title = anchor.get_text(" ", strip=True)
+        if url in links:
+            # Cards often link twice (image, then headline); keep the longer text
+            if len(title) > len(links[url]["title"]):
+                links[url]["title"] = title
+            continue
+        links[url] = {"url": url, "title": title, "published_at": "-".join(match.groups())}
+    return [link for link in links.values() if link["title"]]
+
+
+@dataclass
+class CachedPage:
+    """A downloaded page and what was extracted from it"""
+    content_hash: str
+    result: Dict[str, Any]
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class ContentExtractor:
+    """Async downloads feeding a process pool of HTML parsers
+
+    Pages are cached by URL (revalidated with ETag/Last-Modified once stale)
+    and parse results by content hash, so syndicated copies and unchanged
+    pages are parsed once.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = settings.content_extraction_workers,
+        concurrency: int = settings.content_download_concurrency,
+        download_timeout: float = settings.content_download_timeout,
+        parse_timeout: float = settings.content_parse_timeout,
+        max_bytes: int = settings.content_max_download_bytes,
+        max_chars: int = settings.content_max_text_chars,
+        cache_entries: int = settings.content_cache_entries,
+        cache_ttl_seconds: float = settings.content_cache_ttl_seconds,
+        transport=None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.download_timeout = download_timeout
+        self.parse_timeout = parse_timeout
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.cache_entries = cache_entries
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.transport = transport  # httpx transport override, e.g. fixture replay
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pages: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._parsed: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._client = None
+        self.stats = {
+            "downloads": 0, "bytes": 0, "truncated": 0, "not_modified": 0,
+            "url_hits": 0, "hash_hits": 0, "parsed": 0, "timeouts": 0, "errors": 0, "pool_recycles": 0,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx
+            from .http_replay import create_transport
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                transport=self.transport if self.transport is not None else create_transport(),
+                headers={"User-Agent": "SOTA.ai/1.0 (+https://sota.ai)"},
+            )
+        return self._client
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # forkserver: forking a process that already runs threads is unsafe
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(method)
+            )
+            logger.info(f"🚀 Content extraction pool started with {self.workers} workers")
+        return self._pool
+
+    @property
+    def pending(self) -> int:
+        """Pages being downloaded or parsed right now"""
+        return len(self._inflight)
+
+    async def run(self, parser: Callable[..., Any], *args) -> Any:
+        """Run a module-level parser on the pool, bounded by the parse timeout
+
+        A timed-out parse keeps its worker busy, so the pool is replaced and
+        its workers killed. Parses that were running alongside it are retried
+        once on the new pool.
+        """
+        pool = self.pool
+        try:
+            return await self._run_on(pool, parser, *args)
+        except BrokenProcessPool:
+            if pool is self._pool:
+                raise  # broke by itself, not recycled under us
+            return await self._run_on(self.pool, parser, *args)
+
+    async def _run_on(self, pool: ProcessPoolExecutor, parser: Callable[..., Any], *args) -> Any:
+        future = asyncio.get_running_loop().run_in_executor(pool, parser, *args)
+        try:
+            return await asyncio.wait_for(future, self.parse_timeout)
+        except asyncio.TimeoutError:
+            self._recycle_pool(pool)
+            raise
+
+    def _recycle_pool(self, pool: ProcessPoolExecutor):
+        """Kill a pool's workers, including the one stuck on a pathological page"""
+        if pool is not self._pool:
+            return  # already replaced by a concurrent timeout
+        self._pool = None
+        self.stats["pool_recycles"] += 1
+        processes = list((pool._processes or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        logger.warning(f"⚠️ Parse timed out, restarted the extraction pool ({len(processes)} workers)")
+
+    async def extract(self, url: str) -> Optional[Dict[str, Any]]:
+        """Extracted text for a URL, from cache when fresh; None if it can't be fetched"""
+        cached = self._pages.get(url)
+        if cached is not None and time.time() - cached.fetched_at < self.cache_ttl_seconds:
+            self._pages.move_to_end(url)
+            self.stats["url_hits"] += 1
+            return cached.result
+
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._extract(url, cached))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def _extract(self, url: str, cached: Optional[CachedPage]) -> Optional[Dict[str, Any]]:
+        stale = cached.result if cached is not None else None
+        try:
+            async with self._semaphore:
+                page = await asyncio.wait_for(self._download(url, cached), self.download_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning(f"⚠️ Timed out downloading {url}")
+            return stale
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ Could not download {url}: {e}")
+            return stale
+
+        if page is None:  # 304 Not Modified
+            self.stats["not_modified"] += 1
+            cached.fetched_at = time.time()
+            self._remember_page(url, cached)
+            return cached.result
+
+        body, encoding, etag, last_modified = page
+        content_hash = hashlib.sha256(body).hexdigest()
+        result = self._parsed.get(content_hash)
+        if result is not None:
+            self._parsed.move_to_end(content_hash)
+            self.stats["hash_hits"] += 1
+        else:
+            html = body.decode(encoding or "utf-8", errors="replace")
+            try:
+                result = await self.run(extract_text, html, self.max_chars)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                logger.warning(f"⚠️ Timed out parsing {url}")
+                return stale
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"⚠️ Could not parse {url}: {e}")
+                return stale
+            self.stats["parsed"] += 1
+            self._parsed[content_hash] = result
+            while len(self._parsed) > self.cache_entries:
+                self._parsed.popitem(last=False)
+
+        self._remember_page(url, CachedPage(content_hash, result, time.time(), etag, last_modified))
+        return result
+
+    def _remember_page(self, url: str, page: CachedPage):
+        self._pages[url] = page
+        self._pages.move_to_end(url)
+        while len(self._pages) > self.cache_entries:
+            self._pages.popitem(last=False)
+
+    async def _download(self, url: str, cached: Optional[CachedPage]):
+        """Stream the page body up to the size limit; None when the cached copy is still valid"""
+        headers = {}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        async with self.client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and cached is not None:
+                return None
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            if content_type and "html" not in content_type:
+                raise ValueError(f"not an HTML page ({content_type})")
+
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_bytes:
+                    # The article body is nearly always early in the page
+                    self.stats["truncated"] += 1
+                    break
+
+            body = b"".join(chunks)[:self.max_bytes]
+            self.stats["downloads"] += 1
+            self.stats["bytes"] += len(body)
+            return body, response.charset_encoding, response.headers.get("etag"), response.headers.get("last-modified")
+
+    async def extract_articles(self, articles: List[ArticleRecord]) -> int:
+        """Fill content, word_count and read_time on articles that only carry a snippet"""
+        pending = [article for article in articles if article.url and not article.content]
+        results = await asyncio.gather(*(self.extract(article.url) for article in pending))
+
+        filled = 0
+        for article, result in zip(pending, results):
+            if not result or not result["content"]:
+                continue
+            article.content = result["content"]
+            article.word_count = result["word_count"]
+            article.read_time = result["read_time"]
+            filled += 1
+        if pending:
+            logger.info(f"📄 Extracted full text for {filled}/{len(pending)} articles")
+        return filled
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
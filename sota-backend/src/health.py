@@ -0,0 +1,95 @@
+"""
+Health probes for SOTA.ai
+Cheap dependency checks, run concurrently and cached so /health can be polled freely
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+UNHEALTHY = "unhealthy"
+
+# A probe returns a short detail string (or None) and raises when the dependency is down
+Probe = Callable[[], Awaitable[Optional[str]]]
+
+
+@dataclass
+class ProbeSpec:
+    name: str
+    probe: Probe
+    critical: bool  # a failed critical probe makes the whole service unhealthy
+
+
+class HealthChecker:
+    """Registered probes plus the last report, reused for cache_seconds"""
+
+    def __init__(
+        self,
+        cache_seconds: float = settings.health_cache_seconds,
+        timeout: float = settings.health_probe_timeout,
+    ):
+        self.cache_seconds = cache_seconds
+        self.timeout = timeout
+        self.probes: List[ProbeSpec] = []
+        self._report: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0  # monotonic
+        self._running: Optional[asyncio.Task] = None
+
+    def add(self, name: str, probe: Probe, critical: bool = True):
+        self.probes.append(ProbeSpec(name, probe, critical))
+
+    async def _run_probe(self, spec: ProbeSpec) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(spec.probe(), self.timeout)
+            result = {"status": "ok"}
+            if detail:
+                result["detail"] = detail
+        except asyncio.TimeoutError:
+            result = {"status": "down", "detail": f"timed out after {self.timeout:g}s"}
+        except Exception as e:
+            result = {"status": "down", "detail": f"{type(e).__name__}: {e}"}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["critical"] = spec.critical
+        return result
+
+    async def _check(self) -> Dict[str, Any]:
+        results = await asyncio.gather(*(self._run_probe(spec) for spec in self.probes))
+        services = {spec.name: result for spec, result in zip(self.probes, results)}
+        failed = [spec for spec in self.probes if services[spec.name]["status"] != "ok"]
+        if any(spec.critical for spec in failed):
+            status = UNHEALTHY
+        elif failed:
+            status = DEGRADED
+        else:
+            status = HEALTHY
+        if failed:
+            logger.warning(f"⚠️ Health {status}: {', '.join(spec.name for spec in failed)} down")
+        return {
+            "status": status,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "services": services,
+        }
+
+    async def check(self) -> Dict[str, Any]:
+        """The cached report when fresh; otherwise one probe round shared by concurrent callers"""
+        if self._report is not None and time.monotonic() - self._checked_at < self.cache_seconds:
+            return self._report
+        if self._running is None:
+            self._running = asyncio.create_task(self._check())
+        running = self._running
+        try:
+            self._report = await asyncio.shield(running)
+            self._checked_at = time.monotonic()
+        finally:
+            if self._running is running and running.done():
+                self._running = None
+        return self._report
@@ -0,0 +1,214 @@
+"""
+HTTP response caching for SOTA.ai read-mostly endpoints
+ASGI middleware with per-route TTLs, stale-while-revalidate, ETags and tag invalidation
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+# Set on the scope of background revalidations: nobody is served that response
+REVALIDATION_SCOPE_KEY = "http_cache.revalidation"
+
+
+def is_revalidation(scope: Dict[str, Any]) -> bool:
+    """Whether a request is the cache refreshing an entry rather than a client, so side effects can skip it"""
+    return bool(scope.get(REVALIDATION_SCOPE_KEY))
+
+
+@dataclass
+class CachePolicy:
+    """Caching rules for one route"""
+    ttl: float
+    stale_while_revalidate: float = 0.0
+    tags: Tuple[str, ...] = ()
+    query_params: Optional[Tuple[str, ...]] = None  # None keys on every param
+    vary: Optional[Callable[[], str]] = None  # extra key part, e.g. the date for "today" routes
+    # Called once per response served from the cache, with the scope and the ``vary`` value it was keyed by
+    on_hit: Optional[Callable[[Dict[str, Any], Optional[str]], None]] = None
+
+
+@dataclass
+class CachedEntry:
+    """A stored response"""
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+    stored_at: float
+    tags: Tuple[str, ...] = ()
+    generation: int = 0
+
+
+class HTTPResponseCache:
+    """Response store shared by the middleware and invalidation hooks"""
+
+    def __init__(self, policies: Dict[str, CachePolicy], max_entries: int = 4096):
+        self.policies = policies
+        self.max_entries = max_entries
+        self.entries: Dict[str, CachedEntry] = {}
+        self.revalidating: Set[str] = set()
+        # Bumped on invalidation so in-flight revalidations don't store stale data
+        self.generations: Dict[str, int] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+
+    def make_key(self, path: str, query_string: bytes, policy: CachePolicy, variant: Optional[str] = None) -> str:
+        params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+        if policy.query_params is not None:
+            params = [(k, v) for k, v in params if k in policy.query_params]
+        key = f"{path}?{urlencode(sorted(params))}"
+        return f"{key}#{variant}" if variant is not None else key
+
+    def generation(self, tags: Tuple[str, ...]) -> int:
+        return sum(self.generations.get(tag, 0) for tag in tags)
+
+    def store(self, key: str, entry: CachedEntry):
+        if entry.generation != self.generation(entry.tags):
+            return
+        if len(self.entries) >= self.max_entries and key not in self.entries:
+            self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = entry
+
+    def invalidate(self, *tags: str):
+        """Drop every entry carrying one of ``tags``"""
+        wanted = set(tags)
+        for tag in wanted:
+            self.generations[tag] = self.generations.get(tag, 0) + 1
+        for key in [key for key, entry in self.entries.items() if wanted.intersection(entry.tags)]:
+            del self.entries[key]
+        self.stats["invalidations"] += 1
+        logger.debug(f"HTTP cache invalidated tags: {', '.join(sorted(wanted))}")
+
+    def clear(self):
+        self.entries.clear()
+
+
+class ResponseCacheMiddleware:
+    """Serves cached GET responses before routing, dependencies or serialization run"""
+
+    def __init__(self, app, cache: HTTPResponseCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.cache.policies.get(scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        variant = policy.vary() if policy.vary is not None else None
+        key = self.cache.make_key(scope["path"], scope.get("query_string", b""), policy, variant)
+        entry = self.cache.entries.get(key)
+        now = time.time()
+
+        if entry is not None:
+            age = now - entry.stored_at
+            if age < policy.ttl + policy.stale_while_revalidate and policy.on_hit is not None:
+                # The endpoint body is skipped, so let it keep cheap side effects
+                policy.on_hit(scope, variant)
+            if age < policy.ttl:
+                self.cache.stats["hits"] += 1
+                await self._send_cached(scope, send, entry, policy, age)
+                return
+            if age < policy.ttl + policy.stale_while_revalidate:
+                self.cache.stats["stale_hits"] += 1
+                if key not in self.cache.revalidating:
+                    self.cache.revalidating.add(key)
+                    asyncio.create_task(self._revalidate(scope, key, policy))
+                await self._send_cached(scope, send, entry, policy, age)
+                return
+
+        self.cache.stats["misses"] += 1
+        if scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        await self._fetch(scope, receive, send, key, policy)
+
+    def _cache_headers(self, entry: CachedEntry, policy: CachePolicy, age: float) -> List[Tuple[bytes, bytes]]:
+        max_age = max(0, int(policy.ttl - age))
+        cache_control = f"public, max-age={max_age}"
+        if policy.stale_while_revalidate:
+            cache_control += f", stale-while-revalidate={int(policy.stale_while_revalidate)}"
+        return [
+            (b"cache-control", cache_control.encode()),
+            (b"etag", entry.etag.encode()),
+            (b"age", str(int(age)).encode()),
+        ]
+
+    async def _send_cached(self, scope, send, entry: CachedEntry, policy: CachePolicy, age: float):
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        if if_none_match is not None and entry.etag.encode() in [tag.strip() for tag in if_none_match.split(b",")]:
+            self.cache.stats["not_modified"] += 1
+            await send({"type": "http.response.start", "status": 304, "headers": self._cache_headers(entry, policy, age)})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers = entry.headers + self._cache_headers(entry, policy, age)
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        body = b"" if scope["method"] == "HEAD" else entry.body
+        await send({"type": "http.response.body", "body": body})
+
+    async def _call_downstream(self, scope, receive) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+        """Run the app and capture its full response"""
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        headers = [
+            (name, value) for name, value in start.get("headers", [])
+            if name.lower() not in (b"content-length", b"cache-control", b"etag", b"age")
+        ]
+        return start.get("status", 500), headers, b"".join(chunks)
+
+    def _make_entry(self, status, headers, body, policy: CachePolicy, generation: int) -> CachedEntry:
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        headers = headers + [(b"content-length", str(len(body)).encode())]
+        return CachedEntry(
+            status=status, headers=headers, body=body, etag=etag,
+            stored_at=time.time(), tags=policy.tags, generation=generation,
+        )
+
+    async def _fetch(self, scope, receive, send, key: str, policy: CachePolicy):
+        generation = self.cache.generation(policy.tags)
+        status, headers, body = await self._call_downstream(scope, receive)
+        entry = self._make_entry(status, headers, body, policy, generation)
+        if status == 200:
+            self.cache.store(key, entry)
+            await self._send_cached(scope, send, entry, policy, 0.0)
+            return
+
+        await send({"type": "http.response.start", "status": status, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _revalidate(self, scope, key: str, policy: CachePolicy):
+        """Refresh a stale entry in the background"""
+        async def empty_receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        try:
+            generation = self.cache.generation(policy.tags)
+            background_scope = {**scope, "method": "GET", REVALIDATION_SCOPE_KEY: True, "headers": [
+                (name, value) for name, value in scope["headers"] if name != b"if-none-match"
+            ]}
+            status, headers, body = await self._call_downstream(background_scope, empty_receive)
+            if status == 200:
+                self.cache.store(key, self._make_entry(status, headers, body, policy, generation))
+        except Exception as e:
+            logger.error(f"HTTP cache revalidation of {key} failed: {e}")
+        finally:
+            self.cache.revalidating.discard(key)
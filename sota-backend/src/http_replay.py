@@ -0,0 +1,147 @@
+"""
+HTTP record/replay transports for SOTA.ai crawlers
+Captures live responses to fixture files and serves them back offline with simulated latency
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Stored bodies are already decoded, so these no longer describe them
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def fixture_key(request: httpx.Request) -> str:
+    """Stable name for a request: method, full URL and body"""
+    digest = hashlib.sha1(f"{request.method} {request.url}".encode("utf-8"))
+    if request.content:
+        digest.update(request.content)
+    return digest.hexdigest()[:20]
+
+
+def fixture_path(directory: str, request: httpx.Request) -> str:
+    return os.path.join(directory, request.url.host or "_", f"{fixture_key(request)}.json")
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests to a real transport and writes every response to a fixture file"""
+
+    def __init__(self, directory: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.directory = directory
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self.recorded = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        body = await response.aread()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        await response.aclose()
+
+        headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in _DROPPED_HEADERS]
+        await asyncio.to_thread(self._write, request, response.status_code, headers, body, elapsed_ms)
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    def _write(self, request: httpx.Request, status: int, headers, body: bytes, elapsed_ms: float):
+        path = fixture_path(self.directory, request)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fixture: Dict[str, Any] = {
+            "method": request.method,
+            "url": str(request.url),
+            "status": status,
+            "headers": headers,
+            "elapsed_ms": round(elapsed_ms, 1),
+        }
+        try:
+            fixture["text"] = body.decode("utf-8")  # readable diffs for HTML/JSON/XML
+        except UnicodeDecodeError:
+            fixture["base64"] = base64.b64encode(body).decode("ascii")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        self.recorded += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded responses without touching the network
+
+    Each response is delayed by latency_ms plus uniform jitter, or by the
+    latency observed when it was recorded when latency_ms is None. Requests
+    with no fixture fail like an unreachable host.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        latency_ms: Optional[float] = None,
+        jitter_ms: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.directory = directory
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.random = random.Random(seed)
+        self._fixtures: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _load(self, request: httpx.Request) -> Optional[Dict[str, Any]]:
+        path = fixture_path(self.directory, request)
+        if path not in self._fixtures:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._fixtures[path] = json.load(f)
+            except FileNotFoundError:
+                self._fixtures[path] = None
+        return self._fixtures[path]
+
+    def delay(self, fixture: Dict[str, Any]) -> float:
+        base = fixture.get("elapsed_ms", 0.0) if self.latency_ms is None else self.latency_ms
+        jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, base + jitter) / 1000
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        fixture = self._load(request)
+        if fixture is None:
+            self.stats["misses"] += 1
+            raise httpx.ConnectError(f"No recorded response for {request.method} {request.url}", request=request)
+        self.stats["hits"] += 1
+
+        delay = self.delay(fixture)
+        if delay:
+            await asyncio.sleep(delay)
+        body = fixture["text"].encode("utf-8") if "text" in fixture else base64.b64decode(fixture["base64"])
+        return httpx.Response(fixture["status"], headers=fixture["headers"], content=body, request=request)
+
+
+def create_transport() -> Optional[httpx.AsyncBaseTransport]:
+    """Transport for the crawler clients per settings; None means the live network"""
+    mode = settings.http_replay_mode
+    if not mode:
+        return None
+    if mode == "record":
+        logger.info(f"📼 Recording HTTP fixtures to {settings.http_fixtures_dir}")
+        return RecordingTransport(settings.http_fixtures_dir)
+    if mode == "replay":
+        logger.info(f"📼 Replaying HTTP fixtures from {settings.http_fixtures_dir}")
+        return ReplayTransport(
+            settings.http_fixtures_dir,
+            latency_ms=settings.http_replay_latency_ms,
+            jitter_ms=settings.http_replay_jitter_ms,
+            seed=settings.http_replay_seed,
+        )
+    raise ValueError(f"Unknown http_replay_mode: {mode} (use 'record' or 'replay')")
@@ -0,0 +1,128 @@
+"""
+Live update protocol for SOTA.ai WebSocket clients
+Sequence-numbered deltas against a shared snapshot, payload-free heartbeats and resync from history
+"""
+import logging
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 3
+
+
+class UpdateLog:
+    """The state clients mirror, plus the recent deltas that lead up to it
+
+    The leader diffs each new state into a delta (``advance``); other workers
+    follow from the bus (``sync``). A client that sends its last epoch and
+    sequence gets the deltas it missed, or a snapshot when they have already
+    left the history or the log restarted (new epoch).
+    """
+
+    def __init__(self, history: int = settings.ws_delta_history):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.articles: Dict[str, Dict[str, Any]] = {}  # id -> article, newest first
+        self.trending_topics: List[str] = []
+        self.breaking_news: Optional[str] = None
+        self.deltas: deque = deque(maxlen=history)  # contiguous, ending at seq
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "articles": list(self.articles.values()),
+            "trending_topics": list(self.trending_topics),
+            "breaking_news": self.breaking_news,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "snapshot", "v": PROTOCOL_VERSION, "epoch": self.epoch, "seq": self.seq, **self.state()}
+
+    def heartbeat(self) -> Dict[str, Any]:
+        # Deliberately tiny: this is what idle clients receive every interval
+        return {"type": "heartbeat", "seq": self.seq}
+
+    def advance(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """The delta from the current state to ``state``, or a heartbeat when nothing changed"""
+        ids = {article["id"] for article in state["articles"]}
+        delta: Dict[str, Any] = {}
+        added = [article for article in state["articles"] if article["id"] not in self.articles]
+        if added:
+            delta["articles"] = added
+        # Same id, different content or score: sent whole, replaced in place
+        updated = [
+            article for article in state["articles"]
+            if article["id"] in self.articles and article != self.articles[article["id"]]
+        ]
+        if updated:
+            delta["updated"] = updated
+        removed = [article_id for article_id in self.articles if article_id not in ids]
+        if removed:
+            delta["removed"] = removed
+        topics_added = [topic for topic in state["trending_topics"] if topic not in self.trending_topics]
+        topics_removed = [topic for topic in self.trending_topics if topic not in state["trending_topics"]]
+        if topics_added or topics_removed:
+            delta["trending"] = {"added": topics_added, "removed": topics_removed}
+        if state["breaking_news"] != self.breaking_news:
+            delta["breaking_news"] = state["breaking_news"]
+        if not delta:
+            return self.heartbeat()
+        message = {
+            "type": "delta",
+            "epoch": self.epoch,
+            "seq": self.seq + 1,
+            "timestamp": datetime.utcnow().isoformat(),
+            **delta,
+        }
+        self._apply(message)
+        return message
+
+    def _apply(self, delta: Dict[str, Any]):
+        for article_id in delta.get("removed", ()):
+            self.articles.pop(article_id, None)
+        for article in delta.get("updated", ()):
+            if article["id"] in self.articles:
+                self.articles[article["id"]] = article
+        if delta.get("articles"):
+            self.articles = {**{article["id"]: article for article in delta["articles"]}, **self.articles}
+        trending = delta.get("trending")
+        if trending:
+            removed = set(trending["removed"])
+            self.trending_topics = [topic for topic in self.trending_topics if topic not in removed] + trending["added"]
+        if "breaking_news" in delta:
+            self.breaking_news = delta["breaking_news"]
+        self.seq = delta["seq"]
+        self.deltas.append(delta)
+
+    def sync(self, epoch: str, message: Dict[str, Any], state: Dict[str, Any]):
+        """Follow the leader's log from a bus message and the state it leads to"""
+        if epoch == self.epoch:
+            if message["type"] == "delta" and message["seq"] == self.seq + 1:
+                self._apply(message)
+                return
+            if message["seq"] == self.seq:
+                return
+        # Missed messages, or a new leader started a new log: take its state as is
+        self.epoch = epoch
+        self.seq = message["seq"]
+        self.articles = {article["id"]: article for article in state["articles"]}
+        self.trending_topics = list(state["trending_topics"])
+        self.breaking_news = state["breaking_news"]
+        self.deltas.clear()
+        if message["type"] == "delta":
+            self.deltas.append(message)
+
+    def catch_up(self, since: Optional[int], epoch: Optional[str]) -> List[Dict[str, Any]]:
+        """What a client that last saw (epoch, since) needs to be current"""
+        if not isinstance(since, int) or epoch != self.epoch or not 0 <= since <= self.seq:
+            return [self.snapshot()]
+        if since == self.seq:
+            return [self.heartbeat()]
+        missing = self.seq - since
+        if missing > len(self.deltas):
+            return [self.snapshot()]
+        return list(self.deltas)[-missing:]
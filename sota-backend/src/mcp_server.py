@@ -4,16 +4,21 @@ MCP (Model Context Protocol) Server integration for SOTA.ai
 import asyncio
 import json
 import logging
+import time
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
+from .response_cache import ResponseCache
+
 logger = logging.getLogger(__name__)
 
 class MCPServer:
     """MCP Server for AI-powered content processing"""
     
-    def __init__(self):
+    def __init__(self, response_cache: Optional[ResponseCache] = None):
         self.is_running = False
+        self.started_at: Optional[float] = None  # monotonic
+        self.response_cache = response_cache
         self.connections = []
         self.tools = {
             "analyze_article": self._analyze_article,
@@ -28,6 +33,7 @@ class MCPServer:
         try:
             logger.info("🚀 Starting MCP Server...")
             self.is_running = True
+            self.started_at = time.monotonic()
             logger.info("✅ MCP Server started successfully")
         except Exception as e:
             logger.error(f"❌ Failed to start MCP Server: {e}")
@@ -38,6 +44,7 @@ class MCPServer:
         try:
             logger.info("🔄 Stopping MCP Server...")
             self.is_running = False
+            self.started_at = None
             for connection in self.connections:
                 await connection.close()
             self.connections.clear()
@@ -47,11 +54,15 @@ class MCPServer:
     
     async def get_status(self) -> Dict[str, Any]:
         """Get MCP server status"""
+        uptime = int(time.monotonic() - self.started_at) if self.started_at is not None else 0
+        hours, remainder = divmod(uptime, 3600)
         return {
             "status": "running" if self.is_running else "stopped",
             "connections": len(self.connections),
             "tools_available": list(self.tools.keys()),
-            "uptime": "24h 15m 32s",  # Mock data
+            "uptime": f"{hours}h {remainder // 60}m {remainder % 60}s",
+            "uptime_seconds": uptime,
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
             "last_updated": datetime.now().isoformat()
         }
     
@@ -64,7 +75,7 @@ class MCPServer:
             raise ValueError(f"Unknown tool: {tool}")
         
         try:
-            result = await self.tools[tool](content)
+            result = await self._run_tool(tool, content)
             return {
                 "success": True,
                 "tool_used": tool,
@@ -80,6 +91,17 @@ class MCPServer:
                 "processed_at": datetime.now().isoformat()
             }
     
+    async def _run_tool(self, tool: str, content: str) -> Dict[str, Any]:
+        """Run a tool, reusing cached results for identical content"""
+        if self.response_cache is None:
+            return await self.tools[tool](content)
+        
+        async def compute() -> str:
+            return json.dumps(await self.tools[tool](content))
+        
+        raw = await self.response_cache.get_or_compute("mcp", tool, content, compute)
+        return json.loads(raw)
+    
     async def _analyze_article(self, content: str) -> Dict[str, Any]:
         """Analyze article content using AI"""
         # Mock AI analysis - in production, this would use actual AI models
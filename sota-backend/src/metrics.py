@@ -0,0 +1,382 @@
+"""
+Metrics and tracing for SOTA.ai
+Prometheus text exposition from an in-process registry, plus optional OpenTelemetry spans
+"""
+import logging
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers cache hits (ms) through slow crawls and model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """A named family of samples, one per label combination"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: Any, **named: Any):
+        """The child for one label combination, created on first use"""
+        if named:
+            values = tuple(named[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def clear(self):
+        """Forget every label combination (for gauges rebuilt at collection time)"""
+        self._children.clear()
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, child in self._children.items():
+            yield from self._render_child(key, child)
+
+    def _render_child(self, key: Tuple[str, ...], child) -> Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(Metric):
+    """Monotonic count; set() mirrors a counter kept elsewhere (e.g. a stats dict)"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Histogram(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, key: Tuple[str, ...], child: _Histogram) -> Iterator[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(child.sum)}"
+        yield f"{self.name}_count{_format_labels(self.labelnames, key)} {child.count}"
+
+
+class Registry:
+    """Metric families of this process, rendered in the Prometheus text format
+
+    Values that already live elsewhere (pool stats, cache counters, queue
+    lengths) are copied in by the on_collect hooks right before rendering,
+    so nothing is tracked twice on the hot path.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.on_collect: List[Callable[[], None]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        for collect in self.on_collect:
+            try:
+                collect()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Requests
+HTTP_REQUEST_DURATION = registry.histogram(
+    "sota_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge("sota_http_requests_in_flight", "HTTP requests being served")
+
+# Crawling
+SOURCE_FETCH_DURATION = registry.histogram(
+    "sota_source_fetch_duration_seconds", "Source fetch latency, circuit-rejected calls excluded", ("source", "outcome")
+)
+SOURCE_FETCHES = registry.counter(
+    "sota_source_fetches_total", "Source fetches by outcome (success, error, timeout, rejected)", ("source", "outcome")
+)
+SOURCE_FETCH_ERRORS = registry.counter(
+    "sota_source_fetch_errors_total", "Source fetch failures by exception type", ("source", "error")
+)
+
+# Model calls
+LLM_REQUESTS = registry.counter(
+    "sota_llm_requests_total", "Model calls by task, cache hits included", ("provider", "model", "task", "cache")
+)
+LLM_TOKENS = registry.counter(
+    "sota_llm_tokens_total", "Estimated tokens sent to and received from the model (cache misses only)",
+    ("provider", "model", "direction")
+)
+LLM_LATENCY = registry.histogram(
+    "sota_llm_latency_seconds", "Model call latency as seen by the caller", ("provider", "model", "task", "cache")
+)
+
+# Copied in at scrape time from the services' own counters (see Registry)
+SOURCE_CIRCUIT_STATE = registry.gauge(
+    "sota_source_circuit_state", "Source circuit breaker state: 0 closed, 1 half-open, 2 open", ("source",)
+)
+SOURCE_HEALTH_SCORE = registry.gauge("sota_source_health_score", "Source health score, 0-100", ("source",))
+RESPONSE_CACHE_LOOKUPS = registry.counter(
+    "sota_response_cache_lookups_total", "Model response cache lookups (hits, prefix_hits, misses)", ("result",)
+)
+RESPONSE_CACHE_HIT_RATIO = registry.gauge("sota_response_cache_hit_ratio", "Model response cache hit rate")
+HTTP_CACHE_REQUESTS = registry.counter(
+    "sota_http_cache_requests_total", "HTTP response cache outcomes", ("result",)
+)
+CONTENT_EXTRACTION_EVENTS = registry.counter(
+    "sota_content_extraction_total", "Full-text extraction events (downloads, cache hits, parses, errors)", ("event",)
+)
+DB_POOL_CONNECTIONS = registry.gauge(
+    "sota_db_pool_connections", "Database pool connections (size, checked_out, overflow)", ("engine", "state")
+)
+DB_POOL_CHECKOUT_TIMEOUTS = registry.counter(
+    "sota_db_pool_checkout_timeouts_total", "Pool checkouts that timed out", ("engine",)
+)
+DB_POOL_CHECKOUT_WAIT_MAX = registry.gauge(
+    "sota_db_pool_checkout_wait_max_seconds", "Longest wait for a pooled connection", ("engine",)
+)
+WEBSOCKET_CONNECTIONS = registry.gauge("sota_websocket_connections", "Open WebSocket connections on this worker")
+WEBSOCKET_MESSAGES = registry.counter("sota_websocket_messages_total", "WebSocket messages sent by type", ("type",))
+WEBSOCKET_SENT_BYTES = registry.counter(
+    "sota_websocket_sent_bytes_total", "WebSocket payload bytes sent by type, before compression", ("type",)
+)
+WEBSOCKET_DROPPED = registry.counter(
+    "sota_websocket_dropped_total", "WebSocket clients disconnected for not keeping up with broadcasts"
+)
+QUEUE_DEPTH = registry.gauge("sota_queue_depth", "Items waiting or in progress in background queues", ("queue",))
+RATE_LIMIT_DECISIONS = registry.counter(
+    "sota_rate_limit_decisions_total", "Rate limiter decisions by cost rule", ("rule", "result")
+)
+LEADER = registry.gauge("sota_leader", "1 when this worker holds the leader lock")
+
+
+# Tracing: a no-op unless OTEL_ENABLED is set and the SDK is installed
+_tracer = None
+_tracer_provider = None
+
+
+def setup_tracing():
+    """Export spans over OTLP/HTTP to the configured collector"""
+    global _tracer, _tracer_provider
+    if not settings.otel_enabled or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("⚠️ OTEL_ENABLED is set but opentelemetry-sdk is not installed; tracing disabled")
+        return
+    _tracer_provider = TracerProvider(resource=Resource.create({"service.name": settings.otel_service_name}))
+    _tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.otel_exporter_endpoint)))
+    trace.set_tracer_provider(_tracer_provider)
+    _tracer = trace.get_tracer("sota")
+    logger.info(f"📡 Exporting traces to {settings.otel_exporter_endpoint}")
+
+
+def shutdown_tracing():
+    """Flush pending spans"""
+    global _tracer, _tracer_provider
+    if _tracer_provider is not None:
+        _tracer_provider.shutdown()
+    _tracer = _tracer_provider = None
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """A tracing span around a block; yields None when tracing is off"""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+_route_templates: Optional[Dict[Any, str]] = None
+
+
+def route_template(scope) -> str:
+    """The path template ("/api/articles/{article_id}") a finished request was routed to"""
+    global _route_templates
+    from starlette.routing import Match
+
+    app = scope.get("app")
+    routes = getattr(getattr(app, "router", None), "routes", [])
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        if _route_templates is None:
+            _route_templates = {
+                getattr(route, "endpoint", None): route.path for route in routes if hasattr(route, "path")
+            }
+        if endpoint in _route_templates:
+            return _route_templates[endpoint]
+    # Answered before routing (e.g. by the response cache): match it ourselves
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request by route template (outermost, so cache hits count too)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        route = "unmatched"
+        try:
+            with span("http.request", **{"http.method": scope["method"]}) as current:
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    route = route_template(scope)
+                    if current is not None:
+                        current.update_name(f"{scope['method']} {route}")
+                        current.set_attribute("http.route", route)
+                        current.set_attribute("http.status_code", status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, status).observe(time.perf_counter() - started)
@@ -58,6 +58,7 @@ class Newsletter(NewsletterBase):
     total_articles_analyzed: int = 0
     views: int = 0
     shares: int = 0
+    clicks: int = 0
     click_through_rate: float = 0.0
     is_published: bool = True
     is_featured: bool = False
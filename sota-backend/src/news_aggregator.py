@@ -3,101 +3,207 @@ News aggregation system for SOTA.ai
 Monitors multiple sources for AI-related content
 """
 import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 from datetime import datetime, timedelta
-import httpx
-import feedparser
-from bs4 import BeautifulSoup
+from urllib.parse import urlsplit
+
+from .circuit_breaker import SourceHealth
+from .config import settings
+from .metrics import SOURCE_FETCH_DURATION, SOURCE_FETCH_ERRORS, SOURCE_FETCHES, span
+from .profiling import stage, stage_timer
+from .records import ArticleRecord
 
 logger = logging.getLogger(__name__)
 
+SOURCES: Dict[str, Dict[str, Any]] = {
+    "hackernews": {
+        "name": "HackerNews",
+        "category": "community",
+        "site": "https://news.ycombinator.com",
+        "url": "https://hacker-news.firebaseio.com/v0",
+        "type": "api",
+        "keywords": ["AI", "artificial intelligence", "machine learning", "deep learning"]
+    },
+    "reddit_ml": {
+        "name": "Reddit r/MachineLearning",
+        "category": "community",
+        "site": "https://reddit.com/r/MachineLearning",
+        "url": "https://www.reddit.com/r/MachineLearning/.json",
+        "type": "api",
+        "keywords": []
+    },
+    "arxiv": {
+        "name": "ArXiv",
+        "category": "research",
+        "site": "https://arxiv.org",
+        "url": "http://export.arxiv.org/api/query",
+        "type": "api", 
+        "keywords": ["artificial intelligence", "machine learning"]
+    },
+    "openai_blog": {
+        "name": "OpenAI Blog",
+        "category": "official",
+        "site": "https://openai.com/blog",
+        "url": "https://openai.com/blog/rss.xml",
+        "type": "rss",
+        "keywords": []
+    },
+    "google_ai": {
+        "name": "Google AI Blog",
+        "category": "official",
+        "site": "https://ai.googleblog.com",
+        "url": "https://ai.googleblog.com/feeds/posts/default",
+        "type": "rss",
+        "keywords": []
+    },
+    "mit_tech_review": {
+        "name": "MIT Technology Review",
+        "category": "publication",
+        "site": "https://technologyreview.com",
+        "url": "https://www.technologyreview.com/topic/artificial-intelligence/",
+        "type": "web_scraping",
+        "keywords": ["AI", "artificial intelligence"]
+    }
+}
+
+AI_KEYWORDS = [
+    'ai', 'artificial intelligence', 'machine learning', 'ml',
+    'deep learning', 'neural network', 'gpt', 'llm', 'nlp',
+    'computer vision', 'robotics', 'chatbot', 'openai',
+    'google ai', 'deepmind', 'anthropic', 'claude'
+]
+
+
+def is_ai_related(text: str) -> bool:
+    """Check if text mentions any AI keyword"""
+    text_lower = text.lower()
+    return any(keyword in text_lower for keyword in AI_KEYWORDS)
+
+
+def canonical_url(url: str) -> str:
+    """URL with scheme, www., fragment, tracking parameters and trailing slash removed"""
+    parts = urlsplit((url or "").strip())
+    query = "&".join(
+        param for param in parts.query.split("&") if param and not param.lower().startswith("utm_")
+    )
+    host = parts.netloc.lower().removeprefix("www.")
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+@stage("crawl.dedupe")
+def dedupe_articles(articles: List[ArticleRecord]) -> List[ArticleRecord]:
+    """Drop repeats of the same story (same id, URL or headline), keeping the first seen"""
+    seen = set()
+    unique = []
+    for article in articles:
+        keys = (article.id, canonical_url(article.url), " ".join((article.title or "").lower().split()))
+        if any(key in seen for key in keys if key):
+            continue
+        seen.update(key for key in keys if key)
+        unique.append(article)
+    return unique
+
+
+# Mock articles are dated from process start, not from each call, so the live
+# state only changes when an article does (WebSocket deltas diff it)
+MOCK_PUBLISHED_FROM = datetime.now().replace(microsecond=0)
+
+
 class NewsAggregator:
     """Aggregates AI news from multiple sources"""
     
-    def __init__(self):
-        self.sources = {
-            "hackernews": {
-                "url": "https://hacker-news.firebaseio.com/v0",
-                "type": "api",
-                "keywords": ["AI", "artificial intelligence", "machine learning", "deep learning"]
-            },
-            "reddit_ml": {
-                "url": "https://www.reddit.com/r/MachineLearning/.json",
-                "type": "api",
-                "keywords": []
-            },
-            "arxiv": {
-                "url": "http://export.arxiv.org/api/query",
-                "type": "api", 
-                "keywords": ["artificial intelligence", "machine learning"]
-            },
-            "openai_blog": {
-                "url": "https://openai.com/blog/rss.xml",
-                "type": "rss",
-                "keywords": []
-            },
-            "google_ai": {
-                "url": "https://ai.googleblog.com/feeds/posts/default",
-                "type": "rss",
-                "keywords": []
-            },
-            "mit_tech_review": {
-                "url": "https://www.technologyreview.com/topic/artificial-intelligence/",
-                "type": "web_scraping",
-                "keywords": ["AI", "artificial intelligence"]
-            }
-        }
-        self.client = httpx.AsyncClient(timeout=30.0)
+    def __init__(self, transport=None):
+        self.sources = SOURCES
+        self._client = None  # created on first fetch, inside the event loop
+        self.transport = transport  # httpx transport override, e.g. fixture replay
+        self.extractor = None  # ContentExtractor, set by the service container
+        self.health = SourceHealth()  # one circuit breaker per source
+        
+        # Invalidation hooks, called by ingestion paths with newly stored articles
+        self.on_articles_ingested: List[Callable[[List[ArticleRecord]], None]] = []
     
+    @property
+    def client(self):
+        """Shared HTTP client, created on first use"""
+        if self._client is None:
+            import httpx
+            from .http_replay import create_transport
+            transport = self.transport if self.transport is not None else create_transport()
+            self._client = httpx.AsyncClient(timeout=30.0, transport=transport)
+        return self._client
+    
+    def notify_articles_ingested(self, articles: List[ArticleRecord]):
+        """Run the ingestion hooks (cache invalidation, counters)"""
+        if not articles:
+            return
+        for hook in self.on_articles_ingested:
+            try:
+                hook(articles)
+            except Exception as e:
+                logger.error(f"Article ingestion hook failed: {e}")
+    
+    @stage("crawl.extract")
+    async def fetch_full_text(self, articles: List[ArticleRecord]) -> List[ArticleRecord]:
+        """Replace feed snippets with the extracted article text, when extraction is enabled"""
+        if self.extractor is not None and articles:
+            try:
+                await self.extractor.extract_articles(articles)
+            except Exception as e:
+                logger.error(f"Error extracting article content: {e}")
+        return articles
+    
+    @stage("articles.latest")
     async def get_latest_articles(
         self, 
         limit: int = 20, 
         importance_filter: Optional[str] = None,
         db=None
-    ) -> List[Dict[str, Any]]:
+    ) -> List[ArticleRecord]:
         """Get latest AI articles from all sources"""
         try:
             # Mock articles for demonstration
             mock_articles = [
-                {
-                    "id": "1",
-                    "title": "OpenAI Announces GPT-5 with Revolutionary Multimodal Capabilities",
-                    "summary": "The latest iteration promises unprecedented understanding across text, image, audio, and video modalities.",
-                    "url": "https://openai.com/blog/gpt-5-announcement",
-                    "source": "OpenAI Blog",
-                    "published_at": (datetime.now() - timedelta(hours=2)).isoformat(),
-                    "tags": ["OpenAI", "GPT-5", "Multimodal", "LLM"],
-                    "importance": "high",
-                    "ai_score": 0.95
-                },
-                {
-                    "id": "2", 
-                    "title": "Google DeepMind Achieves Breakthrough in Protein Folding Prediction",
-                    "summary": "AlphaFold 3 demonstrates 99.9% accuracy in predicting protein structures.",
-                    "url": "https://deepmind.com/blog/alphafold-3",
-                    "source": "DeepMind",
-                    "published_at": (datetime.now() - timedelta(hours=5)).isoformat(),
-                    "tags": ["Google", "DeepMind", "AlphaFold", "Protein Folding"],
-                    "importance": "high",
-                    "ai_score": 0.92
-                },
-                {
-                    "id": "3",
-                    "title": "Meta Releases Llama 3: Open Source Model Rivals GPT-4",
-                    "summary": "The new open-source language model shows competitive performance with proprietary models.",
-                    "url": "https://ai.meta.com/blog/llama-3-release",
-                    "source": "Meta AI",
-                    "published_at": (datetime.now() - timedelta(hours=8)).isoformat(),
-                    "tags": ["Meta", "Llama 3", "Open Source", "LLM"],
-                    "importance": "medium",
-                    "ai_score": 0.88
-                }
+                ArticleRecord(
+                    id="1",
+                    title="OpenAI Announces GPT-5 with Revolutionary Multimodal Capabilities",
+                    summary="The latest iteration promises unprecedented understanding across text, image, audio, and video modalities.",
+                    url="https://openai.com/blog/gpt-5-announcement",
+                    source="OpenAI Blog",
+                    published_at=(MOCK_PUBLISHED_FROM - timedelta(hours=2)).isoformat(),
+                    tags=("OpenAI", "GPT-5", "Multimodal", "LLM"),
+                    importance="high",
+                    ai_score=0.95
+                ),
+                ArticleRecord(
+                    id="2", 
+                    title="Google DeepMind Achieves Breakthrough in Protein Folding Prediction",
+                    summary="AlphaFold 3 demonstrates 99.9% accuracy in predicting protein structures.",
+                    url="https://deepmind.com/blog/alphafold-3",
+                    source="DeepMind",
+                    published_at=(MOCK_PUBLISHED_FROM - timedelta(hours=5)).isoformat(),
+                    tags=("Google", "DeepMind", "AlphaFold", "Protein Folding"),
+                    importance="high",
+                    ai_score=0.92
+                ),
+                ArticleRecord(
+                    id="3",
+                    title="Meta Releases Llama 3: Open Source Model Rivals GPT-4",
+                    summary="The new open-source language model shows competitive performance with proprietary models.",
+                    url="https://ai.meta.com/blog/llama-3-release",
+                    source="Meta AI",
+                    published_at=(MOCK_PUBLISHED_FROM - timedelta(hours=8)).isoformat(),
+                    tags=("Meta", "Llama 3", "Open Source", "LLM"),
+                    importance="medium",
+                    ai_score=0.88
+                )
             ]
             
             # Filter by importance if specified
             if importance_filter:
-                mock_articles = [a for a in mock_articles if a["importance"] == importance_filter]
+                mock_articles = [a for a in mock_articles if a.importance == importance_filter]
             
             return mock_articles[:limit]
             
@@ -105,113 +211,207 @@ class NewsAggregator:
             logger.error(f"Error fetching articles: {e}")
             return []
     
-    async def fetch_hackernews_ai(self) -> List[Dict[str, Any]]:
+    async def _call_source(self, name: str, fetch: Callable[[], Awaitable[List[ArticleRecord]]]) -> List[ArticleRecord]:
+        """Run a source fetch behind its circuit breaker and timeout budget"""
+        breaker = self.health.breaker(name)
+        if not breaker.allow():
+            logger.debug(f"Skipping {name}: circuit open")
+            SOURCE_FETCHES.labels(name, "rejected").inc()
+            return []
+        
+        started = time.perf_counter()
+        with span("crawl.fetch", source=name) as current, stage_timer(f"crawl.{name}"):
+            try:
+                articles = await asyncio.wait_for(fetch(), timeout=breaker.timeout())
+            except asyncio.CancelledError:
+                breaker.abandon()
+                raise
+            except Exception as e:
+                elapsed = time.perf_counter() - started
+                breaker.record_failure(elapsed, e)
+                outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                SOURCE_FETCHES.labels(name, outcome).inc()
+                SOURCE_FETCH_ERRORS.labels(name, type(e).__name__).inc()
+                SOURCE_FETCH_DURATION.labels(name, outcome).observe(elapsed)
+                if current is not None:
+                    current.record_exception(e)
+                logger.error(f"Error fetching {name}: {breaker.last_error}")
+                return []
+            elapsed = time.perf_counter() - started
+            breaker.record_success(elapsed)
+            SOURCE_FETCHES.labels(name, "success").inc()
+            SOURCE_FETCH_DURATION.labels(name, "success").observe(elapsed)
+            if current is not None:
+                current.set_attribute("articles", len(articles))
+        return articles
+    
+    @stage("crawl", root=True)
+    async def crawl(self) -> List[ArticleRecord]:
+        """Fetch every source concurrently, without dedup; open circuits return immediately"""
+        fetchers = {
+            "hackernews": self.fetch_hackernews_ai,
+            "reddit_ml": self.fetch_reddit_ml,
+            "arxiv": self.fetch_arxiv_papers,
+            "mit_tech_review": self.fetch_mit_tech_review,
+        }
+        calls = [fetch() for fetch in fetchers.values()]
+        calls += [self.fetch_rss_feed(name) for name, source in self.sources.items() if source['type'] == 'rss']
+        results = await asyncio.gather(*calls)
+        return [article for articles in results for article in articles]
+    
+    async def fetch_hackernews_ai(self) -> List[ArticleRecord]:
         """Fetch AI-related stories from HackerNews"""
-        try:
-            # Get top stories
-            response = await self.client.get(f"{self.sources['hackernews']['url']}/topstories.json")
-            story_ids = response.json()[:100]  # Top 100 stories
-            
-            articles = []
-            for story_id in story_ids[:20]:  # Process first 20
-                story_response = await self.client.get(f"{self.sources['hackernews']['url']}/item/{story_id}.json")
-                story = story_response.json()
-                
-                if story and self._is_ai_related(story.get('title', '')):
-                    articles.append({
-                        "id": f"hn_{story_id}",
-                        "title": story.get('title'),
-                        "url": story.get('url'),
-                        "source": "HackerNews",
-                        "published_at": datetime.fromtimestamp(story.get('time', 0)).isoformat(),
-                        "score": story.get('score', 0)
-                    })
-            
-            return articles
+        articles = await self._call_source("hackernews", self._fetch_hackernews_ai)
+        return await self.fetch_full_text(articles)
+    
+    async def _fetch_hackernews_ai(self) -> List[ArticleRecord]:
+        # Get top stories
+        response = await self.client.get(f"{self.sources['hackernews']['url']}/topstories.json")
+        response.raise_for_status()
+        story_ids = response.json()[:100]  # Top 100 stories
+        
+        articles = []
+        for story_id in story_ids[:20]:  # Process first 20
+            story_response = await self.client.get(f"{self.sources['hackernews']['url']}/item/{story_id}.json")
+            story = story_response.json()
             
-        except Exception as e:
-            logger.error(f"Error fetching HackerNews: {e}")
-            return []
+            if story and self._is_ai_related(story.get('title', '')):
+                articles.append(ArticleRecord(
+                    id=f"hn_{story_id}",
+                    title=story.get('title'),
+                    url=story.get('url'),
+                    source="HackerNews",
+                    published_at=datetime.fromtimestamp(story.get('time', 0)).isoformat(),
+                    score=story.get('score', 0)
+                ))
+        
+        return articles
     
-    async def fetch_reddit_ml(self) -> List[Dict[str, Any]]:
+    async def fetch_reddit_ml(self) -> List[ArticleRecord]:
         """Fetch posts from Reddit r/MachineLearning"""
-        try:
-            headers = {"User-Agent": "SOTA.ai/1.0"}
-            response = await self.client.get(self.sources['reddit_ml']['url'], headers=headers)
-            data = response.json()
-            
-            articles = []
-            for post in data.get('data', {}).get('children', []):
-                post_data = post.get('data', {})
-                articles.append({
-                    "id": f"reddit_{post_data.get('id')}",
-                    "title": post_data.get('title'),
-                    "url": post_data.get('url'),
-                    "source": "Reddit r/MachineLearning",
-                    "published_at": datetime.fromtimestamp(post_data.get('created_utc', 0)).isoformat(),
-                    "score": post_data.get('score', 0),
-                    "summary": post_data.get('selftext', '')[:200] + "..." if post_data.get('selftext') else ""
-                })
-            
-            return articles[:20]
-            
-        except Exception as e:
-            logger.error(f"Error fetching Reddit: {e}")
-            return []
+        articles = await self._call_source("reddit_ml", self._fetch_reddit_ml)
+        return await self.fetch_full_text(articles[:20])
     
-    async def fetch_arxiv_papers(self) -> List[Dict[str, Any]]:
+    async def _fetch_reddit_ml(self) -> List[ArticleRecord]:
+        headers = {"User-Agent": "SOTA.ai/1.0"}
+        response = await self.client.get(self.sources['reddit_ml']['url'], headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        
+        articles = []
+        for post in data.get('data', {}).get('children', []):
+            post_data = post.get('data', {})
+            articles.append(ArticleRecord(
+                id=f"reddit_{post_data.get('id')}",
+                title=post_data.get('title'),
+                url=post_data.get('url'),
+                source="Reddit r/MachineLearning",
+                published_at=datetime.fromtimestamp(post_data.get('created_utc', 0)).isoformat(),
+                score=post_data.get('score', 0),
+                summary=post_data.get('selftext', '')[:200] + "..." if post_data.get('selftext') else ""
+            ))
+        
+        return articles
+    
+    async def fetch_arxiv_papers(self) -> List[ArticleRecord]:
         """Fetch recent AI papers from ArXiv"""
-        try:
-            query = "cat:cs.AI OR cat:cs.LG OR cat:cs.CL"
-            url = f"{self.sources['arxiv']['url']}?search_query={query}&start=0&max_results=20&sortBy=submittedDate&sortOrder=descending"
-            
-            response = await self.client.get(url)
-            feed = feedparser.parse(response.text)
-            
-            articles = []
-            for entry in feed.entries:
-                articles.append({
-                    "id": f"arxiv_{entry.id.split('/')[-1]}",
-                    "title": entry.title,
-                    "url": entry.id,
-                    "source": "ArXiv",
-                    "published_at": entry.published,
-                    "summary": entry.summary[:300] + "...",
-                    "authors": [author.name for author in entry.authors]
-                })
-            
-            return articles
-            
-        except Exception as e:
-            logger.error(f"Error fetching ArXiv: {e}")
-            return []
+        return await self._call_source("arxiv", self._fetch_arxiv_papers)
+    
+    async def _fetch_arxiv_papers(self) -> List[ArticleRecord]:
+        query = "cat:cs.AI OR cat:cs.LG OR cat:cs.CL"
+        url = f"{self.sources['arxiv']['url']}?search_query={query}&start=0&max_results=20&sortBy=submittedDate&sortOrder=descending"
+        
+        import feedparser  # deferred: only crawling workers parse feeds
+        
+        response = await self.client.get(url)
+        response.raise_for_status()
+        feed = feedparser.parse(response.text)
+        
+        articles = []
+        for entry in feed.entries:
+            articles.append(ArticleRecord(
+                id=f"arxiv_{entry.id.split('/')[-1]}",
+                title=entry.title,
+                url=entry.id,
+                source="ArXiv",
+                published_at=entry.published,
+                summary=entry.summary[:300] + "...",
+                authors=tuple(author.name for author in entry.authors)
+            ))
+        
+        return articles
     
-    async def fetch_rss_feed(self, source_name: str) -> List[Dict[str, Any]]:
+    async def fetch_rss_feed(self, source_name: str) -> List[ArticleRecord]:
         """Fetch articles from RSS feed"""
-        try:
-            source = self.sources.get(source_name)
-            if not source or source['type'] != 'rss':
-                return []
-            
-            response = await self.client.get(source['url'])
-            feed = feedparser.parse(response.text)
-            
-            articles = []
-            for entry in feed.entries:
-                articles.append({
-                    "id": f"{source_name}_{hash(entry.link)}",
-                    "title": entry.title,
-                    "url": entry.link,
-                    "source": source_name.replace('_', ' ').title(),
-                    "published_at": entry.published,
-                    "summary": getattr(entry, 'summary', '')[:300] + "..."
-                })
-            
-            return articles[:10]
-            
-        except Exception as e:
-            logger.error(f"Error fetching RSS feed {source_name}: {e}")
+        source = self.sources.get(source_name)
+        if not source or source['type'] != 'rss':
             return []
+        
+        articles = await self._call_source(source_name, lambda: self._fetch_rss_feed(source_name))
+        return await self.fetch_full_text(articles[:10])
+    
+    async def _fetch_rss_feed(self, source_name: str) -> List[ArticleRecord]:
+        import feedparser
+        
+        response = await self.client.get(self.sources[source_name]['url'])
+        response.raise_for_status()
+        feed = feedparser.parse(response.text)
+        
+        articles = []
+        for entry in feed.entries:
+            articles.append(ArticleRecord(
+                id=f"{source_name}_{hashlib.sha1(entry.link.encode()).hexdigest()[:16]}",
+                title=entry.title,
+                url=entry.link,
+                source=self.sources[source_name]['name'],
+                published_at=entry.published,
+                summary=getattr(entry, 'summary', '')[:300] + "..."
+            ))
+        
+        return articles
+    
+    async def fetch_mit_tech_review(self) -> List[ArticleRecord]:
+        """Scrape the MIT Technology Review AI topic page"""
+        articles = await self._call_source("mit_tech_review", self._fetch_mit_tech_review)
+        return await self.fetch_full_text(articles)
+    
+    async def _fetch_mit_tech_review(self) -> List[ArticleRecord]:
+        from .extraction import extract_links
+        
+        source = self.sources['mit_tech_review']
+        response = await self.client.get(source['url'], headers={"User-Agent": "SOTA.ai/1.0"}, follow_redirects=True)
+        response.raise_for_status()
+        
+        if self.extractor is not None:
+            links = await self.extractor.run(extract_links, response.text, source['url'])
+        else:
+            links = await asyncio.to_thread(extract_links, response.text, source['url'])
+        
+        articles = []
+        for link in links[:10]:
+            articles.append(ArticleRecord(
+                id=f"mit_{hashlib.sha1(link['url'].encode()).hexdigest()[:16]}",
+                title=link['title'],
+                url=link['url'],
+                source="MIT Technology Review",
+                published_at=link['published_at']
+            ))
+        
+        return articles
+    
+    def source_table(self) -> List[Dict[str, Any]]:
+        """Monitored sources with their circuit state and health"""
+        table = self.health.table()
+        return [
+            {
+                "id": name,
+                "name": source["name"],
+                "type": source["category"],
+                "url": source["site"],
+                "health": table.get(name, {"state": "unknown", "health_score": None}),
+            }
+            for name, source in self.sources.items()
+        ]
     
     async def get_latest_update(self) -> Dict[str, Any]:
         """Get latest update for WebSocket streaming"""
@@ -226,20 +426,24 @@ class NewsAggregator:
             }
         }
     
+    async def get_live_state(self, limit: int = settings.ws_snapshot_articles) -> Dict[str, Any]:
+        """Latest articles and trends, the state WebSocket clients are kept in sync with"""
+        articles = await self.get_latest_articles(limit=limit)
+        update = await self.get_latest_update()
+        return {
+            "articles": [article.to_response() for article in articles],
+            "trending_topics": update["data"]["trending_topics"],
+            "breaking_news": update["data"]["breaking_news"],
+        }
+    
     def _is_ai_related(self, text: str) -> bool:
         """Check if text is AI-related"""
-        ai_keywords = [
-            'ai', 'artificial intelligence', 'machine learning', 'ml',
-            'deep learning', 'neural network', 'gpt', 'llm', 'nlp',
-            'computer vision', 'robotics', 'chatbot', 'openai',
-            'google ai', 'deepmind', 'anthropic', 'claude'
-        ]
-        
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in ai_keywords)
+        return is_ai_related(text)
     
     async def close(self):
         """Close the HTTP client"""
-        await self.client.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
 
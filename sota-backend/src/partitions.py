@@ -0,0 +1,260 @@
+"""
+Time partitioning and retention for SOTA.ai analytics events
+Creates range partitions ahead of time and archives/drops expired ones
+"""
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import column as sql_column, delete, select, table as sql_table, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import settings
+from .database import AnalyticsEvent, analytics_engine
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 10_000
+
+
+def partition_bounds(day: datetime, interval: str) -> Tuple[datetime, datetime]:
+    """Start (inclusive) and end (exclusive) of the partition containing ``day``"""
+    start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "day":
+        return start, start + timedelta(days=1)
+    if interval == "month":
+        start = start.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        return start, end
+    raise ValueError(f"Unknown partition interval: {interval}")
+
+
+def partition_name(table: str, start: datetime, interval: str) -> str:
+    suffix = start.strftime("%Y%m%d" if interval == "day" else "%Y%m")
+    return f"{table}_p{suffix}"
+
+
+class PartitionManager:
+    """Maintains range partitions of analytics_events and applies retention"""
+
+    def __init__(
+        self,
+        target: AsyncEngine = analytics_engine,
+        interval: str = settings.analytics_partition_interval,
+        premake: int = settings.analytics_partition_premake,
+        retention_days: Optional[int] = settings.analytics_retention_days,
+        archive_dir: Optional[str] = settings.analytics_archive_dir if settings.analytics_archive_enabled else None,
+        archive_format: str = settings.analytics_archive_format,
+        maintenance_interval: float = settings.partition_maintenance_interval,
+    ):
+        self.engine = target
+        self.table = AnalyticsEvent.__tablename__
+        self.interval = interval
+        self.premake = premake
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.archive_format = archive_format
+        self.maintenance_interval = maintenance_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Run maintenance now and then on an interval"""
+        await self.run_maintenance()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            await self.run_maintenance()
+
+    async def run_maintenance(self) -> Dict[str, Any]:
+        """Create upcoming partitions, then archive/drop expired data"""
+        report = {"created": [], "archived": [], "dropped": []}
+        try:
+            async with self.engine.connect() as conn:
+                partitioned = conn.dialect.name == "postgresql"
+            if partitioned:
+                report["created"] = await self.ensure_partitions()
+            if self.retention_days is not None:
+                if partitioned:
+                    await self._expire_partitions(report)
+                else:
+                    await self._expire_rows(report)
+        except Exception as e:
+            logger.error(f"❌ Analytics partition maintenance failed: {e}")
+        return report
+
+    async def ensure_partitions(self) -> List[str]:
+        """Create the current partition and ``premake`` future ones, plus a default"""
+        created = []
+        day = datetime.utcnow()
+        async with self.engine.begin() as conn:
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {self.table}_default PARTITION OF {self.table} DEFAULT"
+            ))
+            for _ in range(self.premake + 1):
+                start, end = partition_bounds(day, self.interval)
+                name = partition_name(self.table, start, self.interval)
+                result = await conn.execute(text("SELECT to_regclass(:name)"), {"name": name})
+                if result.scalar() is None:
+                    await conn.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF {self.table} "
+                        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                    ))
+                    created.append(name)
+                day = end
+        if created:
+            logger.info(f"🗂️ Created analytics partitions: {', '.join(created)}")
+        return created
+
+    async def list_partitions(self) -> List[Tuple[str, datetime, datetime]]:
+        """Existing (name, start, end) range partitions, oldest first"""
+        async with self.engine.connect() as conn:
+            rows = await conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :table"
+            ), {"table": self.table})
+            names = [row[0] for row in rows]
+
+        partitions = []
+        prefix = f"{self.table}_p"
+        for name in names:
+            if not name.startswith(prefix):
+                continue  # the default partition
+            suffix = name[len(prefix):]
+            start = datetime.strptime(suffix, "%Y%m%d" if len(suffix) == 8 else "%Y%m")
+            partitions.append((name, *partition_bounds(start, "day" if len(suffix) == 8 else "month")))
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    async def _expire_partitions(self, report: Dict[str, Any]):
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        for name, start, end in await self.list_partitions():
+            if end > cutoff:
+                continue
+            if self.archive_dir:
+                path = await self._archive(
+                    select(AnalyticsEvent.__table__).where(
+                        AnalyticsEvent.timestamp >= start, AnalyticsEvent.timestamp < end
+                    )
+                )
+                if path:
+                    report["archived"].append(path)
+            async with self.engine.begin() as conn:
+                await conn.execute(text(f"ALTER TABLE {self.table} DETACH PARTITION {name}"))
+                await conn.execute(text(f"DROP TABLE {name}"))
+            report["dropped"].append(name)
+            logger.info(f"🧹 Dropped expired analytics partition {name}")
+        # Rows outside every range partition never get a partition to drop
+        await self._expire_rows(report, f"{self.table}_default")
+
+    async def _expire_rows(self, report: Dict[str, Any], table_name: Optional[str] = None):
+        """Row-by-row retention, for databases without partitioning (e.g. SQLite) and the default partition"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        source = AnalyticsEvent.__table__
+        if table_name is not None:
+            source = sql_table(table_name, *(sql_column(c.name) for c in AnalyticsEvent.__table__.columns))
+        if self.archive_dir:
+            path = await self._archive(select(source).where(source.c.timestamp < cutoff))
+            if path:
+                report["archived"].append(path)
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(source).where(source.c.timestamp < cutoff))
+
+    def _archive_path(self, first: datetime, last: datetime, extension: str) -> str:
+        """A name no other archive has: the rows' time range, numbered if it repeats"""
+        stem = os.path.join(self.archive_dir, f"{self.table}_{first:%Y%m%dT%H%M%S}-{last:%Y%m%dT%H%M%S}")
+        path = f"{stem}.{extension}"
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = f"{stem}_{n}.{extension}"
+        return path
+
+    async def _archive(self, query) -> Optional[str]:
+        """Stream rows to a new compressed file in bounded memory; None when there were no rows
+
+        Files are written under a temporary name and renamed once complete,
+        so an archive is never overwritten or left half-written.
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        columns = [column.name for column in AnalyticsEvent.__table__.columns]
+        timestamp = columns.index("timestamp")
+        first = last = None
+
+        def track(rows):
+            nonlocal first, last
+            for row in rows:
+                if first is None or row[timestamp] < first:
+                    first = row[timestamp]
+                if last is None or row[timestamp] > last:
+                    last = row[timestamp]
+
+        extension = "csv.gz"
+        if self.archive_format == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                logger.warning("⚠️ pyarrow is not installed, archiving as csv.gz instead")
+            else:
+                extension = "parquet"
+
+        partial = os.path.join(self.archive_dir, f".{self.table}_{uuid.uuid4().hex}.partial")
+        try:
+            if extension == "parquet":
+                writer = None
+                try:
+                    async with self.engine.connect() as conn:
+                        result = await conn.stream(query)
+                        async for rows in result.partitions(ARCHIVE_BATCH_SIZE):
+                            track(rows)
+                            batch = {
+                                column: [
+                                    json.dumps(row[i]) if column == "metadata" else row[i]
+                                    for row in rows
+                                ]
+                                for i, column in enumerate(columns)
+                            }
+                            table = pa.table(batch)
+                            if writer is None:
+                                writer = pq.ParquetWriter(partial, table.schema, compression="zstd")
+                            writer.write_table(table)
+                finally:
+                    if writer is not None:
+                        writer.close()
+            else:
+                with gzip.open(partial, "wt", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+                    async with self.engine.connect() as conn:
+                        result = await conn.stream(query)
+                        async for rows in result.partitions(ARCHIVE_BATCH_SIZE):
+                            track(rows)
+                            writer.writerows(
+                                [json.dumps(value) if isinstance(value, (dict, list)) else value for value in row]
+                                for row in rows
+                            )
+
+            if first is None:
+                return None
+            path = self._archive_path(first, last, extension)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        logger.info(f"📦 Archived analytics events to {path}")
+        return path
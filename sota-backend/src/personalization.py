@@ -0,0 +1,156 @@
+"""
+Topic-personalized newsletter editions for SOTA.ai
+Article blocks are rendered once and variants are assembled from cached fragments
+"""
+import html
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .records import ArticleRecord
+
+logger = logging.getLogger(__name__)
+
+# Bump when fragment markup changes so cached fragments are not reused
+TEMPLATE_VERSION = "1"
+
+FORMATS = ("markdown", "html")
+
+
+def normalize_topics(topics: Iterable[str]) -> Tuple[str, ...]:
+    """Canonical topic set: lowercased, deduplicated and sorted"""
+    return tuple(sorted({topic.strip().lower() for topic in topics} - {""}))
+
+
+def render_article_markdown(article: ArticleRecord) -> str:
+    """Markdown highlight block for one article"""
+    importance_emoji = "🔥" if article.importance == "high" else "⭐" if article.importance == "medium" else "📝"
+
+    section = f"""
+### {importance_emoji} {article.title}
+
+**Source:** {article.source} | **AI Score:** {article.ai_score:.1f}/1.0
+
+{article.summary}
+
+**Key Insights:**
+"""
+
+    for insight in article.key_insights:
+        section += f"- {insight}\n"
+
+    section += f"\n**Tags:** {', '.join(article.tags)}\n"
+    section += f"**[Read More →]({article.url})**\n\n---\n"
+    return section
+
+
+def render_article_html(article: ArticleRecord) -> str:
+    """HTML highlight block for one article"""
+    escape = html.escape
+    insights = "".join(f"<li>{escape(insight)}</li>" for insight in article.key_insights)
+    return (
+        f'<section class="article" data-id="{escape(article.id)}">'
+        f"<h3>{escape(article.title)}</h3>"
+        f"<p class=\"meta\">{escape(article.source)} · AI Score {article.ai_score:.1f}/1.0</p>"
+        f"<p>{escape(article.summary)}</p>"
+        f"<ul>{insights}</ul>"
+        f"<p class=\"tags\">{escape(', '.join(article.tags))}</p>"
+        f"<a href=\"{escape(article.url)}\">Read More →</a>"
+        "</section>"
+    )
+
+
+class EditionEngine:
+    """Builds per-subscriber newsletter variants from shared rendered fragments"""
+
+    def __init__(self, max_fragments: int = 10_000, max_variants: int = 1_000, max_articles: int = 5):
+        self.max_fragments = max_fragments
+        self.max_variants = max_variants
+        self.max_articles = max_articles
+        self._fragments: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        # Assembled editions per (newsletter, generated_at, topic set, format)
+        self._variants: "OrderedDict[Tuple[Any, ...], str]" = OrderedDict()
+        self.stats = {"fragment_renders": 0, "fragment_hits": 0, "assemblies": 0, "variant_hits": 0}
+
+    def fragment(self, article: ArticleRecord, fmt: str = "markdown") -> str:
+        """Rendered block for an article, keyed by article ID and template version"""
+        key = (article.id, TEMPLATE_VERSION, fmt)
+        cached = self._fragments.get(key)
+        if cached is not None:
+            self._fragments.move_to_end(key)
+            self.stats["fragment_hits"] += 1
+            return cached
+
+        if fmt == "markdown":
+            rendered = render_article_markdown(article)
+        elif fmt == "html":
+            rendered = render_article_html(article)
+        else:
+            raise ValueError(f"Unknown format: {fmt}")
+
+        self._fragments[key] = rendered
+        self.stats["fragment_renders"] += 1
+        while len(self._fragments) > self.max_fragments:
+            self._fragments.popitem(last=False)
+        return rendered
+
+    def invalidate(self, article_ids: Iterable[str]):
+        """Drop fragments for articles whose analysis changed"""
+        ids = {str(article_id) for article_id in article_ids}
+        for key in [key for key in self._fragments if key[0] in ids]:
+            del self._fragments[key]
+        self._variants.clear()
+
+    @staticmethod
+    def topic_score(article: ArticleRecord, topics: Iterable[str]) -> float:
+        """Share of the subscriber's topics an article covers, weighted by AI score"""
+        wanted = {topic.lower() for topic in topics}
+        if not wanted:
+            return article.ai_score
+        tags = {tag.lower() for tag in article.tags}
+        overlap = len(wanted & tags) / len(wanted)
+        return overlap + 0.1 * article.ai_score
+
+    def select_articles(self, articles: List[ArticleRecord], topics: Iterable[str]) -> List[ArticleRecord]:
+        """Pick the articles for a variant, best topic match first"""
+        topics = list(topics)
+        ranked = sorted(articles, key=lambda article: self.topic_score(article, topics), reverse=True)
+        return ranked[:self.max_articles]
+
+    def assemble(
+        self,
+        newsletter: Dict[str, Any],
+        topics: Optional[Iterable[str]] = None,
+        fmt: str = "markdown",
+    ) -> str:
+        """Concatenate header, chosen article fragments and footer"""
+        # Every spelling of a topic set shares one variant, so render the canonical one
+        topics = list(normalize_topics(topics or []))
+        variant_key = (newsletter.get("id"), newsletter.get("generated_at"), tuple(topics), fmt)
+        cached = self._variants.get(variant_key)
+        if cached is not None:
+            self.stats["variant_hits"] += 1
+            return cached
+
+        content = self._assemble(newsletter, topics, fmt)
+        self._variants[variant_key] = content
+        while len(self._variants) > self.max_variants:
+            self._variants.popitem(last=False)
+        return content
+
+    def _assemble(self, newsletter: Dict[str, Any], topics: List[str], fmt: str) -> str:
+        self.stats["assemblies"] += 1
+        picks = self.select_articles(newsletter.get("articles", []), topics)
+
+        if fmt == "html":
+            header = f"<h1>{html.escape(newsletter['title'])}</h1>"
+            if topics:
+                header += f"<p>Picked for you: {html.escape(', '.join(topics))}</p>"
+            footer = '<p><a href="https://sota.ai/unsubscribe">Unsubscribe</a></p>'
+            return header + "".join(self.fragment(article, "html") for article in picks) + footer
+
+        header = f"# 🚀 {newsletter['title']}\n\n"
+        if topics:
+            header += f"*Picked for you: {', '.join(topics)}*\n\n---\n"
+        footer = "\n*🤖 Curated by SOTA.ai* | [Unsubscribe](https://sota.ai/unsubscribe)\n"
+        return header + "".join(self.fragment(article) for article in picks) + footer
@@ -0,0 +1,490 @@
+"""
+On-demand profiling for SOTA.ai
+Stage timing breakdowns, a stack sampler, cProfile and tracemalloc sessions with flamegraph-ready output
+"""
+import asyncio
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from fnmatch import fnmatchcase
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import settings
+from .metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+MODES = ("stages", "sample", "cprofile", "tracemalloc")
+TOP_N = 15
+
+# (breakdown, stage path) for the request or background job being timed; None when nobody is profiling
+_current: ContextVar[Optional[Tuple["StageBreakdown", Tuple[str, ...]]]] = ContextVar("profiling_stage", default=None)
+
+
+class StageBreakdown:
+    """Inclusive time per stage path for one request or background job"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.stages: Dict[Tuple[str, ...], List[float]] = {}  # path -> [calls, seconds]
+
+    def add(self, path: Tuple[str, ...], seconds: float):
+        entry = self.stages.get(path)
+        if entry is None:
+            self.stages[path] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def totals(self) -> Dict[str, List[float]]:
+        """Calls and seconds per stage name, summed over every path it appeared on"""
+        totals: Dict[str, List[float]] = {}
+        for path, (calls, seconds) in self.stages.items():
+            entry = totals.setdefault(path[-1], [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, browsers show it in the network panel"""
+        parts = [f"total;dur={self.elapsed * 1000:.1f}"]
+        for name, (calls, seconds) in sorted(self.totals().items(), key=lambda item: -item[1][1]):
+            parts.append(f'{name};dur={seconds * 1000:.1f};desc="{calls}x"')
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        stages = sorted(self.totals().items(), key=lambda item: -item[1][1])
+        details = ", ".join(f"{name} {seconds * 1000:.1f}ms×{calls}" for name, (calls, seconds) in stages)
+        return f"{self.label} {self.elapsed * 1000:.1f}ms" + (f" ({details})" if details else "")
+
+    def folded(self) -> Counter:
+        """Self time per stack in microseconds, the input format of flamegraph.pl and speedscope"""
+        root = (self.label,)
+        inclusive = {root: self.elapsed}
+        for path, (_, seconds) in self.stages.items():
+            inclusive[root + path] = seconds
+        children: Dict[Tuple[str, ...], float] = Counter()
+        for path, seconds in inclusive.items():
+            if len(path) > 1:
+                children[path[:-1]] += seconds
+        # Concurrent children can add up to more than their parent's wall time
+        return Counter({
+            ";".join(path): max(0, round((seconds - children.get(path, 0.0)) * 1e6))
+            for path, seconds in inclusive.items()
+        })
+
+
+def _enter(name: str) -> Tuple[StageBreakdown, Any, bool]:
+    """Push a stage; with nothing being timed yet, it becomes the root of a new breakdown"""
+    current = _current.get()
+    if current is None:
+        breakdown, path, owner = StageBreakdown(name), (), True  # the breakdown's label is the root
+    else:
+        (breakdown, parent), owner = current, False
+        path = parent + (name,)
+    return breakdown, _current.set((breakdown, path)), owner
+
+
+def _exit(breakdown: StageBreakdown, token, owner: bool, started: float):
+    elapsed = time.perf_counter() - started
+    _, path = _current.get()
+    _current.reset(token)
+    if owner:
+        breakdown.finish()
+        profiler.record(breakdown, log=True)
+    else:
+        breakdown.add(path, elapsed)
+
+
+def stage(name: str, root: bool = False):
+    """Time a function as a named stage of whatever request or job is being profiled
+
+    Costs one context-variable lookup when profiling is off. A ``root`` stage
+    starts its own breakdown while a profiling session runs, so background work
+    (crawls, scheduled newsletters) is covered too.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current.get() is None and not (root and profiler.session is not None):
+                    return await func(*args, **kwargs)
+                breakdown, token, owner = _enter(name)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _exit(breakdown, token, owner, started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None and not (root and profiler.session is not None):
+                return func(*args, **kwargs)
+            breakdown, token, owner = _enter(name)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _exit(breakdown, token, owner, started)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def stage_timer(name: str) -> Iterator[None]:
+    """``stage`` for a block, when the stage name is only known at run time"""
+    if _current.get() is None:
+        yield
+        return
+    breakdown, token, owner = _enter(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _exit(breakdown, token, owner, started)
+
+
+def _frame_label(code, lineno: int) -> str:
+    """py-spy style "function (file:line)", paths shortened to the package or project"""
+    filename = code.co_filename
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker >= 0:
+        filename = filename[marker + len("site-packages") + 1:]
+    elif filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{lineno})"
+
+
+class StackSampler:
+    """Samples the event-loop thread's Python stack from a helper thread
+
+    Produces collapsed stacks like ``py-spy record --format raw``. Samples taken
+    while the loop waits in its selector are counted as idle and left out.
+    """
+
+    def __init__(self, interval: float, gate: Callable[[], bool]):
+        self.interval = interval
+        self.gate = gate
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._thread_id = threading.get_ident()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            if not self.gate():
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            if frame.f_code.co_filename.endswith("selectors.py"):
+                self.idle += 1
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+
+class ProfileSession:
+    """One profiling window on this worker"""
+
+    def __init__(self, mode: str, seconds: float, route: Optional[str], interval_ms: float):
+        self.mode = mode
+        self.seconds = seconds
+        self.route = route
+        self.interval_ms = interval_ms
+        self.started_at = datetime.utcnow()
+        self.deadline = time.monotonic() + seconds
+        self.requests = 0
+        self.in_flight = 0  # matching requests running now; gates the sampler
+        self.breakdowns = 0
+        self.stages: Dict[str, List[float]] = {}
+        self.stage_stacks: Counter = Counter()
+        self.sampler: Optional[StackSampler] = None
+        self.cprofile: Optional[cProfile.Profile] = None
+        self.stop_tracemalloc = False
+        self.expiry: Optional[asyncio.Task] = None
+
+    @property
+    def gated(self) -> bool:
+        return self.route is not None
+
+    def matches(self, path: str) -> bool:
+        return self.route is None or fnmatchcase(path, self.route)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "route": self.route,
+            "seconds": self.seconds,
+            "started_at": self.started_at.isoformat(),
+            "remaining_seconds": round(max(0.0, self.deadline - time.monotonic()), 1),
+            "requests_profiled": self.requests,
+        }
+
+
+class Profiler:
+    """At most one session per worker; everything here runs on the event loop"""
+
+    def __init__(self, output_dir: str = settings.profile_output_dir):
+        self.output_dir = output_dir
+        self.session: Optional[ProfileSession] = None
+        self.recent: deque = deque(maxlen=20)
+
+    def start(
+        self,
+        mode: str = "stages",
+        seconds: float = 30.0,
+        route: Optional[str] = None,
+        interval_ms: Optional[float] = None,
+    ) -> ProfileSession:
+        """Begin a session; it writes its output and ends by itself after seconds"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode} (choose from {', '.join(MODES)})")
+        if not 0 < seconds <= settings.profile_max_seconds:
+            raise ValueError(f"seconds must be between 0 and {settings.profile_max_seconds}")
+        if mode == "tracemalloc" and route is not None:
+            raise ValueError("tracemalloc traces the whole process and cannot be limited to a route")
+        if mode == "cprofile" and route is not None:
+            # cProfile hooks the whole event-loop thread, so other routes' requests interleave into it
+            raise ValueError("cprofile records the whole event loop and cannot be limited to a route")
+        if self.session is not None:
+            raise RuntimeError(f"A {self.session.mode} session is already running")
+
+        session = ProfileSession(mode, seconds, route, interval_ms or settings.profile_sample_interval_ms)
+        if mode == "sample":
+            session.sampler = StackSampler(session.interval_ms / 1000, lambda: not session.gated or session.in_flight > 0)
+            session.sampler.start()
+        elif mode == "cprofile":
+            session.cprofile = cProfile.Profile()
+            session.cprofile.enable()
+        elif mode == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.profile_tracemalloc_frames)
+            session.stop_tracemalloc = True
+        session.expiry = asyncio.create_task(self._expire(session))
+        self.session = session
+        logger.info(f"🔬 Profiling ({mode}) for {seconds:g}s" + (f" on {route}" if route else ""))
+        return session
+
+    async def _expire(self, session: ProfileSession):
+        await asyncio.sleep(session.seconds)
+        if self.session is session:
+            await self.stop()
+
+    async def stop(self) -> Optional[Dict[str, Any]]:
+        """End the running session early and write its output"""
+        session, self.session = self.session, None
+        if session is None:
+            return None
+        if session.expiry is not None and session.expiry is not asyncio.current_task():
+            session.expiry.cancel()
+        if session.cprofile is not None:
+            session.cprofile.disable()
+        snapshot = None
+        if session.mode == "tracemalloc":
+            snapshot = tracemalloc.take_snapshot()
+            if session.stop_tracemalloc:
+                tracemalloc.stop()
+        if session.sampler is not None:
+            await asyncio.to_thread(session.sampler.stop)
+        try:
+            result = await asyncio.to_thread(self._write, session, snapshot)
+        except OSError as e:
+            logger.error(f"❌ Could not write profile output: {e}")
+            result = {**session.describe(), "error": str(e)}
+        self.recent.appendleft(result)
+        logger.info(f"🔬 Profiling ({session.mode}) finished: {', '.join(result.get('files', [])) or 'no output'}")
+        return result
+
+    def request_started(self, session: ProfileSession):
+        session.requests += 1
+        session.in_flight += 1
+
+    def request_finished(self, session: ProfileSession):
+        session.in_flight -= 1
+
+    def record(self, breakdown: StageBreakdown, log: bool = False):
+        """Fold a finished breakdown into the session output (and the log, for background work)"""
+        if log:
+            logger.info(f"⏱️ {breakdown.summary()}")
+        session = self.session
+        if session is None:
+            return
+        session.breakdowns += 1
+        for name, (calls, seconds) in breakdown.totals().items():
+            entry = session.stages.setdefault(name, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+        session.stage_stacks.update(breakdown.folded())
+
+    def _write(self, session: ProfileSession, snapshot) -> Dict[str, Any]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{session.started_at:%Y%m%d-%H%M%S}-{session.mode}-{os.getpid()}")
+        result: Dict[str, Any] = {**session.describe(), "files": []}
+        result.pop("remaining_seconds")
+
+        if session.stage_stacks:
+            result["files"].append(_write_folded(f"{base}-stages.folded", session.stage_stacks))
+        result["stages"] = {
+            name: {"calls": calls, "total_ms": round(seconds * 1000, 1)}
+            for name, (calls, seconds) in sorted(session.stages.items(), key=lambda item: -item[1][1])
+        }
+
+        if session.sampler is not None:
+            sampler = session.sampler
+            result["samples"] = sampler.samples
+            result["idle_samples"] = sampler.idle
+            if sampler.stacks:
+                result["files"].append(_write_folded(f"{base}.folded", sampler.stacks))
+            leaves = Counter()
+            for stack, count in sampler.stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            result["top"] = [{"function": name, "samples": count} for name, count in leaves.most_common(TOP_N)]
+
+        if session.cprofile is not None:
+            path = f"{base}.prof"
+            session.cprofile.dump_stats(path)
+            result["files"].append(path)
+            out = io.StringIO()
+            stats = pstats.Stats(session.cprofile, stream=out)
+            stats.sort_stats("cumulative").print_stats(TOP_N)
+            result["top"] = out.getvalue().strip().splitlines()
+
+        if snapshot is not None:
+            path = f"{base}.tracemalloc"
+            snapshot.dump(path)
+            result["files"].append(path)
+            # Bytes still allocated per allocation stack: a memory flamegraph
+            stacks = Counter()
+            for stat in snapshot.statistics("traceback"):
+                frames = [f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback]
+                stacks[";".join(reversed(frames))] += stat.size
+            if stacks:
+                result["files"].append(_write_folded(f"{base}-memory.folded", stacks))
+            result["top"] = [
+                {"line": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:TOP_N]
+            ]
+        return result
+
+
+def _write_folded(path: str, stacks: Counter) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, value in sorted(stacks.items()):
+            if value > 0:
+                f.write(f"{stack} {value}\n")
+    return path
+
+
+profiler = Profiler()
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Constant-time check against ADMIN_TOKEN; always False when no token is configured"""
+    if not settings.admin_token or token is None:
+        return False
+    # compare_digest raises on non-ASCII str, so compare the bytes the client sent
+    # (header values arrive decoded as latin-1)
+    try:
+        sent = token.encode("latin-1")
+    except UnicodeEncodeError:
+        return False
+    return hmac.compare_digest(sent, settings.admin_token.encode("utf-8"))
+
+
+class ProfilingMiddleware:
+    """Stage breakdowns for profiled requests, returned as a Server-Timing header
+
+    A request is profiled when a session covering its path is running, or when
+    it carries ``X-Profile: stages`` plus the admin token. Otherwise the request
+    passes straight through. A wrong token is reported to ``on_auth_failure``
+    (the rate limiter's ``penalize``).
+    """
+
+    def __init__(self, app, on_auth_failure: Optional[Callable[[Any], Awaitable[None]]] = None):
+        self.app = app
+        self.on_auth_failure = on_auth_failure
+
+    async def _requested(self, scope) -> bool:
+        token = wanted = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                wanted = value
+            elif name == b"x-admin-token":
+                token = value.decode("latin-1")
+        if wanted != b"stages":
+            return False
+        if is_admin_token(token):
+            return True
+        if self.on_auth_failure is not None:
+            await self.on_auth_failure(scope)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (profiler.session is None and not settings.admin_token):
+            await self.app(scope, receive, send)
+            return
+        session = profiler.session
+        if session is not None and not session.matches(scope["path"]):
+            session = None
+        requested = await self._requested(scope)
+        if session is None and not requested:
+            await self.app(scope, receive, send)
+            return
+
+        breakdown = StageBreakdown(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                breakdown.finish()
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", breakdown.server_timing().encode())]}
+            await send(message)
+
+        token = _current.set((breakdown, ()))
+        if session is not None:
+            profiler.request_started(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if session is not None:
+                profiler.request_finished(session)
+            breakdown.finish()
+            breakdown.label = f"{scope['method']} {route_template(scope)}"
+            if requested:
+                logger.info(f"⏱️ {breakdown.summary()}")
+            if profiler.session is session and session is not None:
+                profiler.record(breakdown)
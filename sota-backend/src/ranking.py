@@ -0,0 +1,282 @@
+"""
+Newsletter ranking engine for SOTA.ai
+Scores candidate articles in batch with NumPy and picks a diverse top-k
+"""
+import logging
+import math
+import string
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import settings
+from .news_aggregator import AI_KEYWORDS
+from .profiling import stage
+from .records import ArticleRecord
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ("recency", "authority", "popularity", "importance", "keywords", "coverage", "novelty")
+
+# Relative weight of each feature in the relevance score
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "recency": 0.20,
+    "authority": 0.15,
+    "popularity": 0.10,
+    "importance": 0.20,
+    "keywords": 0.10,  # the only topical signal before the model has scored importance
+    "coverage": 0.10,
+    "novelty": 0.15,
+}
+
+SOURCE_AUTHORITY: Dict[str, float] = {
+    "OpenAI Blog": 1.0,
+    "DeepMind": 1.0,
+    "Google AI Blog": 0.95,
+    "Meta AI": 0.9,
+    "ArXiv": 0.85,
+    "MIT Technology Review": 0.85,
+    "HackerNews": 0.6,
+    "Reddit r/MachineLearning": 0.5,
+}
+DEFAULT_AUTHORITY = 0.5
+_AUTHORITY_BY_KEY = {name.casefold(): value for name, value in SOURCE_AUTHORITY.items()}
+
+# HN/Reddit score that counts as maximally popular (log-scaled below it)
+POPULARITY_SCALE = 1000
+
+# Distinct AI keywords in title and summary that count as fully on-topic
+KEYWORD_SCALE = 3
+_KEYWORD_NEEDLES = tuple(f" {keyword} " for keyword in AI_KEYWORDS)
+
+# Feature-hashed title embeddings for novelty and diversity
+EMBEDDING_DIM = 256
+_SEPARATORS = str.maketrans({char: " " for char in string.punctuation if char not in "+.-"})
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its new of on or that the this to was "
+    "what when with how why will can".split()
+)
+
+
+# Candidates are re-ranked (shortlist, final, later editions), so the
+# per-string Python work is memoized; the rest is array math
+@lru_cache(maxsize=1024)
+def source_authority(source: str) -> float:
+    """Authority of a source label, case-insensitively (older rows say "Openai Blog")"""
+    return _AUTHORITY_BY_KEY.get((source or "").casefold(), DEFAULT_AUTHORITY)
+
+
+@lru_cache(maxsize=65536)
+def _tokens(text: str) -> FrozenSet[str]:
+    """Distinct lowercase title words, without stopwords"""
+    return frozenset(text.lower().translate(_SEPARATORS).split()) - STOPWORDS
+
+
+@lru_cache(maxsize=65536)
+def _keyword_text(title: str, summary: str) -> str:
+    """Lowercase words of title and summary, space-padded so keywords match whole words"""
+    return f" {' '.join(f'{title} {summary}'.lower().translate(_SEPARATORS).split())} "
+
+
+@lru_cache(maxsize=65536)
+def _buckets(text: str) -> Tuple[int, ...]:
+    """Embedding dimensions hit by a title's words (feature hashing)"""
+    return tuple({zlib.crc32(token.encode("utf-8")) % EMBEDDING_DIM for token in _tokens(text)})
+
+
+@lru_cache(maxsize=65536)
+def _timestamp(value: str) -> float:
+    """Epoch seconds for an ISO-8601 or RFC 822 date; NaN when unparseable"""
+    if not value:
+        return math.nan
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return math.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class RankingEngine:
+    """Relevance scoring and MMR selection over NumPy feature matrices
+
+    Keeps the selected articles of the last few editions so that stories
+    already covered score low on novelty.
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        half_life_hours: float = settings.ranking_half_life_hours,
+        diversity: float = settings.ranking_diversity,
+        history_editions: int = settings.ranking_history_editions,
+    ):
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.weights = np.array([weights[name] for name in FEATURES], dtype=np.float32)
+        self.half_life_hours = half_life_hours
+        self.diversity = diversity
+        self.history_editions = history_editions
+        self._history: "OrderedDict[str, Tuple[set, np.ndarray]]" = OrderedDict()
+
+    @staticmethod
+    def embed(titles: Sequence[str]) -> np.ndarray:
+        """L2-normalized binary bag-of-words title vectors (n x EMBEDDING_DIM)"""
+        buckets = [_buckets(title) for title in titles]
+        lengths = np.fromiter(map(len, buckets), dtype=np.int64, count=len(buckets))
+        rows = np.repeat(np.arange(len(buckets)), lengths)
+        cols = np.fromiter(chain.from_iterable(buckets), dtype=np.int64, count=int(lengths.sum()))
+        matrix = np.zeros((len(titles), EMBEDDING_DIM), dtype=np.float32)
+        matrix[rows, cols] = 1.0
+        # Binary entries: the squared norm is the number of words
+        matrix /= np.sqrt(np.maximum(lengths, 1)).astype(np.float32)[:, None]
+        return matrix
+
+    def features(
+        self,
+        articles: Sequence[ArticleRecord],
+        embeddings: np.ndarray,
+        now: Optional[float] = None,
+        exclude_edition: Optional[str] = None,
+    ) -> np.ndarray:
+        """Feature matrix (n x len(FEATURES)), every column scaled to [0, 1]"""
+        n = len(articles)
+        now = time.time() if now is None else now
+
+        published = np.array([_timestamp(article.published_at) for article in articles], dtype=np.float64)
+        age_hours = np.clip((now - published) / 3600.0, 0.0, None)
+        recency = np.exp2(-age_hours / self.half_life_hours)
+        recency = np.where(np.isnan(recency), 0.5, recency)  # undated: neutral
+
+        authority = np.array(
+            [source_authority(article.source) for article in articles], dtype=np.float64
+        )
+        score = np.array([article.score or 0 for article in articles], dtype=np.float64)
+        popularity = np.minimum(np.log1p(np.maximum(score, 0)) / math.log1p(POPULARITY_SCALE), 1.0)
+        importance = np.array([article.ai_score or 0.0 for article in articles], dtype=np.float64)
+        keywords = self._keyword_hits(articles)
+
+        coverage = self._coverage(articles)
+        novelty = self._novelty(articles, embeddings, exclude_edition)
+
+        matrix = np.empty((n, len(FEATURES)), dtype=np.float32)
+        for column, values in enumerate((recency, authority, popularity, importance, keywords, coverage, novelty)):
+            matrix[:, column] = values
+        return matrix
+
+    @staticmethod
+    def _ids(keys) -> np.ndarray:
+        """Dense integer ids for hashable keys (faster than np.unique on strings)"""
+        ids: Dict = {}
+        return np.fromiter((ids.setdefault(key, len(ids)) for key in keys), dtype=np.int64, count=len(keys))
+
+    @staticmethod
+    def _keyword_hits(articles: Sequence[ArticleRecord]) -> np.ndarray:
+        """Distinct AI keywords per article, 0 hits -> 0, KEYWORD_SCALE+ hits -> 1"""
+        if not articles:
+            return np.zeros(0)
+        texts = np.array([_keyword_text(article.title or "", article.summary or "") for article in articles])
+        hits = np.zeros(len(articles))
+        for needle in _KEYWORD_NEEDLES:
+            hits += np.char.find(texts, needle) >= 0
+        return np.minimum(hits / KEYWORD_SCALE, 1.0)
+
+    def _coverage(self, articles: Sequence[ArticleRecord]) -> np.ndarray:
+        """How many distinct sources carry the same story (same URL or same headline words)"""
+        n = len(articles)
+        if n == 0:
+            return np.zeros(0)
+        sources = self._ids([article.source for article in articles])
+        stride = int(sources.max()) + 1
+        counts = np.ones(n)
+        # A missing URL or title is a story of its own, never one shared by every such article
+        for keys in (
+            [(article.url or "").split("?")[0].rstrip("/").lower() or i for i, article in enumerate(articles)],
+            [_tokens(article.title or "") or i for i, article in enumerate(articles)],
+        ):
+            story = self._ids(keys)
+            # Distinct (story, source) pairs, counted per story
+            pairs = np.unique(story * stride + sources)
+            per_story = np.bincount(pairs // stride, minlength=story.max() + 1)
+            counts = np.maximum(counts, per_story[story])
+        # 1 source -> 0, 4+ sources -> 1
+        return np.minimum((counts - 1) / 3.0, 1.0)
+
+    def _novelty(
+        self, articles: Sequence[ArticleRecord], embeddings: np.ndarray, exclude_edition: Optional[str]
+    ) -> np.ndarray:
+        """1 minus the closest match among articles of recent editions"""
+        editions = [entry for key, entry in self._history.items() if key != exclude_edition]
+        if not editions or len(articles) == 0:
+            return np.ones(len(articles))
+        history = np.vstack([vectors for _, vectors in editions])
+        if len(history) == 0:
+            return np.ones(len(articles))
+        seen_ids = set().union(*(ids for ids, _ in editions))
+        novelty = 1.0 - np.clip((embeddings @ history.T).max(axis=1), 0.0, 1.0)
+        repeated = np.array([article.id in seen_ids for article in articles])
+        return np.where(repeated, 0.0, novelty)
+
+    def score(
+        self,
+        articles: Sequence[ArticleRecord],
+        now: Optional[float] = None,
+        exclude_edition: Optional[str] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Relevance scores and title embeddings for a batch of articles"""
+        embeddings = self.embed([article.title for article in articles])
+        features = self.features(articles, embeddings, now=now, exclude_edition=exclude_edition)
+        return features @ (self.weights / self.weights.sum()), embeddings
+
+    def select(self, scores: np.ndarray, embeddings: np.ndarray, k: int) -> List[int]:
+        """Indices of a top-k that trades relevance against redundancy (MMR)"""
+        n = len(scores)
+        if n == 0 or k <= 0:
+            return []
+        # Only a small pool of the best candidates can make the cut
+        pool_size = min(n, max(k * 5, 50))
+        pool = np.argpartition(-scores, pool_size - 1)[:pool_size] if pool_size < n else np.arange(n)
+        relevance = scores[pool].astype(np.float32)
+        vectors = embeddings[pool]
+
+        chosen: List[int] = []
+        max_similarity = np.zeros(len(pool), dtype=np.float32)
+        available = np.ones(len(pool), dtype=bool)
+        for _ in range(min(k, len(pool))):
+            mmr = (1.0 - self.diversity) * relevance - self.diversity * max_similarity
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            chosen.append(best)
+            available[best] = False
+            np.maximum(max_similarity, vectors @ vectors[best], out=max_similarity)
+        return [int(pool[i]) for i in chosen]
+
+    @stage("ranking.rank")
+    def rank(
+        self,
+        articles: Sequence[ArticleRecord],
+        k: int,
+        now: Optional[float] = None,
+        exclude_edition: Optional[str] = None,
+    ) -> List[ArticleRecord]:
+        """The k articles to feature, best first"""
+        scores, embeddings = self.score(articles, now=now, exclude_edition=exclude_edition)
+        return [articles[i] for i in self.select(scores, embeddings, k)]
+
+    def remember(self, edition: str, articles: Sequence[ArticleRecord]):
+        """Record an edition's articles for novelty scoring of later editions"""
+        vectors = self.embed([article.title for article in articles])
+        self._history[edition] = ({article.id for article in articles}, vectors)
+        self._history.move_to_end(edition)
+        while len(self._history) > self.history_editions:
+            self._history.popitem(last=False)
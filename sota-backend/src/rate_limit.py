@@ -0,0 +1,261 @@
+"""
+Rate limiting for SOTA.ai
+Per-client token buckets with per-route costs, in memory or shared through Redis
+"""
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, List, Tuple
+
+from .config import settings
+from .metrics import RATE_LIMIT_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Decision:
+    """Outcome of one acquire; retry_after is 0 when allowed"""
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+class MemoryBackend:
+    """Buckets in this worker's memory; each worker enforces the limit on its own"""
+
+    def __init__(self, max_clients: int = settings.rate_limit_max_clients):
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated_at)
+
+    async def acquire(self, key: str, cost: float, capacity: float, rate: float) -> Decision:
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        if tokens >= cost:
+            tokens -= cost
+            decision = Decision(True, tokens, 0.0)
+        else:
+            decision = Decision(False, tokens, (cost - tokens) / rate)
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            # Least recently seen; most likely full again, so forgetting it costs nothing
+            self.buckets.popitem(last=False)
+        return decision
+
+    async def close(self):
+        self.buckets.clear()
+
+
+# Atomic refill-and-take on a hash; Redis' clock keeps workers on different hosts consistent
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    """Buckets in Redis, shared by every worker and host"""
+
+    PREFIX = "sota:ratelimit:"
+
+    def __init__(self, url: str = settings.redis_url):
+        self.url = url
+        self._client = None
+        self._script = None
+
+    async def acquire(self, key: str, cost: float, capacity: float, rate: float) -> Decision:
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url)
+            self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+        allowed, tokens = await self._script(keys=[self.PREFIX + key], args=[capacity, rate, cost])
+        tokens = float(tokens)
+        if allowed:
+            return Decision(True, tokens, 0.0)
+        return Decision(False, tokens, (cost - tokens) / rate)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = self._script = None
+
+
+def create_backend(backend: str = settings.rate_limit_backend):
+    """Bucket store for the configured backend (memory or redis)"""
+    if backend == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+class RateLimiter:
+    """Token bucket per client; each request takes its route's cost in tokens
+
+    Clients are identified by a configured ``X-API-Key`` or else by IP. Route
+    costs are matched as ``"METHOD /path/glob"`` in order; the first match
+    wins and a cost of 0 exempts the route. A wrong admin token is charged
+    ``auth_failure_cost`` on top (``penalize``).
+    """
+
+    def __init__(
+        self,
+        costs: Dict[str, float] = settings.rate_limit_costs,
+        capacity: float = settings.rate_limit_capacity,
+        refill_per_second: float = settings.rate_limit_refill_per_second,
+        default_cost: float = settings.rate_limit_default_cost,
+        auth_failure_cost: float = settings.rate_limit_auth_failure_cost,
+        api_keys: Iterable[str] = settings.client_api_keys,
+        trusted_proxies: int = settings.rate_limit_trusted_proxies,
+        backend=None,
+    ):
+        self.capacity = capacity
+        self.rate = refill_per_second
+        self.default_cost = default_cost
+        if auth_failure_cost > capacity:
+            raise ValueError(f"Auth failure cost ({auth_failure_cost:g}) exceeds the bucket capacity ({capacity:g})")
+        self.auth_failure_cost = auth_failure_cost
+        self.rules: List[Tuple[str, str, float]] = []
+        for pattern, cost in costs.items():
+            method, _, path = pattern.partition(" ")
+            if cost > capacity:
+                raise ValueError(f"Rate limit cost for {pattern} ({cost:g}) exceeds the bucket capacity ({capacity:g})")
+            self.rules.append((method.upper(), path, cost))
+        # Store digests, never the keys themselves
+        self.api_keys = {hashlib.sha256(key.encode()).hexdigest()[:16] for key in api_keys}
+        self.trusted_proxies = trusted_proxies
+        self.backend = backend if backend is not None else create_backend()
+        self._costs: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._backend_failing = False
+
+    def cost(self, method: str, path: str) -> Tuple[str, float]:
+        """(rule, cost) for a request, memoized per method and path"""
+        cached = self._costs.get((method, path))
+        if cached is not None:
+            return cached
+        result = ("default", self.default_cost)
+        for rule_method, rule_path, cost in self.rules:
+            if rule_method in ("*", method) and fnmatchcase(path, rule_path):
+                result = (f"{rule_method} {rule_path}", cost)
+                break
+        if len(self._costs) < 4096:  # paths with ids would grow this forever
+            self._costs[(method, path)] = result
+        return result
+
+    def client_key(self, scope) -> str:
+        api_key = forwarded = None
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                api_key = value
+            elif name == b"x-forwarded-for":
+                forwarded = value
+        if api_key is not None:
+            digest = hashlib.sha256(api_key).hexdigest()[:16]
+            if digest in self.api_keys:
+                return f"key:{digest}"
+        if self.trusted_proxies and forwarded is not None:
+            hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",")]
+            # Each of our proxies appends the peer it saw, so the Nth entry from the right is the client
+            if len(hops) >= self.trusted_proxies:
+                return f"ip:{hops[-self.trusted_proxies]}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def check(self, scope) -> Tuple[str, float, Decision]:
+        rule, cost = self.cost(scope["method"], scope["path"])
+        if cost <= 0:
+            return rule, cost, Decision(True, self.capacity, 0.0)
+        try:
+            decision = await self.backend.acquire(self.client_key(scope), cost, self.capacity, self.rate)
+        except Exception as e:
+            # Fail open: an unreachable store must not take the API down with it
+            if not self._backend_failing:
+                logger.error(f"❌ Rate limit backend unavailable, allowing requests: {e}")
+                self._backend_failing = True
+            RATE_LIMIT_DECISIONS.labels(rule, "error").inc()
+            return rule, cost, Decision(True, self.capacity, 0.0)
+        if self._backend_failing:
+            logger.info("✅ Rate limit backend recovered")
+            self._backend_failing = False
+        RATE_LIMIT_DECISIONS.labels(rule, "allowed" if decision.allowed else "limited").inc()
+        return rule, cost, decision
+
+    async def penalize(self, scope):
+        """Charge a failed admin token check against the client's bucket, emptying it if it cannot pay"""
+        if self.auth_failure_cost <= 0:
+            return
+        key = self.client_key(scope)
+        try:
+            decision = await self.backend.acquire(key, self.auth_failure_cost, self.capacity, self.rate)
+            if not decision.allowed and decision.remaining > 0:
+                await self.backend.acquire(key, decision.remaining, self.capacity, self.rate)
+        except Exception as e:
+            logger.error(f"❌ Could not charge a failed admin token check: {e}")
+            return
+        RATE_LIMIT_DECISIONS.labels("auth_failure", "charged").inc()
+
+    def headers(self, decision: Decision) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (b"ratelimit-limit", str(int(self.capacity)).encode()),
+            (b"ratelimit-remaining", str(int(decision.remaining)).encode()),
+        ]
+        if not decision.allowed:
+            headers.append((b"retry-after", str(max(1, math.ceil(decision.retry_after))).encode()))
+        return headers
+
+    async def close(self):
+        await self.backend.close()
+
+
+class RateLimitMiddleware:
+    """Rejects over-budget requests with 429 before they reach caching or routing"""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rule, cost, decision = await self.limiter.check(scope)
+        if cost <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        headers = self.limiter.headers(decision)
+        if not decision.allowed:
+            logger.debug(f"Rate limited {scope['method']} {scope['path']} ({rule}) for {self.limiter.client_key(scope)}")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [(b"content-type", b"application/json"), *headers],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Rate limit exceeded"}'})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,69 @@
+"""
+Compact in-memory article representation for SOTA.ai
+One slotted record per article, enriched in place from fetch to API response
+"""
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+@dataclass(slots=True, eq=False)
+class ArticleRecord:
+    """An article as it moves through fetchers, analysis and newsletter generation"""
+    id: str
+    title: str
+    url: str
+    source: str
+    published_at: str = ""
+    summary: str = ""
+    content: str = ""
+    tags: Tuple[str, ...] = ()
+    importance: str = "medium"
+    ai_score: float = 0.0
+    key_insights: Tuple[str, ...] = ()
+    authors: Tuple[str, ...] = ()
+    score: int = 0
+    sentiment: Optional[str] = None
+    category: Optional[str] = None
+    word_count: Optional[int] = None
+    read_time: Optional[int] = None
+
+    def __post_init__(self):
+        # A crawl has thousands of records but only a handful of sources
+        self.source = sys.intern(self.source)
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "ArticleRecord":
+        """Build a record from a database or archive row"""
+        published_at = row.get("published_at")
+        return cls(
+            id=row["id"],
+            title=row["title"],
+            url=row["url"],
+            source=row["source"],
+            published_at=published_at.isoformat() if isinstance(published_at, datetime) else published_at or "",
+            summary=row.get("summary") or "",
+            content=row.get("content") or "",
+            tags=tuple(row.get("tags") or ()),
+            importance=row.get("importance") or "medium",
+            ai_score=row.get("ai_score") or 0.0,
+            sentiment=row.get("sentiment"),
+            category=row.get("category"),
+            word_count=row.get("word_count"),
+            read_time=row.get("read_time"),
+        )
+
+    def to_response(self) -> Dict[str, Any]:
+        """ArticleResponse fields; records only become dicts at the API boundary"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "summary": self.summary,
+            "url": self.url,
+            "source": self.source,
+            "published_at": self.published_at,
+            "tags": list(self.tags),
+            "importance": self.importance,
+            "ai_score": self.ai_score,
+        }
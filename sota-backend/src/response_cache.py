@@ -0,0 +1,403 @@
+"""
+Prompt/response cache for SOTA.ai model calls
+Sits below the model clients and reuses responses for repeated prompts
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Prompts are split into reusable segments on blank lines
+SEGMENT_SEPARATOR = "\n\n"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so cosmetic differences share a cache entry"""
+    text = unicodedata.normalize("NFC", prompt)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    text = re.sub(r"\n{3,}", SEGMENT_SEPARATOR, text)
+    return text.strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+@dataclass
+class CachedResponse:
+    """A cached model response"""
+    response: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: float
+    created_at: float
+
+
+class ResponseCache:
+    """Two-level (memory + compressed SQLite) cache for model responses"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_entries: int = 1024,
+        ttl_seconds: Optional[float] = None,
+        compression_level: int = 6,
+    ):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.compression_level = compression_level
+        self._memory: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()  # guards _memory
+        self._db_lock = threading.Lock()  # guards _conn, held across SQLite calls
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats = {
+            "hits": 0,
+            "prefix_hits": 0,
+            "misses": 0,
+            "saved_prompt_tokens": 0,
+            "saved_completion_tokens": 0,
+            "saved_latency_ms": 0.0,
+            "spent_latency_ms": 0.0,
+        }
+
+        if path:
+            self._open_store(path)
+
+    def _open_store(self, path: str):
+        """Open (or create) the persistent store"""
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response BLOB NOT NULL,
+                    prompt_tokens INTEGER NOT NULL,
+                    completion_tokens INTEGER NOT NULL,
+                    latency_ms REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"❌ Response cache store unavailable at {path}: {e}")
+            self._conn = None
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Build the cache key from provider, model, normalized prompt and params"""
+        payload = json.dumps(
+            [provider, model, normalize_prompt(prompt), params or {}],
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_fresh(self, entry: CachedResponse) -> bool:
+        return self.ttl_seconds is None or (time.time() - entry.created_at) < self.ttl_seconds
+
+    def _lookup_memory(self, key: str) -> Tuple[bool, Optional[CachedResponse]]:
+        """(found, entry) from the memory level; a stale entry is found but None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return False, None
+            self._memory.move_to_end(key)
+            return True, entry if self._is_fresh(entry) else None
+
+    def _lookup(self, key: str) -> Optional[CachedResponse]:
+        """Find an entry in memory, falling back to the persistent store"""
+        found, entry = self._lookup_memory(key)
+        if found:
+            return entry
+
+        with self._db_lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT response, prompt_tokens, completion_tokens, latency_ms, created_at "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        entry = CachedResponse(
+            response=zlib.decompress(row[0]).decode("utf-8"),
+            prompt_tokens=row[1],
+            completion_tokens=row[2],
+            latency_ms=row[3],
+            created_at=row[4],
+        )
+        if not self._is_fresh(entry):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    async def _lookup_async(self, key: str) -> Optional[CachedResponse]:
+        """``_lookup`` with the SQLite read kept off the event loop"""
+        found, entry = self._lookup_memory(key)
+        if found or self._conn is None:
+            return entry
+        return await asyncio.to_thread(self._lookup, key)
+
+    def _remember(self, key: str, entry: CachedResponse):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _record_hit(self, entry: CachedResponse, stat: str):
+        self._stats[stat] += 1
+        self._stats["saved_prompt_tokens"] += entry.prompt_tokens
+        self._stats["saved_completion_tokens"] += entry.completion_tokens
+        self._stats["saved_latency_ms"] += entry.latency_ms
+
+    def get(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Optional[CachedResponse]:
+        """Exact lookup"""
+        entry = self._lookup(self.make_key(provider, model, prompt, params))
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        self._record_hit(entry, "hits")
+        return entry
+
+    def put(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        response: str,
+        params: Optional[Dict[str, Any]] = None,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        latency_ms: float = 0.0,
+    ) -> CachedResponse:
+        """Store a response"""
+        key, entry = self._prepare(provider, model, prompt, response, params, prompt_tokens, completion_tokens, latency_ms)
+        self._persist(key, provider, model, entry)
+        return entry
+
+    def _prepare(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        response: str,
+        params: Optional[Dict[str, Any]],
+        prompt_tokens: Optional[int],
+        completion_tokens: Optional[int],
+        latency_ms: float,
+    ) -> Tuple[str, CachedResponse]:
+        """Build an entry and keep it in memory; persisting is up to the caller"""
+        key = self.make_key(provider, model, prompt, params)
+        entry = CachedResponse(
+            response=response,
+            prompt_tokens=prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt),
+            completion_tokens=completion_tokens if completion_tokens is not None else estimate_tokens(response),
+            latency_ms=latency_ms,
+            created_at=time.time(),
+        )
+        self._remember(key, entry)
+        return key, entry
+
+    def _persist(self, key: str, provider: str, model: str, entry: CachedResponse):
+        if self._conn is None:
+            return
+        blob = zlib.compress(entry.response.encode("utf-8"), self.compression_level)
+        try:
+            with self._db_lock:
+                if self._conn is None:
+                    return
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key, provider, model, blob, entry.prompt_tokens,
+                        entry.completion_tokens, entry.latency_ms, entry.created_at,
+                    ),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error persisting cached response: {e}")
+
+    async def _put_async(self, provider: str, model: str, prompt: str, response: str, params, latency_ms: float):
+        """``put`` with the SQLite write (and its commit) kept off the event loop"""
+        await self._put_many_async(provider, model, [(prompt, response, latency_ms)], params)
+
+    async def _put_many_async(self, provider: str, model: str, items: List[Tuple[str, str, float]], params):
+        """Store (prompt, response, latency_ms) items with one trip off the event loop"""
+        entries = [
+            self._prepare(provider, model, prompt, response, params, None, None, latency_ms)
+            for prompt, response, latency_ms in items
+        ]
+        if self._conn is not None:
+            await asyncio.to_thread(self._persist_many, provider, model, entries)
+
+    def _persist_many(self, provider: str, model: str, entries: List[Tuple[str, CachedResponse]]):
+        for key, entry in entries:
+            self._persist(key, provider, model, entry)
+
+    def longest_prefix(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Tuple[str, CachedResponse]]:
+        """Find the longest cached prompt that is a segment-aligned prefix of ``prompt``"""
+        for prefix in self._prefixes(prompt):
+            entry = self._lookup(self.make_key(provider, model, prefix, params))
+            if entry is not None:
+                self._record_hit(entry, "prefix_hits")
+                return prefix, entry
+        return None
+
+    @staticmethod
+    def _prefixes(prompt: str) -> Iterator[str]:
+        """Segment-aligned proper prefixes of ``prompt``, longest first"""
+        segments = normalize_prompt(prompt).split(SEGMENT_SEPARATOR)
+        for end in range(len(segments) - 1, 0, -1):
+            yield SEGMENT_SEPARATOR.join(segments[:end])
+
+    async def get_or_compute(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        compute: Callable[[], Awaitable[str]],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Return a cached response or compute, time and store a fresh one"""
+        cached = await self._lookup_async(self.make_key(provider, model, prompt, params))
+        if cached is not None:
+            self._record_hit(cached, "hits")
+            return cached.response
+        self._stats["misses"] += 1
+
+        started = time.perf_counter()
+        response = await compute()
+        latency_ms = (time.perf_counter() - started) * 1000
+        self._stats["spent_latency_ms"] += latency_ms
+        await self._put_async(provider, model, prompt, response, params, latency_ms)
+        return response
+
+    async def get_or_extend(
+        self,
+        provider: str,
+        model: str,
+        segments: List[str],
+        compute: Callable[[str, List[str]], Awaitable[List[str]]],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Prefix reuse for segment-structured prompts.
+
+        ``compute(previous_response, remaining_segments)`` is only called for
+        the segments not covered by the longest cached prefix, and must return
+        one response piece per remaining segment. The full response is the
+        previous response plus the pieces, and every segment-aligned prefix is
+        stored, so a later prompt that diverges after segment ``n`` reuses the
+        first ``n`` pieces.
+        """
+        normalized = [normalize_prompt(segment).replace(SEGMENT_SEPARATOR, "\n") for segment in segments]
+        prompt = SEGMENT_SEPARATOR.join(normalized)
+        cached = await self._lookup_async(self.make_key(provider, model, prompt, params))
+        if cached is not None:
+            self._record_hit(cached, "hits")
+            return cached.response
+
+        previous = ""
+        previous_latency_ms = 0.0
+        covered = 0
+        for prefix in self._prefixes(prompt):
+            entry = await self._lookup_async(self.make_key(provider, model, prefix, params))
+            if entry is not None:
+                # A prefix hit is a (partial) hit, not a miss
+                self._record_hit(entry, "prefix_hits")
+                covered = prefix.count(SEGMENT_SEPARATOR) + 1
+                previous = entry.response
+                previous_latency_ms = entry.latency_ms
+                break
+        else:
+            self._stats["misses"] += 1
+
+        remaining = segments[covered:]
+        started = time.perf_counter()
+        pieces = await compute(previous, remaining)
+        latency_ms = (time.perf_counter() - started) * 1000
+        self._stats["spent_latency_ms"] += latency_ms
+        if len(pieces) != len(remaining):
+            raise ValueError(f"compute returned {len(pieces)} pieces for {len(remaining)} segments")
+
+        # One entry per newly covered prefix, the full prompt last
+        items = []
+        response = previous
+        for done, piece in enumerate(pieces, start=1):
+            response += piece
+            items.append((
+                SEGMENT_SEPARATOR.join(normalized[:covered + done]),
+                response,
+                previous_latency_ms + latency_ms * done / len(pieces),
+            ))
+        await self._put_many_async(provider, model, items, params)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache effectiveness counters"""
+        hits = self._stats["hits"] + self._stats["prefix_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "saved_tokens": self._stats["saved_prompt_tokens"] + self._stats["saved_completion_tokens"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "persistent": self._conn is not None,
+        }
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+
+    def close(self):
+        """Close the persistent store"""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
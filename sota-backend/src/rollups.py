@@ -0,0 +1,224 @@
+"""
+Pre-aggregated platform statistics for SOTA.ai
+Counters are maintained incrementally and reconciled against the source tables
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from .config import settings
+from .database import AnalyticsRollup, Article, Newsletter, Subscriber, analytics_engine, replica_router
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("minute", "hour", "day")
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its bucket"""
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+class StatsRollup:
+    """Incremental counters, bucketed event aggregates and a cached stats snapshot"""
+
+    def __init__(
+        self,
+        sources_monitored: int = 0,
+        reconcile_interval: float = settings.stats_reconcile_interval,
+        flush_interval: float = settings.stats_rollup_flush_interval,
+    ):
+        self.sources_monitored = sources_monitored
+        self.reconcile_interval = reconcile_interval
+        self.flush_interval = flush_interval
+
+        self.total_articles = 0
+        self.articles_by_day: Dict[str, int] = defaultdict(int)
+        self.newsletters_generated = 0
+        self.active_subscribers = 0
+        self.last_reconciled: Optional[datetime] = None
+
+        # (granularity, bucket_start, event_type) -> count not yet materialized
+        self.pending_buckets: Dict[Tuple[str, datetime, str], int] = defaultdict(int)
+
+        self._snapshot: Dict[str, Any] = {}
+        self._snapshot_day: Optional[str] = None
+        self._dirty = True
+        self._tasks: List[asyncio.Task] = []
+
+    # Incremental updates -------------------------------------------------
+
+    def record_articles(self, count: int = 1, when: Optional[datetime] = None):
+        """Rows added to the articles table, the count ``reconcile`` resets from"""
+        day = (when or datetime.utcnow()).strftime("%Y-%m-%d")
+        self.total_articles += count
+        self.articles_by_day[day] += count
+        self._dirty = True
+
+    def record_newsletter(self, count: int = 1):
+        """A newsletter row was stored; regenerating a date's newsletter is not a new one"""
+        self.newsletters_generated += count
+        self._dirty = True
+
+    def record_subscriber(self, delta: int = 1):
+        """A subscriber was activated (+1) or deactivated (-1)"""
+        self.active_subscribers = max(0, self.active_subscribers + delta)
+        self._dirty = True
+
+    def record_events(self, events: Iterable[Tuple[str, datetime]]):
+        """Add (event_type, timestamp) pairs to every time bucket"""
+        pending = self.pending_buckets
+        for event_type, timestamp in events:
+            for granularity in GRANULARITIES:
+                pending[(granularity, bucket_start(timestamp, granularity), event_type)] += 1
+
+    # Snapshot ------------------------------------------------------------
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Current statistics; rebuilt only when a counter changed"""
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        if self._dirty or self._snapshot_day != today:
+            self._snapshot_day = today
+            self._snapshot = {
+                "articles_processed_today": self.articles_by_day.get(today, 0),
+                "total_articles": self.total_articles,
+                "sources_monitored": self.sources_monitored,
+                "ai_accuracy_score": 98.7,
+                "newsletters_generated": self.newsletters_generated,
+                "active_subscribers": self.active_subscribers,
+                "last_updated": datetime.utcnow().isoformat(),
+                "last_reconciled": self.last_reconciled.isoformat() if self.last_reconciled else None,
+            }
+            self._dirty = False
+        return self._snapshot
+
+    # Background maintenance ----------------------------------------------
+
+    async def start(self):
+        """Reconcile once, then keep counters and buckets maintained"""
+        await self.reconcile()
+        self._tasks = [
+            asyncio.create_task(self._periodic(self.reconcile, self.reconcile_interval)),
+            asyncio.create_task(self._periodic(self.flush_buckets, self.flush_interval)),
+        ]
+        logger.info("📈 Stats rollups started")
+
+    async def stop(self):
+        """Stop background work and materialize pending buckets"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush_buckets()
+
+    async def _periodic(self, job, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"Stats rollup job {job.__name__} failed: {e}")
+
+    async def reconcile(self):
+        """Reset counters from the source tables"""
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        try:
+            # The source tables live on the primary (or its replicas), which
+            # the analytics database need not be
+            async with replica_router.read_engine().connect() as conn:
+                total_articles = await conn.scalar(select(func.count()).select_from(Article))
+                articles_today = await conn.scalar(
+                    select(func.count()).select_from(Article).where(Article.created_at >= today)
+                )
+                newsletters = await conn.scalar(select(func.count()).select_from(Newsletter))
+                subscribers = await conn.scalar(
+                    select(func.count()).select_from(Subscriber).where(Subscriber.is_active.is_(True))
+                )
+        except Exception as e:
+            logger.error(f"Stats reconciliation failed: {e}")
+            return
+
+        self.total_articles = total_articles or 0
+        self.articles_by_day = defaultdict(int, {today.strftime("%Y-%m-%d"): articles_today or 0})
+        self.newsletters_generated = newsletters or 0
+        self.active_subscribers = subscribers or 0
+        self.last_reconciled = datetime.utcnow()
+        self._dirty = True
+
+    async def flush_buckets(self):
+        """Materialize pending bucket counts with an additive upsert"""
+        if not self.pending_buckets:
+            return
+        pending, self.pending_buckets = self.pending_buckets, defaultdict(int)
+        rows = [
+            {"granularity": g, "bucket_start": start, "event_type": event_type, "count": count}
+            for (g, start, event_type), count in pending.items()
+        ]
+
+        try:
+            async with analytics_engine.begin() as conn:
+                await conn.execute(self._upsert(conn.dialect.name), rows)
+        except Exception as e:
+            logger.error(f"Stats bucket flush failed, will retry: {e}")
+            for key, count in pending.items():
+                self.pending_buckets[key] += count
+
+    @staticmethod
+    def _upsert(dialect_name: str):
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        stmt = insert(AnalyticsRollup.__table__)
+        return stmt.on_conflict_do_update(
+            index_elements=["granularity", "bucket_start", "event_type"],
+            set_={
+                "count": AnalyticsRollup.__table__.c.count + stmt.excluded.count,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+
+    async def get_event_series(
+        self,
+        granularity: str = "hour",
+        event_type: Optional[str] = None,
+        since: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """Bucketed event counts, including buckets not yet materialized"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        since = since or datetime.utcnow() - timedelta(days=1)
+
+        query = select(
+            AnalyticsRollup.bucket_start, AnalyticsRollup.event_type, AnalyticsRollup.count
+        ).where(
+            AnalyticsRollup.granularity == granularity,
+            AnalyticsRollup.bucket_start >= bucket_start(since, granularity),
+        )
+        if event_type:
+            query = query.where(AnalyticsRollup.event_type == event_type)
+
+        totals: Dict[Tuple[datetime, str], int] = defaultdict(int)
+        async with analytics_engine.connect() as conn:
+            for start, etype, count in await conn.execute(query):
+                totals[(start, etype)] += count
+
+        for (g, start, etype), count in self.pending_buckets.items():
+            if g == granularity and start >= bucket_start(since, granularity) and (not event_type or etype == event_type):
+                totals[(start, etype)] += count
+
+        return [
+            {"bucket_start": start.isoformat(), "event_type": etype, "count": count}
+            for (start, etype), count in sorted(totals.items())
+        ]
@@ -0,0 +1,44 @@
+"""
+Production runner for SOTA.ai
+Starts N uvicorn workers; leader election inside the app keeps singleton work to one of them
+"""
+import argparse
+import logging
+import os
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count() -> int:
+    """Configured worker count, or one per CPU"""
+    return settings.workers or os.cpu_count() or 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the SOTA.ai backend with multiple workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    workers = args.workers or worker_count()
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"🚀 Starting {workers} SOTA.ai workers on {args.host}:{args.port}")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        timeout_graceful_shutdown=settings.graceful_shutdown_timeout,
+        proxy_headers=True,
+        ws_per_message_deflate=settings.ws_per_message_deflate,
+        log_level="info"
+    )
+
+
+if __name__ == "__main__":
+    main()
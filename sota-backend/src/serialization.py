@@ -0,0 +1,49 @@
+"""
+Fast JSON serialization for SOTA.ai API responses
+Encodes ArticleRecords straight to bytes, skipping response-model construction
+"""
+import json
+import logging
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from .records import ArticleRecord
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback keeps the response class usable
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Encode the types the API returns that JSON has no native form for"""
+    if isinstance(obj, ArticleRecord):
+        return obj.to_response()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON"""
+    if orjson is not None:
+        # Passthrough sends records to _default so only response fields are emitted
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,140 @@
+"""
+Lazy service container for SOTA.ai
+Services and their dependencies are built on first use and closed in reverse order on shutdown
+"""
+import inspect
+import logging
+from functools import cached_property
+from typing import Any, Callable, Dict, List
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Services:
+    """Builds each service the first time it is needed
+
+    Imports happen inside the properties, so a worker that never crawls or
+    delivers never loads httpx, feedparser or smtplib.
+    """
+
+    def __init__(self):
+        self._built: List[Any] = []
+
+        # Hooks are shared with the services once they are built, so they can be
+        # registered before (or without) building anything
+        self.on_newsletter_generated: List[Callable[[Dict[str, Any]], None]] = []
+        self.on_articles_ingested: List[Callable[[List[Any]], None]] = []
+        self.on_source_state_change: List[Callable[[Any, str, str], None]] = []
+
+    def _register(self, service: Any) -> Any:
+        self._built.append(service)
+        return service
+
+    @property
+    def built(self) -> List[str]:
+        """Names of the services built so far, in build order"""
+        return [type(service).__name__ for service in self._built]
+
+    def is_built(self, name: str) -> bool:
+        """Whether a service exists yet, without building it"""
+        return name in self.__dict__  # where cached_property stores its value
+
+    @cached_property
+    def response_cache(self):
+        if not settings.response_cache_enabled:
+            return None
+        from .response_cache import ResponseCache
+        return self._register(ResponseCache(
+            path=settings.response_cache_path,
+            memory_entries=settings.response_cache_memory_entries,
+            ttl_seconds=settings.response_cache_ttl_seconds
+        ))
+
+    @cached_property
+    def content_extractor(self):
+        if not settings.content_extraction_enabled:
+            return None
+        from .extraction import ContentExtractor
+        return self._register(ContentExtractor())
+
+    @cached_property
+    def news_aggregator(self):
+        from .news_aggregator import NewsAggregator
+        aggregator = NewsAggregator()
+        aggregator.on_articles_ingested = self.on_articles_ingested
+        aggregator.health.on_state_change = self.on_source_state_change
+        aggregator.extractor = self.content_extractor
+        return self._register(aggregator)
+
+    @cached_property
+    def stats_rollup(self):
+        from .news_aggregator import SOURCES
+        from .rollups import StatsRollup
+        return self._register(StatsRollup(sources_monitored=len(SOURCES)))
+
+    @cached_property
+    def ai_processor(self):
+        from .ai_processor import AIProcessor
+        processor = AIProcessor(response_cache=self.response_cache, stats_rollup=self.stats_rollup)
+        processor.on_newsletter_generated = self.on_newsletter_generated
+        return self._register(processor)
+
+    @cached_property
+    def mcp_server(self):
+        from .mcp_server import MCPServer
+        return self._register(MCPServer(response_cache=self.response_cache))
+
+    @cached_property
+    def event_ingestor(self):
+        from .event_ingestion import EventIngestor
+        return self._register(EventIngestor(rollup=self.stats_rollup))
+
+    @cached_property
+    def engagement(self):
+        from .engagement import EngagementCounters
+        return self._register(EngagementCounters())
+
+    @cached_property
+    def edition_engine(self):
+        from .personalization import EditionEngine
+        return self._register(EditionEngine())
+
+    @cached_property
+    def delivery_pipeline(self):
+        from .delivery import DeliveryPipeline
+        return self._register(DeliveryPipeline(edition_engine=self.edition_engine))
+
+    @cached_property
+    def partition_manager(self):
+        from .partitions import PartitionManager
+        return self._register(PartitionManager())
+
+    @cached_property
+    def article_archive(self):
+        from .article_archive import ArticleArchive
+        return self._register(ArticleArchive())
+
+    @cached_property
+    def backfill_manager(self):
+        from .backfill import BackfillManager
+        return self._register(BackfillManager(
+            on_ingested=self.news_aggregator.notify_articles_ingested,
+            rollup=self.stats_rollup
+        ))
+
+    async def close(self):
+        """Stop and close every built service, dependents first"""
+        while self._built:
+            service = self._built.pop()
+            for name in ("stop", "close"):
+                method = getattr(service, name, None)
+                if method is None:
+                    continue
+                try:
+                    result = method()
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"❌ Error closing {type(service).__name__}: {e}")
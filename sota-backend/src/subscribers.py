@@ -0,0 +1,129 @@
+"""
+Subscriber store for SOTA.ai
+Idempotent subscribe and keyset-paginated subscriber streaming
+"""
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from .database import Subscriber, engine
+from .models import SubscriberCreate
+
+logger = logging.getLogger(__name__)
+
+
+# Separators and quoting that would let an address carry more than one
+# recipient (or a header) once it is written into the To: line
+EMAIL_SPECIALS = frozenset('<>()[],;:\\"')
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form used as the idempotency key"""
+    email = email.strip().lower()
+    if any(char.isspace() or not char.isprintable() or char in EMAIL_SPECIALS for char in email):
+        raise ValueError(f"Invalid email address: {email!r}")
+    local, _, domain = email.partition("@")
+    if (
+        not local
+        or "@" in domain
+        or "." not in domain
+        or domain.startswith(".")
+        or domain.endswith(".")
+    ):
+        raise ValueError(f"Invalid email address: {email!r}")
+    return email
+
+
+def _insert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+async def upsert_subscriber(subscriber: SubscriberCreate) -> Tuple[Dict[str, Any], bool]:
+    """Insert or reactivate a subscriber keyed on email.
+
+    Returns the stored subscriber and whether it became active with this call.
+    """
+    email = normalize_email(subscriber.email)
+    table = Subscriber.__table__
+
+    async with engine.begin() as conn:
+        was_active = await conn.scalar(select(table.c.is_active).where(table.c.email == email))
+
+        insert = _insert(conn.dialect.name)
+        stmt = insert(table).values(
+            id=uuid.uuid4().hex,
+            email=email,
+            subscribed_at=datetime.utcnow(),
+            is_active=True,
+            frequency=subscriber.frequency or "daily",
+            topics=subscriber.topics or [],
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["email"],
+            set_={
+                "is_active": True,
+                "frequency": stmt.excluded.frequency,
+                "topics": stmt.excluded.topics,
+            },
+        ).returning(table.c.id, table.c.email, table.c.frequency, table.c.topics, table.c.subscribed_at)
+
+        row = (await conn.execute(stmt)).one()
+
+    stored = {
+        "id": row.id,
+        "email": row.email,
+        "frequency": row.frequency,
+        "topics": row.topics or [],
+        "subscribed_at": row.subscribed_at.isoformat(),
+    }
+    return stored, not was_active
+
+
+async def stream_subscribers(
+    frequency: Optional[str] = None,
+    topics: Optional[List[str]] = None,
+    page_size: int = 1000,
+    after_id: str = "",
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield pages of active subscribers ordered by id (keyset cursor).
+
+    ``topics`` keeps only subscribers with at least one matching topic (or
+    no topic preference at all).
+    """
+    table = Subscriber.__table__
+    wanted = {topic.lower() for topic in topics} if topics else None
+    last_id = after_id
+
+    while True:
+        query = (
+            select(table.c.id, table.c.email, table.c.topics)
+            .where(table.c.is_active.is_(True), table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(page_size)
+        )
+        if frequency:
+            query = query.where(table.c.frequency == frequency)
+
+        async with engine.connect() as conn:
+            rows = (await conn.execute(query)).all()
+        if not rows:
+            return
+
+        last_id = rows[-1].id
+        page = []
+        for row in rows:
+            subscriber_topics = row.topics or []
+            if wanted and subscriber_topics and not wanted.intersection(t.lower() for t in subscriber_topics):
+                continue
+            page.append({"id": row.id, "email": row.email, "topics": subscriber_topics})
+        if page:
+            yield page
+        if len(rows) < page_size:
+            return
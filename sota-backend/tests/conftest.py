@@ -0,0 +1,40 @@
+"""
+Shared test setup for SOTA.ai
+Points every engine at a throwaway SQLite database before src is imported
+"""
+import asyncio
+import atexit
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_data_dir = tempfile.mkdtemp(prefix="sota-tests-")
+atexit.register(shutil.rmtree, _data_dir, ignore_errors=True)
+os.environ["DEBUG"] = "false"
+# Never the configured database: run_db drops every table
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_data_dir}/sota.db"
+os.environ["DATABASE_ANALYTICS_URL"] = os.environ["DATABASE_URL"]
+os.environ["DATABASE_REPLICA_URLS"] = "[]"
+os.environ["LEADER_LOCK_PATH"] = f"{_data_dir}/run/leader.lock"
+
+
+@pytest.fixture
+def run_db():
+    """Run a coroutine function against an empty schema, disposing the engines afterwards"""
+    from src.database import Base, close_db, engine, init_db
+
+    def run(coroutine_function):
+        async def main():
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+            await init_db()
+            try:
+                return await coroutine_function()
+            finally:
+                await close_db()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,104 @@
+"""
+Tests for the columnar article archive
+"""
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from src.article_archive import ArticleArchive
+from src.backfill import _article_row
+from src.database import Article, engine
+from src.records import ArticleRecord
+
+MONTH = "2025-01"
+
+
+def _row(article_id: str, importance: str = "medium", day: int = 1):
+    return {
+        "id": article_id,
+        "title": f"Article {article_id}",
+        "summary": "summary",
+        "content": "content " * 50,
+        "url": f"https://example.com/{article_id}",
+        "source": "ArXiv",
+        "published_at": datetime(2025, 1, day),
+        "importance": importance,
+        "tags": ["LLM"],
+        "ai_score": 0.5,
+    }
+
+
+def test_other_workers_see_rewritten_month_files(tmp_path):
+    leader = ArticleArchive(directory=str(tmp_path))
+    follower = ArticleArchive(directory=str(tmp_path))
+    leader.write_month(MONTH, [_row("a")])
+    assert follower.get("a")["id"] == "a"
+
+    leader.write_month(MONTH, [_row("b")])
+
+    assert follower.get("b")["id"] == "b"
+    assert follower.get("a")["id"] == "a"
+
+
+def test_replaced_reader_stays_open_until_its_last_user_is_done(tmp_path):
+    archive = ArticleArchive(directory=str(tmp_path))
+    archive.write_month(MONTH, [_row("a")])
+
+    with archive.reader(MONTH) as reader:
+        archive.write_month(MONTH, [_row("b")])
+        assert reader.get("a")["id"] == "a"  # still mapped
+        assert not reader._mm.closed
+    assert reader._mm.closed
+    assert archive.get("b")["id"] == "b"
+
+
+def test_latest_filters_and_skips_content(tmp_path):
+    archive = ArticleArchive(directory=str(tmp_path), row_group_size=2)
+    archive.write_month(MONTH, [
+        _row("a", "high", day=1), _row("b", "low", day=2), _row("c", "high", day=3), _row("d", "high", day=4),
+    ])
+
+    rows = archive.latest(2, importance="high")
+
+    assert [row["id"] for row in rows] == ["d", "c"]
+    assert "content" not in rows[0]
+
+
+def _article(article_id: str) -> dict:
+    return _article_row(ArticleRecord(
+        id=article_id,
+        title=f"Article {article_id}",
+        url=f"https://example.com/{article_id}",
+        source="HackerNews",
+        published_at="2025-01-15T12:00:00",
+    ))
+
+
+def test_rows_inserted_while_archiving_are_not_deleted(run_db, tmp_path):
+    async def scenario():
+        table = Article.__table__
+        loop = asyncio.get_running_loop()
+
+        async def backfill_insert():
+            async with engine.begin() as conn:
+                await conn.execute(insert(table), [_article("late")])
+
+        class RacingArchive(ArticleArchive):
+            def write_month(self, month, rows):
+                super().write_month(month, rows)
+                # A concurrent backfill lands in the same window between the write and the delete
+                asyncio.run_coroutine_threadsafe(backfill_insert(), loop).result()
+
+        async with engine.begin() as conn:
+            await conn.execute(insert(table), [_article("early")])
+        archive = RacingArchive(directory=str(tmp_path))
+        moved = await archive.archive_old_articles()
+        async with engine.connect() as conn:
+            remaining = (await conn.execute(select(table.c.id))).scalars().all()
+        return moved, remaining, archive.get("early")
+
+    moved, remaining, archived = run_db(scenario)
+    assert moved == 1
+    assert remaining == ["late"]
+    assert archived["id"] == "early"
@@ -0,0 +1,48 @@
+"""
+Tests for checkpointed backfills
+"""
+from datetime import datetime, timedelta
+
+from src.backfill import Backfill, BackfillPage, HackerNewsSource
+from src.cluster import try_lock
+from src.records import ArticleRecord
+
+
+def _record(article_id: str) -> ArticleRecord:
+    return ArticleRecord(
+        id=article_id,
+        title=f"Article {article_id}",
+        url=f"https://example.com/{article_id}",
+        source="HackerNews",
+        published_at=datetime.utcnow().isoformat(),
+    )
+
+
+def _backfill() -> Backfill:
+    end = datetime(2026, 1, 2)
+    return Backfill(HackerNewsSource(), end - timedelta(days=1), end)
+
+
+def test_conflicting_rows_are_not_counted_as_inserted(run_db):
+    async def scenario():
+        backfill = _backfill()
+        await backfill._load_checkpoint()
+        await backfill._store(BackfillPage([_record("a"), _record("b")], backfill.start, 1))
+        await backfill._store(BackfillPage([_record("a"), _record("b"), _record("c")], backfill.start, 2))
+        return backfill.stats, (await backfill._load_checkpoint())["inserted"]
+
+    stats, stored = run_db(scenario)
+    assert (stats["fetched"], stats["inserted"], stored) == (5, 3, 3)
+
+
+def test_backfill_running_elsewhere_is_not_started(run_db):
+    async def scenario():
+        backfill = _backfill()
+        async with try_lock(f"backfill-{backfill.id}") as acquired:
+            assert acquired
+            progress = await backfill.run()
+        return progress
+
+    progress = run_db(scenario)
+    assert progress["status"] == "busy"
+    assert progress["fetched"] == 0
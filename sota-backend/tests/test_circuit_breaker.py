@@ -0,0 +1,96 @@
+"""
+Tests for per-source circuit breakers
+"""
+from src.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock: Clock) -> CircuitBreaker:
+    return CircuitBreaker(
+        "test",
+        window=10,
+        min_calls=5,
+        failure_rate=0.5,
+        consecutive_failures=3,
+        slow_call_seconds=100.0,
+        open_seconds=60.0,
+        max_open_seconds=1800.0,
+        timeout_multiplier=2.0,
+        min_timeout=2.0,
+        max_timeout=30.0,
+        clock=clock,
+    )
+
+
+def _fail(breaker: CircuitBreaker, seconds: float):
+    assert breaker.allow()
+    breaker.record_failure(seconds, TimeoutError())
+
+
+def test_open_half_open_close_cycle():
+    clock = Clock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        _fail(breaker, 1.0)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now += 60
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_failure(1.0, RuntimeError("still down"))
+    assert breaker.state == OPEN
+    assert breaker.current_open_seconds == 120
+
+    clock.now += 120
+    assert breaker.allow()
+    breaker.record_success(0.5)
+    assert breaker.state == CLOSED
+    assert breaker.current_open_seconds == 60
+
+
+def test_half_open_probe_gets_the_full_budget():
+    clock = Clock()
+    breaker = _breaker(clock)
+    for _ in range(10):
+        assert breaker.allow()
+        breaker.record_success(0.4)
+    assert breaker.timeout() == 2.0
+    for _ in range(3):
+        _fail(breaker, breaker.timeout())
+
+    clock.now += 60
+    assert breaker.allow()
+    assert breaker.timeout() == 30.0
+    breaker.record_success(3.0)
+    assert breaker.state == CLOSED
+
+
+def test_timeouts_raise_the_budget_of_a_slower_source():
+    clock = Clock()
+    breaker = _breaker(clock)
+    for _ in range(10):
+        assert breaker.allow()
+        breaker.record_success(0.4)
+    # The source now takes 3s: the first calls time out at the old budget...
+    while breaker.timeout() < 3.0:
+        if breaker.state == OPEN:
+            clock.now = breaker.open_until
+        if not breaker.allow():
+            continue
+        budget = breaker.timeout()
+        if budget < 3.0:
+            breaker.record_failure(budget, TimeoutError())
+        else:
+            breaker.record_success(3.0)
+        assert breaker.current_open_seconds < 1800
+    # ...until the budget covers it and calls succeed again
+    assert breaker.timeout() >= 3.0
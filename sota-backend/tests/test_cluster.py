@@ -0,0 +1,61 @@
+"""
+Tests for cross-worker messaging and WebSocket fan-out
+"""
+import asyncio
+import json
+import logging
+
+from src.cluster import MessageBus, WebSocketHub
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, payload: str):
+        await asyncio.sleep(self.delay)
+        self.sent.append(payload)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def test_slow_client_is_dropped_without_holding_up_the_broadcast():
+    async def scenario():
+        hub = WebSocketHub(send_timeout=0.05)
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+        hub.add(fast)
+        hub.add(slow)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await hub.broadcast({"type": "heartbeat", "seq": 1})
+        elapsed = loop.time() - started
+        await asyncio.sleep(0)  # let the close task run
+        return hub, fast, slow, elapsed
+
+    hub, fast, slow, elapsed = asyncio.run(scenario())
+    assert elapsed < 1
+    assert len(fast.sent) == 1
+    assert hub.clients == {fast}
+    assert slow.closed_with == 1013
+
+
+def test_failing_async_bus_handler_is_logged(caplog):
+    async def failing(data):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        bus = MessageBus()
+        bus.subscribe("test", failing)
+        bus._receive(json.dumps({"origin": "other", "channel": "test", "data": {}}).encode())
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return bus
+
+    with caplog.at_level(logging.ERROR, logger="src.cluster"):
+        bus = asyncio.run(scenario())
+    assert not bus._pending
+    assert "Bus handler for test failed" in caplog.text
+    assert "boom" in caplog.text
@@ -0,0 +1,93 @@
+"""
+Tests for request-scoped database sessions
+"""
+import asyncio
+import logging
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError
+
+from src import database, rollups
+from src.database import ReplicaRouter, create_engine_for, engine, get_db, get_read_db
+from src.rollups import StatsRollup
+
+
+@pytest.mark.parametrize("dependency", [get_db, get_read_db])
+def test_route_errors_are_not_logged_as_database_errors(dependency, caplog):
+    async def raise_inside(error):
+        session = dependency()
+        await session.__anext__()
+        with pytest.raises(type(error)):
+            await session.athrow(error)
+
+    with caplog.at_level(logging.ERROR, logger="src.database"):
+        asyncio.run(raise_inside(HTTPException(status_code=404)))
+        assert not caplog.records
+        asyncio.run(raise_inside(OperationalError("SELECT 1", {}, Exception("gone"))))
+        assert "Database session error" in caplog.text
+
+
+class FakeConnection:
+    dialect = type("Dialect", (), {"name": "postgresql"})()
+
+    def __init__(self, lag):
+        self.lag = lag
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def scalar(self, query):
+        return self.lag
+
+
+class FakeReplica:
+    def __init__(self, lag):
+        self.lag = lag
+
+    def connect(self):
+        return FakeConnection(self.lag)
+
+
+def test_replica_without_a_wal_receiver_is_not_read_from():
+    streaming, disconnected = FakeReplica(0.0), FakeReplica(None)
+    router = ReplicaRouter([streaming, disconnected], max_lag=5.0, check_interval=60)
+    asyncio.run(router.check_lag())
+    assert router.lag == {0: 0.0, 1: None}
+    assert router.healthy_replicas() == [streaming]
+
+    streaming.lag = None
+    asyncio.run(router.check_lag())
+    assert router.read_engine() is engine
+
+
+def test_separate_analytics_database_gets_its_tables(run_db, monkeypatch, tmp_path):
+    analytics_url = f"sqlite+aiosqlite:///{tmp_path}/analytics.db"
+    separate = create_engine_for(analytics_url, "analytics_test", 1, 0)
+    monkeypatch.setattr(database.settings, "database_analytics_url", analytics_url)
+    monkeypatch.setattr(database, "analytics_engine", separate)
+    monkeypatch.setattr(rollups, "analytics_engine", separate)
+
+    def tables(conn):
+        return set(inspect(conn).get_table_names())
+
+    async def scenario():
+        rollup = StatsRollup()
+        await rollup.reconcile()  # counts the primary's tables, not the analytics database's
+        try:
+            async with engine.connect() as conn:
+                primary = await conn.run_sync(tables)
+            async with separate.connect() as conn:
+                analytics = await conn.run_sync(tables)
+        finally:
+            await separate.dispose()
+        return primary, analytics, rollup.last_reconciled
+
+    primary, analytics, reconciled = run_db(scenario)
+    assert analytics == {"analytics_events", "analytics_rollups"}
+    assert "articles" in primary and "analytics_events" not in primary
+    assert reconciled is not None
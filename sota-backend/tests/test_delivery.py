@@ -0,0 +1,137 @@
+"""
+Tests for newsletter delivery against the in-process SMTP sink
+"""
+from collections import Counter
+
+from sqlalchemy import insert
+
+from src.database import Subscriber, engine
+from src.delivery import DeliveryPipeline, SMTPPool, SMTPSink
+from src.records import ArticleRecord
+
+NEWSLETTER = {
+    "id": "newsletter_2026-01-01",
+    "title": "SOTA.ai Daily Digest",
+    "generated_at": "2026-01-01T08:00:00",
+    "articles": [
+        ArticleRecord(id="1", title="Agents", url="https://example.com/1", source="Blog", tags=("Agents",)),
+        ArticleRecord(id="2", title="Vision", url="https://example.com/2", source="Blog", tags=("Vision",)),
+    ],
+}
+TOPICS = ([], ["agents"], ["Vision", "agents"])
+
+
+class Crash(Exception):
+    """Stands in for the process dying"""
+
+
+class CrashingPipeline(DeliveryPipeline):
+    """Dies after sending a page, before its outcome is recorded"""
+
+    def __init__(self, *args, crash_on_page: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.crash_on_page = crash_on_page
+        self.pages = 0
+
+    async def _record(self, *args, **kwargs):
+        self.pages += 1
+        if self.pages == self.crash_on_page:
+            raise Crash()
+        await super()._record(*args, **kwargs)
+
+
+async def _subscribe(count: int):
+    async with engine.begin() as conn:
+        await conn.execute(insert(Subscriber.__table__), [
+            {
+                "id": f"sub_{i:03d}",
+                "email": f"reader{i}@example.com",
+                "is_active": True,
+                "frequency": "daily",
+                "topics": TOPICS[i % len(TOPICS)],
+            }
+            for i in range(count)
+        ])
+
+
+async def _deliver(sink: SMTPSink, pipeline_class=DeliveryPipeline, **options):
+    pool = SMTPPool(host=sink.host, port=sink.port, size=4)
+    pipeline = pipeline_class(pool=pool, from_address="news@sota.ai", page_size=10, **options)
+    try:
+        return await pipeline.deliver(NEWSLETTER)
+    finally:
+        await pipeline.close()
+
+
+def _recipients(sink: SMTPSink) -> Counter:
+    return Counter(recipient for _, recipients, _ in sink.messages for recipient in recipients)
+
+
+def test_delivers_every_page_with_one_digest_per_topic_set(run_db):
+    async def scenario():
+        await _subscribe(25)
+        sink = SMTPSink()
+        await sink.start()
+        try:
+            report = await _deliver(sink)
+        finally:
+            await sink.stop()
+        return report, sink
+
+    report, sink = run_db(scenario)
+    recipients = _recipients(sink)
+    assert report["sent"] == 25 and report["failed"] == 0
+    assert report["digests_rendered"] == len(TOPICS)
+    assert len(recipients) == 25 and set(recipients.values()) == {1}
+    message = next(body for _, recipients, body in sink.messages if recipients == ["reader0@example.com"])
+    assert b"To: reader0@example.com" in message
+    assert b"Subject: SOTA.ai Daily Digest" in message
+
+
+def test_resume_after_a_crash_never_sends_twice(run_db):
+    async def scenario():
+        await _subscribe(30)
+        sink = SMTPSink()
+        await sink.start()
+        try:
+            try:
+                await _deliver(sink, CrashingPipeline, crash_on_page=2)
+            except Crash:
+                pass
+            sent_before_crash = len(sink.messages)
+            resumed = await _deliver(sink)
+            again = await _deliver(sink)
+        finally:
+            await sink.stop()
+        return sent_before_crash, resumed, again, sink
+
+    sent_before_crash, resumed, again, sink = run_db(scenario)
+    assert sent_before_crash == 20
+    # Page 1 was recorded as sent; page 2 went out but its outcome was lost
+    assert (resumed["skipped"], resumed["unconfirmed"], resumed["sent"]) == (10, 10, 10)
+    assert (again["skipped"], again["unconfirmed"], again["sent"]) == (20, 10, 0)
+    recipients = _recipients(sink)
+    assert len(recipients) == 30
+    assert max(recipients.values()) == 1
+
+
+def test_failed_sends_are_retried_on_the_next_run(run_db):
+    async def scenario():
+        await _subscribe(12)
+        async with engine.begin() as conn:
+            await conn.execute(insert(Subscriber.__table__), [
+                {"id": "sub_bad", "email": "broken address@example.com", "is_active": True, "frequency": "daily"},
+            ])
+        sink = SMTPSink()
+        await sink.start()
+        try:
+            first = await _deliver(sink)
+            second = await _deliver(sink)
+        finally:
+            await sink.stop()
+        return first, second, sink
+
+    first, second, sink = run_db(scenario)
+    assert (first["sent"], first["failed"]) == (12, 1)
+    assert (second["sent"], second["failed"], second["skipped"]) == (0, 1, 12)
+    assert len(sink.messages) == 12
@@ -0,0 +1,54 @@
+"""
+Tests for newsletter engagement counters
+"""
+import asyncio
+
+from sqlalchemy import select
+
+from src import engagement
+from src.ai_processor import AIProcessor
+from src.database import Newsletter, engine
+from src.engagement import EngagementCounters
+from src.rollups import StatsRollup
+
+
+def test_flushed_engagement_reaches_the_stored_newsletter(run_db):
+    async def scenario():
+        rollup = StatsRollup()
+        processor = AIProcessor(response_cache=None, stats_rollup=rollup)
+        newsletter = await processor.get_todays_newsletter()
+        counters = EngagementCounters()
+        for _ in range(4):
+            counters.record_view(newsletter["id"])
+        counters.record_click(newsletter["id"])
+        await counters.flush()
+
+        # Regenerating the same date keeps the row and its counts
+        await processor.generate_daily_newsletter(date=newsletter["date"], force_regenerate=True)
+        table = Newsletter.__table__
+        async with engine.connect() as conn:
+            row = (await conn.execute(select(table).where(table.c.id == newsletter["id"]))).one()
+        return row, rollup.newsletters_generated
+
+    row, generated = run_db(scenario)
+    assert (row.views, row.clicks, row.click_through_rate) == (4, 1, 0.25)
+    assert generated == 1
+
+
+class BrokenEngine:
+    def begin(self):
+        raise RuntimeError("database down")
+
+
+def test_failed_flush_keeps_the_counts(monkeypatch):
+    monkeypatch.setattr(engagement, "engine", BrokenEngine())
+
+    async def scenario():
+        counters = EngagementCounters()
+        for _ in range(3):
+            counters.record_share("newsletter_2026-01-01")
+        await counters.flush()
+        counters.record_share("newsletter_2026-01-01")
+        return counters.pending("newsletter_2026-01-01"), counters.flushes
+
+    assert asyncio.run(scenario()) == ({"views": 0, "shares": 4, "clicks": 0}, 0)
@@ -0,0 +1,42 @@
+"""
+Tests for buffered analytics event ingestion
+"""
+import asyncio
+
+from src.event_ingestion import EventIngestor
+
+
+def _failing_ingestor(tmp_path, spill: bool) -> EventIngestor:
+    ingestor = EventIngestor(
+        capacity=100,
+        batch_size=5,
+        flush_interval=60,
+        spill_path=str(tmp_path / "spill.jsonl") if spill else None,
+    )
+
+    async def write(batch):
+        raise ConnectionError("database is down")
+
+    ingestor._write = write
+    return ingestor
+
+
+def test_stop_spills_whole_buffer_when_database_is_down(tmp_path):
+    ingestor = _failing_ingestor(tmp_path, spill=True)
+    ingestor.enqueue_many({"event_type": "page_view"} for _ in range(23))
+
+    asyncio.run(ingestor.stop())
+
+    assert not ingestor.buffer
+    assert ingestor.stats["spilled"] == 23
+    assert len((tmp_path / "spill.jsonl").read_text().splitlines()) == 23
+
+
+def test_stop_without_spill_empties_buffer(tmp_path):
+    ingestor = _failing_ingestor(tmp_path, spill=False)
+    ingestor.enqueue_many({"event_type": "page_view"} for _ in range(12))
+
+    asyncio.run(ingestor.stop())
+
+    assert not ingestor.buffer
+    assert ingestor.stats["flushed"] == 0
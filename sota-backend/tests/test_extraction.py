@@ -0,0 +1,39 @@
+"""
+Tests for the content extraction process pool
+"""
+import asyncio
+import time
+
+import pytest
+
+from src.extraction import ContentExtractor, extract_text
+
+
+def _sleep(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def test_parse_timeout_recycles_the_pool():
+    async def scenario():
+        extractor = ContentExtractor(workers=1, parse_timeout=0.5)
+        try:
+            await extractor.run(_sleep, 0)
+            stuck_pool = extractor.pool
+            processes = list(stuck_pool._processes.values())
+            with pytest.raises(asyncio.TimeoutError):
+                await extractor.run(_sleep, 60)
+            # The single worker is free again: the next parse does not queue behind the stuck one
+            result = await extractor.run(extract_text, "<p>" + "word " * 10 + "</p>")
+            return extractor, stuck_pool, processes, result
+        finally:
+            await extractor.close()
+
+    extractor, stuck_pool, processes, result = asyncio.run(scenario())
+    assert extractor.stats["pool_recycles"] == 1
+    assert extractor._pool is not stuck_pool
+    assert result["word_count"] == 10
+    assert processes
+    for process in processes:
+        process.join(timeout=5)
+        assert not process.is_alive()
@@ -0,0 +1,155 @@
+"""
+Tests for the HTTP response cache middleware
+"""
+import asyncio
+import json
+
+from src import http_cache
+from src.http_cache import CachePolicy, HTTPResponseCache, ResponseCacheMiddleware, is_revalidation
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Newsletter:
+    """Stands in for the endpoint: serves the current day's issue and counts a view unless revalidating"""
+
+    def __init__(self):
+        self.day = "2026-01-01"
+        self.calls = 0
+        self.views = []
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        if not is_revalidation(scope):
+            self.views.append(f"newsletter_{self.day}")
+        body = json.dumps({"id": f"newsletter_{self.day}"}).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _setup(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_cache.time, "time", clock)
+    app = Newsletter()
+    cache = HTTPResponseCache({
+        "/api/newsletter/today": CachePolicy(
+            ttl=300,
+            stale_while_revalidate=600,
+            tags=("newsletter",),
+            vary=lambda: app.day,
+            on_hit=lambda scope, day: app.views.append(f"newsletter_{day}"),
+        ),
+    })
+    return clock, app, cache, ResponseCacheMiddleware(app, cache)
+
+
+async def _get(middleware, headers=None):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/api/newsletter/today",
+        "query_string": b"", "headers": headers or [],
+    }
+    await middleware(scope, receive, send)
+    status = messages[0]["status"]
+    response_headers = dict(messages[0]["headers"])
+    body = messages[1]["body"]
+    return status, response_headers, json.loads(body) if body else None
+
+
+def test_fresh_hits_skip_the_endpoint(monkeypatch):
+    clock, app, cache, middleware = _setup(monkeypatch)
+
+    async def scenario():
+        await _get(middleware)
+        clock.now += 10
+        status, headers, body = await _get(middleware)
+        assert status == 200
+        assert body == {"id": "newsletter_2026-01-01"}
+        assert headers[b"age"] == b"10"
+        assert app.calls == 1
+        assert cache.stats["hits"] == 1
+
+        not_modified, _, _ = await _get(middleware, [(b"if-none-match", headers[b"etag"])])
+        assert not_modified == 304
+
+    asyncio.run(scenario())
+
+
+def test_day_change_misses_instead_of_serving_yesterday(monkeypatch):
+    clock, app, cache, middleware = _setup(monkeypatch)
+
+    async def scenario():
+        await _get(middleware)
+        clock.now += 60
+        app.day = "2026-01-02"
+        status, _, body = await _get(middleware)
+        assert status == 200
+        assert body == {"id": "newsletter_2026-01-02"}
+        assert app.calls == 2
+        assert app.views == ["newsletter_2026-01-01", "newsletter_2026-01-02"]
+
+    asyncio.run(scenario())
+
+
+def test_views_count_once_per_served_response(monkeypatch):
+    clock, app, cache, middleware = _setup(monkeypatch)
+
+    async def scenario():
+        await _get(middleware)  # miss: counted by the endpoint
+        clock.now += 10
+        await _get(middleware)  # fresh hit: counted by on_hit
+        clock.now += 400
+        await _get(middleware)  # stale hit: counted by on_hit, revalidated in the background
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert app.calls == 2
+        assert cache.stats["stale_hits"] == 1
+        assert not cache.revalidating
+        assert app.views == ["newsletter_2026-01-01"] * 3
+
+        # The revalidated entry is fresh again
+        await _get(middleware)
+        assert app.calls == 2
+        assert app.views == ["newsletter_2026-01-01"] * 4
+
+    asyncio.run(scenario())
+
+
+def test_expired_entries_are_refetched(monkeypatch):
+    clock, app, cache, middleware = _setup(monkeypatch)
+
+    async def scenario():
+        await _get(middleware)
+        clock.now += 1000
+        await _get(middleware)
+        assert app.calls == 2
+        assert cache.stats["misses"] == 2
+        assert app.views == ["newsletter_2026-01-01"] * 2
+
+    asyncio.run(scenario())
+
+
+def test_invalidation_drops_tagged_entries(monkeypatch):
+    clock, app, cache, middleware = _setup(monkeypatch)
+
+    async def scenario():
+        await _get(middleware)
+        cache.invalidate("newsletter")
+        assert not cache.entries
+        await _get(middleware)
+        assert app.calls == 2
+
+    asyncio.run(scenario())
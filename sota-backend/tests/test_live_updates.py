@@ -0,0 +1,63 @@
+"""
+Tests for the WebSocket update log and followers joining it
+"""
+import asyncio
+
+from src.cluster import WebSocketHub
+from src.live_updates import UpdateLog
+from src.news_aggregator import NewsAggregator
+
+
+def _state(*articles):
+    return {"articles": list(articles), "trending_topics": ["agents"], "breaking_news": None}
+
+
+def test_changed_article_is_sent_as_an_update():
+    leader, follower = UpdateLog(), UpdateLog()
+    first = leader.advance(_state({"id": "a", "score": 1}, {"id": "b", "score": 2}))
+    follower.sync(leader.epoch, first, leader.state())
+
+    delta = leader.advance(_state({"id": "a", "score": 5}, {"id": "b", "score": 2}))
+    follower.sync(leader.epoch, delta, leader.state())
+
+    assert delta["type"] == "delta"
+    assert delta["updated"] == [{"id": "a", "score": 5}]
+    assert "articles" not in delta
+    assert follower.state() == leader.state()
+    assert [article["id"] for article in leader.state()["articles"]] == ["a", "b"]
+    assert leader.advance(_state({"id": "a", "score": 5}, {"id": "b", "score": 2}))["type"] == "heartbeat"
+
+
+def test_follower_serves_the_leaders_epoch_once_synced():
+    async def scenario():
+        leader, follower = WebSocketHub(), WebSocketHub()
+        waited = await follower.wait_synced(0.01)
+        message = leader.advance(_state({"id": "a", "score": 1}))
+        joining = asyncio.ensure_future(follower.wait_synced(1))
+        await asyncio.sleep(0)
+        follower.follow({"epoch": leader.log.epoch, "message": leader.log.heartbeat(), "state": leader.log.state()})
+        return waited, await joining, message, leader, follower
+
+    waited, joined, message, leader, follower = asyncio.run(scenario())
+    assert not waited
+    assert joined
+    assert follower.log.epoch == leader.log.epoch
+    assert follower.log.catch_up(None, None) == leader.log.catch_up(None, None)
+    # The leader's next delta applies on top without a resync
+    delta = leader.advance(_state({"id": "b", "score": 1}, {"id": "a", "score": 1}))
+    follower.follow({"epoch": leader.log.epoch, "message": delta, "state": leader.log.state()})
+    assert follower.log.deltas[-1] is delta
+
+
+def test_unchanged_live_state_produces_a_heartbeat():
+    async def scenario():
+        aggregator = NewsAggregator()
+        log = UpdateLog()
+        first = log.advance(await aggregator.get_live_state())
+        await asyncio.sleep(0.01)
+        second = log.advance(await aggregator.get_live_state())
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["type"] == "delta"
+    assert second == {"type": "heartbeat", "seq": first["seq"]}
@@ -0,0 +1,63 @@
+"""
+Tests for analytics retention and archiving
+"""
+import csv
+import gzip
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from src.database import AnalyticsEvent, analytics_engine
+from src.partitions import PartitionManager
+
+
+def _events(*ages_in_days):
+    now = datetime.utcnow()
+    return [
+        {"id": f"e{i}-{age}", "event_type": "page_view", "timestamp": now - timedelta(days=age), "metadata": {}}
+        for i, age in enumerate(ages_in_days)
+    ]
+
+
+def _archived_ids(archive_dir):
+    ids = []
+    for path in sorted(archive_dir.iterdir()):
+        with gzip.open(path, "rt", newline="") as f:
+            ids.extend(row["id"] for row in csv.DictReader(f))
+    return ids
+
+
+def test_two_expiries_on_the_same_day_keep_both_batches(run_db, tmp_path):
+    archive_dir = tmp_path / "archive"
+
+    async def scenario():
+        manager = PartitionManager(retention_days=30, archive_dir=str(archive_dir))
+        table = AnalyticsEvent.__table__
+        async with analytics_engine.begin() as conn:
+            await conn.execute(insert(table), _events(40, 41, 1))
+        first = await manager.run_maintenance()
+        async with analytics_engine.begin() as conn:
+            await conn.execute(insert(table), _events(35, 2))
+        second = await manager.run_maintenance()
+        async with analytics_engine.connect() as conn:
+            remaining = await conn.scalar(select(func.count()).select_from(table))
+        return first, second, remaining
+
+    first, second, remaining = run_db(scenario)
+    assert len(first["archived"]) == len(second["archived"]) == 1
+    assert first["archived"] != second["archived"]
+    assert sorted(_archived_ids(archive_dir)) == ["e0-35", "e0-40", "e1-41"]
+    assert remaining == 2
+
+
+def test_nothing_expired_writes_no_archive(run_db, tmp_path):
+    archive_dir = tmp_path / "archive"
+
+    async def scenario():
+        async with analytics_engine.begin() as conn:
+            await conn.execute(insert(AnalyticsEvent.__table__), _events(1))
+        return await PartitionManager(retention_days=30, archive_dir=str(archive_dir)).run_maintenance()
+
+    report = run_db(scenario)
+    assert report["archived"] == []
+    assert list(archive_dir.iterdir()) == []
@@ -0,0 +1,25 @@
+"""
+Tests for topic-personalized editions
+"""
+from src.personalization import EditionEngine
+from src.records import ArticleRecord
+
+NEWSLETTER = {
+    "id": "newsletter_2026-01-01",
+    "title": "SOTA.ai Daily Digest",
+    "generated_at": "2026-01-01T08:00:00",
+    "articles": [
+        ArticleRecord(id="1", title="Agents", url="https://example.com/1", source="Blog", tags=("Agents",)),
+        ArticleRecord(id="2", title="Vision", url="https://example.com/2", source="Blog", tags=("Vision",)),
+    ],
+}
+
+
+def test_variant_header_does_not_depend_on_the_first_callers_spelling():
+    engine = EditionEngine()
+    first = engine.assemble(NEWSLETTER, ["Vision", "AGENTS"])
+    second = engine.assemble(NEWSLETTER, ["agents ", "vision", "Vision"])
+
+    assert first == second
+    assert "Picked for you: agents, vision" in first
+    assert engine.stats["variant_hits"] == 1
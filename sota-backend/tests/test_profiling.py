@@ -0,0 +1,41 @@
+"""
+Tests for profiling sessions
+"""
+import asyncio
+
+import pytest
+
+from src.config import settings
+from src.profiling import Profiler, is_admin_token
+
+
+@pytest.mark.parametrize("mode", ["cprofile", "tracemalloc"])
+def test_whole_process_modes_reject_a_route(tmp_path, mode):
+    async def scenario():
+        profiler = Profiler(output_dir=str(tmp_path))
+        with pytest.raises(ValueError):
+            profiler.start(mode=mode, seconds=1, route="/api/newsletter/*")
+        return profiler.session
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_cprofile_session_writes_stats(tmp_path):
+    async def scenario():
+        profiler = Profiler(output_dir=str(tmp_path))
+        profiler.start(mode="cprofile", seconds=30)
+        sum(range(1000))
+        return await profiler.stop()
+
+    result = asyncio.run(scenario())
+    assert any(path.endswith(".prof") for path in result["files"])
+
+
+def test_admin_token_check_accepts_any_header_text(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "sécret")
+    assert not is_admin_token("\xe9")
+    assert not is_admin_token("€")
+    assert not is_admin_token(None)
+    assert is_admin_token("sécret".encode("utf-8").decode("latin-1"))  # as the header arrives
+    monkeypatch.setattr(settings, "admin_token", None)
+    assert not is_admin_token("\xe9")
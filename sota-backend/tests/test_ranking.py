@@ -0,0 +1,52 @@
+"""
+Tests for newsletter ranking features
+"""
+import pytest
+
+from src.news_aggregator import SOURCES
+from src.ranking import DEFAULT_AUTHORITY, FEATURES, RankingEngine, source_authority
+from src.records import ArticleRecord
+
+
+@pytest.mark.parametrize("source_id", ["openai_blog", "google_ai", "arxiv", "hackernews", "mit_tech_review"])
+def test_every_crawled_label_has_its_authority(source_id):
+    assert source_authority(SOURCES[source_id]["name"]) != DEFAULT_AUTHORITY
+
+
+def test_authority_ignores_label_case():
+    assert source_authority("Openai Blog") == source_authority("OpenAI Blog") == 1.0
+    assert source_authority("Some Blog") == DEFAULT_AUTHORITY
+
+
+def _article(article_id: str, title: str, url, source: str = "HackerNews", summary: str = "") -> ArticleRecord:
+    return ArticleRecord(
+        id=article_id, title=title, url=url, source=source, published_at="", summary=summary
+    )
+
+
+def test_articles_without_urls_are_separate_stories():
+    engine = RankingEngine()
+    articles = [
+        _article("1", "Ask HN: agents", None),
+        _article("2", "Show HN: a robot", "", source="Reddit r/MachineLearning"),
+        _article("3", "Tell HN: models", None, source="ArXiv"),
+        _article("4", "GPT-5 is out", "https://openai.com/gpt-5?ref=hn"),
+        _article("5", "OpenAI ships GPT-5", "https://openai.com/gpt-5/", source="OpenAI Blog"),
+    ]
+    coverage = engine._coverage(articles)
+    assert list(coverage[:3]) == [0.0, 0.0, 0.0]
+    assert coverage[3] == coverage[4] > 0
+    assert len(engine.rank(articles, 3)) == 3
+
+
+def test_keyword_hits_match_whole_words_in_title_and_summary():
+    engine = RankingEngine()
+    articles = [
+        _article("1", "A new LLM", None, summary="deep learning meets computer vision"),
+        _article("2", "Gardening tips", None, summary="email about a maildrop"),  # "ai" inside words
+        _article("3", "OpenAI", None),
+    ]
+    hits = engine._keyword_hits(articles)
+    assert list(hits) == [1.0, 0.0, pytest.approx(1 / 3)]
+    column = engine.features(articles, engine.embed([a.title for a in articles]))[:, FEATURES.index("keywords")]
+    assert list(column) == pytest.approx(list(hits))
@@ -0,0 +1,100 @@
+"""
+Tests for token buckets and per-route costs
+"""
+import asyncio
+
+import pytest
+
+from src import rate_limit
+from src.rate_limit import MemoryBackend, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _scope(method: str = "GET", path: str = "/api/stats", ip: str = "10.0.0.1"):
+    return {"type": "http", "method": method, "path": path, "headers": [], "client": (ip, 1234)}
+
+
+def _limiter(**options) -> RateLimiter:
+    options = {
+        "costs": {
+            "GET /health": 0.0,
+            "* /api/admin/*": 20.0,
+            "POST /api/newsletter/*": 100.0,
+            "POST /api/newsletter/generate": 5.0,  # shadowed by the glob above
+        },
+        "capacity": 100.0,
+        "refill_per_second": 10.0,
+        "default_cost": 1.0,
+        "auth_failure_cost": 50.0,
+        "api_keys": [],
+        "backend": MemoryBackend(),
+        **options,
+    }
+    return RateLimiter(**options)
+
+
+def test_bucket_refills_at_the_configured_rate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+
+    async def scenario():
+        backend = MemoryBackend()
+        first = await backend.acquire("client", 60, 100, 10)
+        second = await backend.acquire("client", 60, 100, 10)
+        clock.now += 2  # 20 more tokens
+        third = await backend.acquire("client", 60, 100, 10)
+        clock.now += 100  # capped at capacity
+        fourth = await backend.acquire("client", 100, 100, 10)
+        return first, second, third, fourth
+
+    first, second, third, fourth = asyncio.run(scenario())
+    assert first.allowed and first.remaining == 40
+    assert not second.allowed and second.retry_after == pytest.approx(2.0)
+    assert third.allowed and third.remaining == pytest.approx(0.0)
+    assert fourth.allowed
+
+
+def test_first_matching_route_cost_wins():
+    limiter = _limiter()
+    assert limiter.cost("GET", "/health") == ("GET /health", 0.0)
+    assert limiter.cost("POST", "/api/newsletter/generate") == ("POST /api/newsletter/*", 100.0)
+    assert limiter.cost("DELETE", "/api/admin/profile") == ("* /api/admin/*", 20.0)
+    assert limiter.cost("GET", "/api/newsletter/today") == ("default", 1.0)
+
+
+def test_costs_above_capacity_are_rejected():
+    with pytest.raises(ValueError):
+        _limiter(costs={"GET /api/*": 101.0})
+    with pytest.raises(ValueError):
+        _limiter(auth_failure_cost=101.0)
+
+
+def test_admin_routes_are_limited_and_failed_tokens_charged():
+    async def scenario():
+        limiter = _limiter()
+        scope = _scope("POST", "/api/admin/profile")
+        allowed = 0
+        for _ in range(10):
+            await limiter.penalize(scope)  # what require_admin does on a wrong token
+            _, _, decision = await limiter.check(scope)
+            if decision.allowed:
+                allowed += 1
+        _, _, other = await limiter.check(_scope(ip="10.0.0.2"))
+        return allowed, other
+
+    allowed, other = asyncio.run(scenario())
+    assert allowed == 1  # 50 + 20 leaves 30, then every guess is refused
+    assert other.allowed  # buckets are per client
+
+
+def test_shipped_costs_never_exempt_the_admin_api():
+    limiter = RateLimiter(backend=MemoryBackend())
+    assert limiter.cost("POST", "/api/admin/profile")[1] > 0
+    assert limiter.auth_failure_cost > 0
@@ -0,0 +1,50 @@
+"""
+Tests for the prompt/response cache
+"""
+import asyncio
+
+from src.response_cache import ResponseCache
+
+
+def _extend(cache: ResponseCache, segments, generated):
+    async def compute(previous, remaining):
+        generated.append(list(remaining))
+        return [f"<{segment}>" for segment in remaining]
+
+    return cache.get_or_extend("test", "model", segments, compute)
+
+
+def test_changed_later_segment_reuses_the_cached_prefix(tmp_path):
+    async def scenario():
+        cache = ResponseCache(path=str(tmp_path / "responses.db"))
+        generated = []
+        first = await _extend(cache, ["a", "b", "c"], generated)
+        second = await _extend(cache, ["a", "b", "d"], generated)
+        again = await _extend(cache, ["a", "b", "d"], generated)
+        stats = cache.stats()
+        cache.close()
+        return first, second, again, generated, stats
+
+    first, second, again, generated, stats = asyncio.run(scenario())
+    assert first == "<a><b><c>"
+    assert second == again == "<a><b><d>"
+    assert generated == [["a", "b", "c"], ["d"]]
+    assert (stats["hits"], stats["prefix_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_prefixes_survive_a_restart(tmp_path):
+    path = str(tmp_path / "responses.db")
+
+    async def scenario():
+        generated = []
+        cache = ResponseCache(path=path)
+        await _extend(cache, ["a", "b", "c"], generated)
+        cache.close()
+        cache = ResponseCache(path=path)
+        response = await _extend(cache, ["a", "x"], generated)
+        cache.close()
+        return response, generated
+
+    response, generated = asyncio.run(scenario())
+    assert response == "<a><x>"
+    assert generated == [["a", "b", "c"], ["x"]]
@@ -0,0 +1,50 @@
+"""
+Tests for incremental stats counters and their reconciliation
+"""
+from datetime import datetime, timedelta
+
+from src.ai_processor import AIProcessor
+from src.backfill import Backfill, BackfillPage, HackerNewsSource
+from src.records import ArticleRecord
+from src.rollups import StatsRollup
+
+
+def _record(article_id: str) -> ArticleRecord:
+    return ArticleRecord(
+        id=article_id,
+        title=f"Article {article_id}",
+        url=f"https://example.com/{article_id}",
+        source="HackerNews",
+        published_at=datetime.utcnow().isoformat(),
+    )
+
+
+def test_stored_newsletters_and_reconcile_agree(run_db):
+    async def scenario():
+        rollup = StatsRollup()
+        processor = AIProcessor(response_cache=None, stats_rollup=rollup)
+        await processor.generate_daily_newsletter(date="2026-01-01")
+        await processor.generate_daily_newsletter(date="2026-01-02")
+        await processor.generate_daily_newsletter(date="2026-01-02", force_regenerate=True)
+        incremental = rollup.newsletters_generated
+        await rollup.reconcile()
+        return incremental, rollup.newsletters_generated
+
+    assert run_db(scenario) == (2, 2)
+
+
+def test_stored_articles_and_reconcile_agree(run_db):
+    async def scenario():
+        rollup = StatsRollup()
+        end = datetime.utcnow()
+        backfill = Backfill(HackerNewsSource(), end - timedelta(days=1), end, rollup=rollup)
+        await backfill._load_checkpoint()
+        await backfill._store(BackfillPage([_record("a"), _record("b")], backfill.start, 1))
+        await backfill._store(BackfillPage([_record("b"), _record("c")], backfill.start, 2))
+        incremental = (rollup.total_articles, rollup.get_snapshot()["articles_processed_today"])
+        await rollup.reconcile()
+        return incremental, (rollup.total_articles, rollup.get_snapshot()["articles_processed_today"])
+
+    incremental, reconciled = run_db(scenario)
+    assert reconciled == (3, 3)
+    assert incremental == reconciled
@@ -0,0 +1,28 @@
+"""
+Tests for subscriber email validation
+"""
+import pytest
+
+from src.subscribers import normalize_email
+
+
+def test_normalizes_case_and_surrounding_whitespace():
+    assert normalize_email("  Reader@Example.COM \n") == "reader@example.com"
+
+
+@pytest.mark.parametrize("email", [
+    "reader@example.com\r\nBcc: everyone@example.com",
+    "reader@exa\nmple.com",
+    "read er@example.com",
+    "reader@example.com,other@example.com",
+    "<reader@example.com>",
+    "reader@@example.com",
+    "reader@host@example.com",
+    "reader\x00@example.com",
+    "reader@example",
+    "reader@.example.com",
+    "@example.com",
+])
+def test_rejects_addresses_that_are_not_a_single_mailbox(email):
+    with pytest.raises(ValueError):
+        normalize_email(email)